@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Serialization throughput benchmark for the export formats.
+
+Builds a 100,000-port fixture (10,000 hosts x 10 ports by default) and
+times the text report and each --format exporter writing to memory.
+
+Usage: python3 benchmarks/bench_export.py [--hosts N] [--ports N] [--repeat N]
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_result_model import build_nmap_dict
+from scanner.exporters import EXPORTERS, export_records
+from scanner.models import ScanResult
+from scanner.parser import NmapParser
+
+
+def time_best(function, repeat):
+    best = None
+    output = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure export serialization throughput')
+    parser.add_argument('--hosts', type=int, default=10000, help='Number of hosts (default: 10000)')
+    parser.add_argument('--ports', type=int, default=10, help='Ports per host (default: 10)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per format, best is kept (default: 3)')
+    args = parser.parse_args()
+
+    scan_result = ScanResult.from_nmap(build_nmap_dict(args.hosts, args.ports))
+    port_count = sum(record.port_count for record in scan_result)
+    results = {'hosts': scan_result.all_hosts(), 'scan_result': scan_result,
+               'scan_type': 'Quick Scan', 'timestamp': '2024-01-01 00:00:00'}
+
+    print(f"📤 Export throughput ({len(scan_result)} hosts, {port_count} ports, best of {args.repeat})")
+    print("=" * 60)
+
+    def run_text():
+        stream = io.StringIO()
+        NmapParser().write_results(results, '10.0.0.0/16', 'Quick Scan', stream)
+        return stream.getvalue().encode('utf-8')
+
+    timings = [('text', run_text)]
+    for format_name, (_, binary) in EXPORTERS.items():
+        def run_export(format_name=format_name, binary=binary):
+            stream = io.BytesIO() if binary else io.StringIO()
+            export_records(scan_result.hosts, format_name, stream)
+            value = stream.getvalue()
+            return value if binary else value.encode('utf-8')
+        timings.append((format_name, run_export))
+
+    for format_name, function in timings:
+        try:
+            elapsed, output = time_best(function, args.repeat)
+        except RuntimeError as e:
+            print(f"  {format_name:<8} skipped: {e}")
+            continue
+        print(f"  {format_name:<8} {elapsed * 1000:8.1f} ms   {port_count / elapsed:12,.0f} ports/s   "
+              f"{len(output) / elapsed / 1048576:7.1f} MiB/s   {len(output) / 1048576:6.1f} MiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the native asyncio TCP connect engine.
+
+Opens a number of listeners on 127.0.0.1, then scans a port range that
+contains them (every other port answers with a refusal) and reports
+probes per second at several concurrency levels. Runs offline.
+
+Usage: python3 benchmarks/bench_native.py [--listeners N] [--ports 1-20000]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scanner.native_scanner import NativeScanner
+from scanner.ports import parse_ports
+
+
+async def start_listeners(count):
+    """Start count asyncio servers on free localhost ports; returns (servers, ports)"""
+    async def handle(reader, writer):
+        writer.close()
+
+    servers = []
+    ports = []
+    for _ in range(count):
+        server = await asyncio.start_server(handle, '127.0.0.1', 0, backlog=1024)
+        servers.append(server)
+        ports.append(server.sockets[0].getsockname()[1])
+    return servers, ports
+
+
+async def run_benchmark(args):
+    servers, listener_ports = await start_listeners(args.listeners)
+    ports = sorted(set(parse_ports(args.ports)) | set(listener_ports))
+    print(f"⚡ Native connect scan: 127.0.0.1, {len(ports)} ports, {len(listener_ports)} listeners")
+    print("=" * 60)
+    try:
+        for concurrency in args.concurrency:
+            scanner = NativeScanner(concurrency=concurrency, per_host=concurrency,
+                                    timeout=args.timeout, retries=0)
+            start = time.perf_counter()
+            scan_result = await scanner.scan_async('127.0.0.1', ports)
+            elapsed = time.perf_counter() - start
+            found = set(scan_result['127.0.0.1'].open_ports()) if '127.0.0.1' in scan_result else set()
+            missing = len(set(listener_ports) - found)
+            print(f"   concurrency {scanner.concurrency:>5}: {elapsed:7.3f}s  "
+                  f"{scanner.probes / elapsed:10,.0f} probes/s  "
+                  f"{len(found)} open ({missing} listeners missed)")
+    finally:
+        for server in servers:
+            server.close()
+            await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure native connect-scan throughput on localhost')
+    parser.add_argument('--listeners', type=int, default=50, help='Listening sockets to open (default: 50)')
+    parser.add_argument('--ports', default='1-20000', help='Port range to scan (default: 1-20000)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[64, 512, 4096],
+                        help='Concurrency levels to compare (default: 64 512 4096)')
+    parser.add_argument('--timeout', type=float, default=1.0, help='Connect timeout in seconds (default: 1.0)')
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == '__main__':
+    main()
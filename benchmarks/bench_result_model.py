@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark for the compact result model.
+
+Builds a python-nmap style result for a /16 (65,536 hosts) and compares
+the memory held by the nested dicts with the ScanResult built from them.
+
+Usage: python3 benchmarks/bench_result_model.py [--hosts N] [--ports N]
+"""
+
+import argparse
+import gc
+import ipaddress
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scanner.models import ScanResult
+
+SERVICES = [
+    (22, 'ssh', 'OpenSSH', '8.9p1'),
+    (53, 'domain', 'dnsmasq', '2.86'),
+    (80, 'http', 'nginx', '1.24.0'),
+    (443, 'https', 'nginx', '1.24.0'),
+    (3389, 'ms-wbt-server', '', ''),
+    (8080, 'http-proxy', '', ''),
+]
+
+
+def build_nmap_dict(host_count, ports_per_host):
+    """python-nmap shaped result: {'nmap': ..., 'scan': {host: host_dict}}"""
+    scan = {}
+    network = ipaddress.ip_network('10.0.0.0/8')
+    for i in range(host_count):
+        host = str(network[i + 1])
+        tcp = {}
+        for j in range(ports_per_host):
+            port, name, product, version = SERVICES[(i + j) % len(SERVICES)]
+            tcp[port + j * 1000] = {
+                'state': 'open' if j % 3 else 'closed', 'reason': 'syn-ack',
+                'name': name, 'product': product, 'version': version,
+                'extrainfo': '', 'conf': '10', 'cpe': '',
+            }
+        scan[host] = {
+            'hostnames': [{'name': f'host{i}.lan', 'type': 'PTR'}],
+            'addresses': {'ipv4': host},
+            'vendor': {},
+            'status': {'state': 'up', 'reason': 'syn-ack'},
+            'tcp': tcp,
+        }
+    return {'nmap': {'command_line': 'nmap -oX - 10.0.0.0/16', 'scanstats': {}}, 'scan': scan}
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare nested-dict and ScanResult memory use')
+    parser.add_argument('--hosts', type=int, default=65536, help='Number of hosts (default: 65536)')
+    parser.add_argument('--ports', type=int, default=5, help='Ports per host (default: 5)')
+    args = parser.parse_args()
+
+    nmap_dict, dict_bytes, dict_time = measure(lambda: build_nmap_dict(args.hosts, args.ports))
+    scan_result, model_bytes, model_time = measure(lambda: ScanResult.from_nmap(nmap_dict))
+
+    print(f"📦 Result model memory ({args.hosts} hosts x {args.ports} ports)")
+    print("=" * 60)
+    print(f"  python-nmap dicts : {dict_bytes / 1048576:8.1f} MiB")
+    print(f"  ScanResult        : {model_bytes / 1048576:8.1f} MiB   (built in {model_time:.2f}s)")
+    print(f"  reduction         : {100 * (1 - model_bytes / dict_bytes):8.1f} %")
+    print(f"  distinct services : {len(scan_result.service_table)}")
+
+
+if __name__ == '__main__':
+    main()
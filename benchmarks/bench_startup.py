@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the Nmap Scanner CLI.
+
+Measures `nmap_cli.py --help` wall time and how long NmapScanner takes to
+construct and resolve nmap with a cold and a warm binary cache.
+
+Usage: python3 benchmarks/bench_startup.py [--runs N]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def time_command(command, runs, env=None):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def time_scanner_init(runs):
+    from scanner import nmap_binary
+    from scanner.nmap_wrapper import NmapScanner
+    results = {'construct': [], 'resolve_cold': [], 'resolve_warm': []}
+    cache_file = nmap_binary.get_cache_dir(nmap_binary.CACHE_FILE)
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        scanner = NmapScanner()
+        results['construct'].append((time.perf_counter() - start) * 1000)
+
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+        start = time.perf_counter()
+        scanner.check_nmap_installation()
+        results['resolve_cold'].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        NmapScanner().check_nmap_installation()
+        results['resolve_warm'].append((time.perf_counter() - start) * 1000)
+    return results
+
+
+def report(name, timings):
+    print(f"  {name:<28} median {statistics.median(timings):8.2f} ms   "
+          f"min {min(timings):8.2f} ms   max {max(timings):8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure CLI and scanner startup time')
+    parser.add_argument('--runs', type=int, default=10, help='Runs per measurement (default: 10)')
+    args = parser.parse_args()
+
+    # Keep the benchmark away from the user's real cache
+    os.environ['NMAP_SCANNER_CACHE_DIR'] = tempfile.mkdtemp(prefix='nmap_scanner_bench_')
+
+    print("⏱️  Startup benchmark")
+    print("=" * 60)
+    report('python -c pass', time_command([sys.executable, '-c', 'pass'], args.runs))
+    report('nmap_cli.py --help', time_command([sys.executable, 'nmap_cli.py', '--help'], args.runs))
+
+    from contextlib import redirect_stdout
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        init_timings = time_scanner_init(args.runs)
+    report('NmapScanner()', init_timings['construct'])
+    report('nmap lookup (cold cache)', init_timings['resolve_cold'])
+    report('nmap lookup (warm cache)', init_timings['resolve_warm'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Scan pipeline benchmark suite.
+
+For each fixture size (10, 10k and 100k hosts by default) it measures:
+
+  parse      python-nmap's XML parse plus ScanResult.from_nmap, and the
+             incremental parser behind --stream
+  format     NmapParser's text report, buffered and streaming
+  end-to-end nmap_cli.py against a stub nmap (benchmarks/fake_nmap.py) that
+             replays the fixture with a startup delay and per-host pacing:
+             total latency, time to the first streamed host
+
+Every parse/format measurement runs in a forked child so its peak RSS can
+be reported on its own; end-to-end runs report the CLI process's peak RSS.
+Needs nothing but this repo and python-nmap, no network and no real nmap.
+Results go to a JSON report; --compare prints the change against an
+earlier one.
+
+Usage: python3 benchmarks/bench_suite.py [--sizes 10,10000] [--output FILE] [--compare OLD.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_nmap import install_fake_nmap
+from nmap_fixtures import STANDARD_SIZES, fixture_path
+
+REPORT_VERSION = 1
+CLI_TARGET = '10.0.0.0/8'
+
+
+class NullWriter:
+    """Text sink that only counts what it is given"""
+
+    def __init__(self):
+        self.chars = 0
+
+    def write(self, text):
+        self.chars += len(text)
+
+
+def peak_rss():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_isolated(func, *args):
+    """Run func(*args) in a forked child and return its dict result
+
+    The child adds 'peak_rss_bytes' (peak RSS above what it inherited), so
+    one stage's memory never hides behind an earlier stage's high-water mark.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            baseline = peak_rss()
+            result = func(*args)
+            result['peak_rss_bytes'] = peak_rss() - baseline
+        except BaseException as e:
+            result = {'error': repr(e)}
+        with os.fdopen(write_fd, 'wb') as f:
+            f.write(json.dumps(result).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'rb') as f:
+        data = f.read()
+    os.waitpid(pid, 0)
+    result = json.loads(data or b'{"error": "child produced no result"}')
+    if 'error' in result:
+        raise RuntimeError(f"{func.__name__}: {result['error']}")
+    return result
+
+
+def median_run(runs, func, *args):
+    """Result of the median-time run out of runs isolated runs"""
+    samples = sorted((run_isolated(func, *args) for _ in range(runs)), key=lambda s: s['seconds'])
+    return samples[len(samples) // 2]
+
+
+def throughput(hosts, nbytes, seconds):
+    return {
+        'seconds': round(seconds, 6),
+        'hosts_per_second': round(hosts / seconds, 1) if seconds > 0 else None,
+        'mib_per_second': round(nbytes / 1048576 / seconds, 2) if seconds > 0 else None,
+    }
+
+
+def parse_python_nmap(fixture, nmap_path):
+    import nmap
+    from scanner.models import ScanResult
+    with open(fixture, 'r', encoding='utf-8') as f:
+        xml_text = f.read()
+    scanner = nmap.PortScanner(nmap_search_path=(nmap_path,))
+    start = time.perf_counter()
+    nmap_result = scanner.analyse_nmap_xml_scan(nmap_xml_output=xml_text)
+    parsed = time.perf_counter()
+    scan_result = ScanResult.from_nmap(nmap_result)
+    built = time.perf_counter()
+    return dict(throughput(len(scan_result.hosts), len(xml_text), built - start),
+                hosts=len(scan_result.hosts), xml_parse_seconds=round(parsed - start, 6),
+                result_build_seconds=round(built - parsed, 6))
+
+
+def parse_streaming(fixture):
+    from scanner.models import HostRecord, ServiceTable
+    from scanner.streaming import iter_nmap_xml
+    service_table = ServiceTable()
+    hosts = 0
+    start = time.perf_counter()
+    with open(fixture, 'rb') as f:
+        for host, host_data in iter_nmap_xml(f):
+            HostRecord.from_host_data(host, host_data, service_table)
+            hosts += 1
+    elapsed = time.perf_counter() - start
+    return dict(throughput(hosts, os.path.getsize(fixture), elapsed), hosts=hosts)
+
+
+def load_scan_result(fixture):
+    from scanner.models import HostRecord, ScanResult, ServiceTable
+    from scanner.streaming import iter_nmap_xml
+    service_table = ServiceTable()
+    with open(fixture, 'rb') as f:
+        records = [HostRecord.from_host_data(host, host_data, service_table)
+                   for host, host_data in iter_nmap_xml(f)]
+    return ScanResult(records, service_table)
+
+
+def format_report(fixture):
+    from scanner.parser import NmapParser
+    scan_result = load_scan_result(fixture)
+    results = {'hosts': scan_result.all_hosts(), 'scan_result': scan_result,
+               'scan_type': 'Service Detection', 'timestamp': '2023-11-14 22:13:20'}
+    sink = NullWriter()
+    start = time.perf_counter()
+    NmapParser().write_results(results, CLI_TARGET, 'Service Detection', sink)
+    elapsed = time.perf_counter() - start
+    return dict(throughput(len(scan_result.hosts), sink.chars, elapsed), output_chars=sink.chars)
+
+
+def format_streaming(fixture):
+    from scanner.parser import NmapParser
+    scan_result = load_scan_result(fixture)
+    sink = NullWriter()
+    start = time.perf_counter()
+    for block in NmapParser().format_stream(iter(scan_result.hosts), CLI_TARGET, 'Service Detection'):
+        sink.write(block + "\n")
+    elapsed = time.perf_counter() - start
+    return dict(throughput(len(scan_result.hosts), sink.chars, elapsed), output_chars=sink.chars)
+
+
+def run_cli(extra_args, env):
+    """Run nmap_cli.py once: total seconds, seconds to the first host block, peak RSS"""
+    command = [sys.executable, os.path.join(ROOT, 'nmap_cli.py'), CLI_TARGET,
+               '--no-cache', '--no-history', '--no-checkpoint'] + extra_args
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    first_host = None
+    for line in process.stdout:
+        if first_host is None and line.startswith('🌐 Host:'.encode()):
+            first_host = time.perf_counter() - start
+    process.stdout.close()
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    if status != 0:
+        raise RuntimeError(f"nmap_cli.py {' '.join(extra_args)} exited with status {status}")
+    return {
+        'seconds': round(elapsed, 6),
+        'first_host_seconds': round(first_host, 6) if first_host is not None else None,
+        'peak_rss_bytes': usage.ru_maxrss * 1024,
+    }
+
+
+def end_to_end(fixture, env, runs):
+    """Median of runs CLI runs, buffered and --stream"""
+    env = dict(env, FAKE_NMAP_FIXTURE=fixture)
+    results = {}
+    for name, extra_args in (('buffered', []), ('stream', ['--stream'])):
+        samples = sorted((run_cli(extra_args, env) for _ in range(runs)), key=lambda s: s['seconds'])
+        results[name] = samples[len(samples) // 2]
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def flatten(report):
+    """{'size/stage/metric': value} for every numeric metric in a report"""
+    values = {}
+    for size, stages in report['results'].items():
+        for stage, metrics in stages.items():
+            for metric, value in metrics.items():
+                if isinstance(value, dict):
+                    for inner, inner_value in value.items():
+                        values[f"{size}/{stage}.{metric}/{inner}"] = inner_value
+                elif isinstance(value, (int, float)):
+                    values[f"{size}/{stage}/{metric}"] = value
+    return values
+
+
+def compare(old_report, new_report):
+    old, new = flatten(old_report), flatten(new_report)
+    print(f"\n📊 Compared with {old_report.get('git_commit') or 'previous report'}")
+    print("-" * 60)
+    common = sorted(key for key in new if old.get(key) and new[key] is not None)
+    if not common:
+        print("  (no sizes in common)")
+    for key in common:
+        # Throughput up is good; time and memory up is bad
+        change = (new[key] - old[key]) / old[key]
+        better = change > 0 if key.endswith('_per_second') else change < 0
+        marker = '  ' if abs(change) < 0.05 else ('✅' if better else '⚠️ ')
+        print(f"  {marker} {key:<52} {old[key]:>12.4g} -> {new[key]:<12.4g} {change:+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parsing, formatting and end-to-end scans')
+    parser.add_argument('--sizes', default=",".join(map(str, STANDARD_SIZES)),
+                        help='Comma-separated fixture sizes in hosts (default: 10,10000,100000)')
+    parser.add_argument('--runs', type=int, default=3, help='Runs of every measurement, median kept (default: 3)')
+    parser.add_argument('--startup-delay', type=float, default=0.05,
+                        help='Stub nmap delay before its first output, seconds (default: 0.05)')
+    parser.add_argument('--host-delay', type=float, default=0.0001,
+                        help='Stub nmap delay between hosts, seconds (default: 0.0001)')
+    parser.add_argument('--fixtures-dir', help='Where fixtures are generated and kept (default: user cache dir)')
+    parser.add_argument('--output', '-o', help='JSON report path (default: bench-<commit>-<time>.json here)')
+    parser.add_argument('--compare', help='Earlier JSON report to compare against')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    work_dir = tempfile.mkdtemp(prefix='nmap_scanner_bench_')
+    nmap_path = install_fake_nmap(work_dir)
+    # The stub must win the PATH lookup, and nothing may touch the user's cache or data
+    env = dict(os.environ, PATH=work_dir + os.pathsep + os.environ.get('PATH', ''),
+               NMAP_SCANNER_CACHE_DIR=os.path.join(work_dir, 'cache'),
+               NMAP_SCANNER_DATA_DIR=os.path.join(work_dir, 'data'),
+               FAKE_NMAP_STARTUP_DELAY=str(args.startup_delay), FAKE_NMAP_HOST_DELAY=str(args.host_delay))
+
+    report = {
+        'report_version': REPORT_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': {'runs': args.runs, 'startup_delay': args.startup_delay, 'host_delay': args.host_delay},
+        'results': {},
+    }
+
+    print("🏁 Scan pipeline benchmark")
+    print("=" * 60)
+    for size in sizes:
+        fixture = fixture_path(size, directory=args.fixtures_dir)
+        print(f"\n📄 {size} hosts ({os.path.getsize(fixture) / 1048576:.1f} MiB of XML)")
+        stages = {
+            'parse_python_nmap': median_run(args.runs, parse_python_nmap, fixture, nmap_path),
+            'parse_streaming': median_run(args.runs, parse_streaming, fixture),
+            'format_report': median_run(args.runs, format_report, fixture),
+            'format_streaming': median_run(args.runs, format_streaming, fixture),
+        }
+        for name, result in stages.items():
+            print(f"  {name:<20} {result['seconds']:9.3f}s  {result['hosts_per_second'] or 0:>11,.0f} hosts/s  "
+                  f"{result['mib_per_second'] or 0:8.1f} MiB/s  peak +{result['peak_rss_bytes'] / 1048576:7.1f} MiB")
+        stages['end_to_end'] = end_to_end(fixture, env, args.runs)
+        for mode, result in stages['end_to_end'].items():
+            first = result['first_host_seconds']
+            first_text = f"first host {first:7.3f}s" if first is not None else ""
+            print(f"  {'cli ' + mode:<20} {result['seconds']:9.3f}s  {first_text:<27} "
+                  f"peak RSS {result['peak_rss_bytes'] / 1048576:7.1f} MiB")
+        report['results'][str(size)] = stages
+
+    output = args.output or f"bench-{report['git_commit'] or 'unknown'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Report written to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Stand-in nmap executable for the benchmarks.
+
+Answers --version like nmap 7.94 and otherwise replays a fixture's XML on
+stdout, whatever the targets and options, pacing the hosts the way a real
+scan would deliver them. Configured through the environment:
+
+  FAKE_NMAP_FIXTURE        XML file to replay (required for scans)
+  FAKE_NMAP_STARTUP_DELAY  seconds before the first byte (default: 0.05)
+  FAKE_NMAP_HOST_DELAY     seconds between hosts (default: 0)
+
+install_fake_nmap() puts it on PATH as "nmap" for NmapScanner to find.
+"""
+
+import os
+import stat
+import sys
+import time
+
+VERSION_TEXT = """Nmap version 7.94 ( https://nmap.org )
+Platform: x86_64-pc-linux-gnu
+Compiled with: liblua-5.4.6 openssl-3.0.13 libssh2-1.11.0 libz-1.3 libpcre2-10.42 nmap-libpcap-1.10.4 nmap-libdnet-1.12 ipv6
+"""
+
+
+def replay(fixture, startup_delay, host_delay, output):
+    """Copy fixture to output, writing host i no earlier than startup + i * host_delay"""
+    time.sleep(startup_delay)
+    started = time.perf_counter()
+    hosts = 0
+    pending = []
+    with open(fixture, 'rb') as f:
+        for line in f:
+            pending.append(line)
+            if not line.startswith(b'</host>'):
+                continue
+            hosts += 1
+            due = started + hosts * host_delay
+            now = time.perf_counter()
+            # Sleeping per host would be dominated by timer granularity;
+            # hosts that are already due go out together
+            if due - now > 0.001:
+                output.write(b''.join(pending))
+                output.flush()
+                pending = []
+                time.sleep(due - now)
+            elif len(pending) > 512:
+                output.write(b''.join(pending))
+                pending = []
+    output.write(b''.join(pending))
+    output.flush()
+
+
+def install_fake_nmap(directory):
+    """Write an executable "nmap" into directory that runs this script; returns its path"""
+    path = os.path.join(directory, 'nmap')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"#!{sys.executable}\n")
+        f.write("import runpy\n")
+        f.write(f"runpy.run_path({os.path.abspath(__file__)!r}, run_name='__main__')\n")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return path
+
+
+def main():
+    args = sys.argv[1:]
+    if '--version' in args or '-V' in args:
+        sys.stdout.write(VERSION_TEXT)
+        return 0
+    fixture = os.environ.get('FAKE_NMAP_FIXTURE')
+    if not fixture:
+        sys.stderr.write("fake nmap: FAKE_NMAP_FIXTURE is not set\n")
+        return 1
+    replay(fixture,
+           float(os.environ.get('FAKE_NMAP_STARTUP_DELAY', '0.05')),
+           float(os.environ.get('FAKE_NMAP_HOST_DELAY', '0')),
+           sys.stdout.buffer)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
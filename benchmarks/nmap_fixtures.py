@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Synthetic nmap XML fixtures for the benchmarks.
+
+Writes -oX output for N hosts that looks like a real service scan of a
+large network: a mix of up and down hosts, PTR names, open/closed/filtered
+ports with product, version and CPE, the odd OS match, and runstats. The
+same (hosts, seed) always produces the same bytes, so runs are comparable.
+
+Usage: python3 benchmarks/nmap_fixtures.py --hosts 10000 [--output FILE]
+"""
+
+import argparse
+import ipaddress
+import os
+import random
+import sys
+from xml.sax.saxutils import quoteattr
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STANDARD_SIZES = (10, 10000, 100000)
+FIXTURE_VERSION = 1
+NETWORK = ipaddress.ip_network('10.0.0.0/8')
+
+# port, service, product, version, cpe
+SERVICES = [
+    (22, 'ssh', 'OpenSSH', '8.9p1 Ubuntu 3ubuntu0.6', 'cpe:/a:openbsd:openssh:8.9p1'),
+    (22, 'ssh', 'Dropbear sshd', '2022.83', 'cpe:/a:matt_johnston:dropbear_ssh_server:2022.83'),
+    (53, 'domain', 'dnsmasq', '2.86', 'cpe:/a:thekelleys:dnsmasq:2.86'),
+    (80, 'http', 'nginx', '1.24.0', 'cpe:/a:igor_sysoev:nginx:1.24.0'),
+    (80, 'http', 'Apache httpd', '2.4.57', 'cpe:/a:apache:http_server:2.4.57'),
+    (443, 'https', 'nginx', '1.24.0', 'cpe:/a:igor_sysoev:nginx:1.24.0'),
+    (445, 'microsoft-ds', '', '', ''),
+    (3306, 'mysql', 'MySQL', '8.0.35', 'cpe:/a:mysql:mysql:8.0.35'),
+    (3389, 'ms-wbt-server', 'Microsoft Terminal Services', '', 'cpe:/o:microsoft:windows'),
+    (5432, 'postgresql', 'PostgreSQL DB', '15.4', 'cpe:/a:postgresql:postgresql:15'),
+    (8080, 'http-proxy', '', '', ''),
+    (9100, 'jetdirect', '', '', ''),
+]
+OS_MATCHES = [
+    ('Linux 5.0 - 5.14', 'Linux', '5.X', 'cpe:/o:linux:linux_kernel:5'),
+    ('Microsoft Windows 10 1909 - 2004', 'Windows', '10', 'cpe:/o:microsoft:windows_10'),
+    ('FreeBSD 13.0-RELEASE', 'FreeBSD', '13.X', 'cpe:/o:freebsd:freebsd:13.0'),
+]
+
+
+def host_block(rng, address, index, up):
+    """One <host> element"""
+    if not up:
+        return (f'<host starttime="1700000000" endtime="1700000001"><status state="down" reason="no-response" '
+                f'reason_ttl="0"/>\n<address addr="{address}" addrtype="ipv4"/>\n<hostnames>\n</hostnames>\n'
+                f'<times srtt="-1" rttvar="-1" to="1000000"/>\n</host>\n')
+
+    lines = ['<host starttime="1700000000" endtime="1700000042"><status state="up" reason="syn-ack" '
+             'reason_ttl="63"/>',
+             f'<address addr="{address}" addrtype="ipv4"/>']
+    if rng.random() < 0.3:
+        mac = ':'.join(f'{rng.randrange(256):02X}' for _ in range(6))
+        lines.append(f'<address addr="{mac}" addrtype="mac" vendor="Super Micro Computer"/>')
+    lines.append('<hostnames>')
+    if rng.random() < 0.6:
+        lines.append(f'<hostname name="host{index}.corp.example.com" type="PTR"/>')
+    lines.append('</hostnames>')
+
+    lines.append('<ports><extraports state="closed" count="95">'
+                 '<extrareasons reason="resets" count="95"/></extraports>')
+    seen = set()
+    for _ in range(rng.randrange(0, 9)):
+        port, name, product, version, cpe = rng.choice(SERVICES)
+        if port in seen:
+            continue
+        seen.add(port)
+        state, reason = rng.choice((('open', 'syn-ack'),) * 6 + (('closed', 'reset'), ('filtered', 'no-response')))
+        attributes = f'name="{name}"'
+        if product:
+            attributes += f' product={quoteattr(product)}'
+        if version:
+            attributes += f' version={quoteattr(version)}'
+        attributes += ' method="probed" conf="10"' if product else ' method="table" conf="3"'
+        service = f'<service {attributes}>' + (f'<cpe>{cpe}</cpe>' if cpe else '') + '</service>'
+        lines.append(f'<port protocol="tcp" portid="{port}"><state state="{state}" reason="{reason}" '
+                     f'reason_ttl="63"/>{service}</port>')
+    lines.append('</ports>')
+
+    if rng.random() < 0.1:
+        name, family, generation, cpe = rng.choice(OS_MATCHES)
+        lines.append('<os><portused state="open" proto="tcp" portid="22"/>'
+                     f'<osmatch name="{name}" accuracy="96" line="1">'
+                     f'<osclass type="general purpose" vendor="{family}" osfamily="{family}" '
+                     f'osgen="{generation}" accuracy="96"><cpe>{cpe}</cpe></osclass></osmatch></os>')
+        lines.append(f'<uptime seconds="{rng.randrange(10 ** 6)}" lastboot="Mon Nov 13 10:00:00 2023"/>')
+
+    srtt = rng.randrange(200, 60000)
+    lines.append(f'<times srtt="{srtt}" rttvar="{srtt // 4}" to="{max(100000, srtt * 4)}"/>')
+    lines.append('</host>')
+    return "\n".join(lines) + "\n"
+
+
+def generate_fixture(output, hosts, seed=0):
+    """Write a fixture for hosts hosts to the binary file object output; returns hosts up"""
+    rng = random.Random(seed)
+    output.write(b'<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE nmaprun>\n')
+    output.write(f'<nmaprun scanner="nmap" args="nmap -oX - -sV {NETWORK}" start="1700000000" '
+                 f'startstr="Tue Nov 14 22:13:20 2023" version="7.94" xmloutputversion="1.05">\n'.encode())
+    output.write(b'<scaninfo type="syn" protocol="tcp" numservices="100" services="7,9,13,21-23,25-26,37,53,'
+                 b'79-81,88,106,110-111,113,119,135,139,143-144,179,199,389,427,443-445,465"/>\n'
+                 b'<verbose level="0"/>\n<debugging level="0"/>\n')
+    up = 0
+    for index in range(hosts):
+        # About 1 in 5 hosts is down
+        host_up = rng.random() >= 0.2
+        up += host_up
+        output.write(host_block(rng, NETWORK[index + 1], index, host_up).encode())
+    output.write(f'<runstats><finished time="1700004000" timestr="Tue Nov 14 23:20:00 2023" '
+                 f'summary="Nmap done" elapsed="4000.00" exit="success"/>'
+                 f'<hosts up="{up}" down="{hosts - up}" total="{hosts}"/>\n</runstats>\n</nmaprun>\n'.encode())
+    return up
+
+
+def fixture_path(hosts, seed=0, directory=None):
+    """Path of the fixture for (hosts, seed), generating it on first use"""
+    if directory is None:
+        from scanner.paths import get_cache_dir
+        directory = get_cache_dir('bench_fixtures')
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'nmap-{hosts}-hosts-seed{seed}-v{FIXTURE_VERSION}.xml')
+    if not os.path.exists(path):
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            generate_fixture(f, hosts, seed)
+        os.replace(temp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic nmap XML fixture')
+    parser.add_argument('--hosts', type=int, default=10000, help='Number of hosts (default: 10000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--output', '-o', help='Output file (default: stdout)')
+    args = parser.parse_args()
+
+    if args.output:
+        with open(args.output, 'wb') as f:
+            up = generate_fixture(f, args.hosts, args.seed)
+    else:
+        up = generate_fixture(sys.stdout.buffer, args.hosts, args.seed)
+    print(f"📄 {args.hosts} hosts ({up} up)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,14 +13,21 @@ import customtkinter as ctk
 import tkinter as tk
 from tkinter import messagebox, filedialog
 import threading
+import queue
 import json
 import os
 import sys
 import ipaddress
 import socket
-from datetime import datetime
+from datetime import datetime, timedelta
 from scanner.nmap_wrapper import NmapScanner
 from scanner.parser import NmapParser
+from scanner.history import ScanHistory
+
+# Queued scan output is applied to the widgets at most this often, and at
+# most this many characters per frame, so big results never stall Tk
+FRAME_INTERVAL_MS = 100
+MAX_CHARS_PER_FRAME = 64 * 1024
 
 class NmapGui(ctk.CTk):
     def __init__(self):
@@ -42,6 +49,11 @@ class NmapGui(ctk.CTk):
         # Initialize scanner
         self.scanner = NmapScanner()
         self.is_scanning = False
+        # Filled by the scan thread, drained on the Tk thread by drain_updates
+        self.updates = queue.Queue()
+        self.scan_progress = None
+        self.hosts_done = 0
+        self.stop_requested = False
         
         self.create_widgets()
         
@@ -169,61 +181,149 @@ class NmapGui(ctk.CTk):
         self.scan_button.configure(state="disabled")
         self.stop_button.configure(state="normal")
         self.status_label.configure(text=f"Scanning {target}...")
-        self.progress_bar.set(0.1)
+        self.progress_bar.set(0)
         
         # Clear previous results
         self.results_textbox.delete(1.0, tk.END)
         
+        # A fresh queue per scan, so a late update from an earlier scan
+        # can never land in this one
+        self.updates = queue.Queue()
+        self.scan_progress = None
+        self.hosts_done = 0
+        self.stop_requested = False
+        self.after(FRAME_INTERVAL_MS, self.drain_updates, self.updates, target)
+        
         # Start scan in separate thread
-        scan_thread = threading.Thread(target=self.perform_scan, args=(target,))
+        scan_thread = threading.Thread(target=self.perform_scan, args=(target, self.updates))
         scan_thread.daemon = True
         scan_thread.start()
         
-    def perform_scan(self, target):
+    def perform_scan(self, target, updates):
+        """Run the scan on a worker thread, queueing text and progress for the UI"""
         try:
             scan_type = self.scan_type_var.get()
             port_range = self.port_entry.get().strip()
+            parser = NmapParser()
             
-            self.progress_bar.set(0.3)
+            if not self.scanner.nmap_available:
+                results = self.scanner.scan(target, scan_type, port_range)
+                self.record_history(target, scan_type, port_range, results)
+                for chunk in parser.iter_results(results, target, scan_type):
+                    updates.put(('text', chunk))
+                return
             
-            # Perform the scan
-            results = self.scanner.scan(target, scan_type, port_range)
+            # Stream hosts as nmap finishes them, with its own progress reports
+            records = self.count_hosts(self.scanner.scan_stream(
+                target, scan_type, port_range,
+                on_progress=lambda progress: updates.put(('progress', progress))))
+            if self.stop_requested:
+                # Stop was pressed before scan_stream() started this scan and cleared the scanner's stop
+                updates.put(('text', "⏹️  Scan stopped by user before it started\n"))
+                return
+            history = self.open_history()
+            try:
+                if history:
+                    scan_id = history.begin_scan(target, scan_type,
+                                                 self.scanner.get_scan_arguments(scan_type, port_range))
+                    records = history.record_stream(scan_id, records)
+                for block in parser.format_stream(records, target, scan_type):
+                    updates.put(('text', block + "\n"))
+                if self.stop_requested:
+                    updates.put(('text', "\n⏹️  Scan stopped by user - results above are partial\n"))
+            finally:
+                if history:
+                    history.close()
             
-            self.progress_bar.set(0.8)
+        except Exception as e:
+            updates.put(('text', f"Error during scan: {str(e)}"))
+        finally:
+            updates.put(('done', None))
             
-            # Parse and format results
-            parser = NmapParser()
-            formatted_results = parser.format_results(results, target, scan_type)
+    def count_hosts(self, records):
+        for count, record in enumerate(records, 1):
+            self.hosts_done = count
+            yield record
             
-            self.progress_bar.set(1.0)
+    def open_history(self):
+        try:
+            return ScanHistory()
+        except Exception as e:
+            print(f"Could not open scan history: {e}")
+            return None
             
-            # Update UI in main thread
-            self.after(0, self.update_results, formatted_results)
+    def drain_updates(self, updates, target):
+        """Apply queued scan output on the Tk thread, one bounded batch per frame"""
+        chunks = []
+        size = 0
+        done = False
+        while size < MAX_CHARS_PER_FRAME:
+            try:
+                kind, payload = updates.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'text':
+                chunks.append(payload)
+                size += len(payload)
+            elif kind == 'progress':
+                # Only the latest report matters
+                self.scan_progress = payload
+            elif kind == 'done':
+                done = True
+                break
+        
+        if chunks:
+            self.update_results("".join(chunks))
+        if updates is not self.updates:
+            return
+        if done:
+            self.scan_complete()
+            return
+        if self.is_scanning and not self.stop_requested:
+            self.show_progress(target)
+        self.after(FRAME_INTERVAL_MS, self.drain_updates, updates, target)
+        
+    def show_progress(self, target):
+        progress = self.scan_progress
+        status = f"Scanning {target}..."
+        if progress:
+            remaining = str(timedelta(seconds=progress['remaining']))
+            status += f" {progress['percent']:.1f}% ({progress['task']}), ETA {remaining}"
+            self.progress_bar.set(progress['percent'] / 100)
+        if self.hosts_done:
+            status += f" - {self.hosts_done} hosts done"
+        self.status_label.configure(text=status)
             
+    def record_history(self, target, scan_type, port_range, results):
+        if 'scan_result' not in results:
+            return
+        try:
+            with ScanHistory() as history:
+                history.record_scan(target, scan_type, results['scan_result'],
+                                    self.scanner.get_scan_arguments(scan_type, port_range))
         except Exception as e:
-            error_msg = f"Error during scan: {str(e)}"
-            self.after(0, self.update_results, error_msg)
-        finally:
-            self.after(0, self.scan_complete)
+            print(f"Could not record scan history: {e}")
             
     def update_results(self, results):
         self.results_textbox.insert(tk.END, results)
+        self.results_textbox.see(tk.END)
         
     def scan_complete(self):
         self.is_scanning = False
         self.scan_button.configure(state="normal")
         self.stop_button.configure(state="disabled")
-        self.status_label.configure(text="Scan completed")
+        self.status_label.configure(text="Scan stopped" if self.stop_requested else "Scan completed")
         self.progress_bar.set(0)
         
     def stop_scan(self):
-        # Note: This is a simplified stop - in a real implementation,
-        # you'd need to handle process termination
-        self.is_scanning = False
-        self.scan_button.configure(state="normal")
+        if not self.is_scanning:
+            return
+        # Kill nmap's process group; the scan thread then queues the hosts
+        # it already has and finishes as usual, ending in scan_complete()
+        self.stop_requested = True
+        self.scanner.stop()
         self.stop_button.configure(state="disabled")
-        self.status_label.configure(text="Scan stopped")
-        self.progress_bar.set(0)
+        self.status_label.configure(text="Stopping...")
         
     def save_results(self):
         content = self.results_textbox.get(1.0, tk.END).strip()
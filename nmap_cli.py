@@ -12,9 +12,16 @@ License: MIT
 import sys
 import os
 import argparse
+import contextlib
+import json
+import re
+import threading
+import time
 from datetime import datetime
+from scanner.models import ScanResult, ServiceTable
 from scanner.nmap_wrapper import NmapScanner
 from scanner.parser import NmapParser
+from scanner.profiling import ProfiledWriter, phase_context
 
 def print_banner():
     """Print application banner"""
@@ -49,6 +56,71 @@ Port range scans:
   python3 nmap_cli.py 192.168.1.1 --ports "22,80,443,8080"
   python3 nmap_cli.py 192.168.1.1 --scan-type "Port Scan" --ports "1-65535"
 
+Parallel scans of large networks:
+  python3 nmap_cli.py 10.0.0.0/16 --workers 8
+  python3 nmap_cli.py 10.0.0.0/16 --workers 8 --shard-size 1024
+  python3 nmap_cli.py 192.168.1.1 --ports "1-65535" --port-slices 8
+
+Discover live hosts first, port-scan them while the sweep continues:
+  python3 nmap_cli.py 10.0.0.0/16 --pipeline --workers 8 --scan-type "Service Detection"
+
+Result cache (identical scans within the TTL are served instantly):
+  python3 nmap_cli.py 192.168.1.0/24 --cache-ttl 600
+  python3 nmap_cli.py 192.168.1.0/24 --no-cache
+
+Ports that were open on this network before are scanned first, then the rest:
+  python3 nmap_cli.py 10.0.0.0/16 --likely-ports --stream
+  python3 nmap_cli.py 10.0.0.0/16 --likely-ports --ports 1-65535 --port-history 30d
+
+Incremental version detection (only new ports are fingerprinted again):
+  python3 nmap_cli.py 10.0.0.0/16 --scan-type "Service Detection" --incremental
+
+Machine-readable output (one record per host, or per port for CSV):
+  python3 nmap_cli.py 192.168.1.0/24 --format jsonl > hosts.jsonl
+  python3 nmap_cli.py 10.0.0.0/16 --stream --format csv --output ports.csv
+
+Search past scans (every scan is recorded unless --no-history is given):
+  python3 nmap_cli.py query --port 3389 --since 7d
+  python3 nmap_cli.py query --scans
+
+Without nmap (asyncio TCP connect scan, no root needed):
+  python3 nmap_cli.py 192.168.1.0/24 --engine native --ports "1-1024"
+
+Adaptive timing (rate/retry limits learned per network, kept between runs):
+  python3 nmap_cli.py 10.0.0.0/16 --workers 8 --adaptive-timing
+
+Streaming output (hosts are printed as soon as they finish):
+  python3 nmap_cli.py 10.0.0.0/16 --stream --output results.txt
+
+Large hostname lists (parallel cached DNS up front, nmap runs with -n):
+  python3 nmap_cli.py "$(cat hosts.txt)" --resolve --workers 8
+  python3 nmap_cli.py 10.0.0.0/22 --reverse-dns
+
+Target lists from a file or stdin (deduplicated, scanned in batches):
+  python3 nmap_cli.py -iL targets.txt --exclude-file blocklist.txt --stream
+  cat ranges.txt | python3 nmap_cli.py -iL - --exclude 10.0.0.0/24 --batch-size 1024
+
+Where does the time go? (per-phase breakdown, Prometheus metrics file):
+  python3 nmap_cli.py 192.168.1.0/24 --profile
+  python3 nmap_cli.py 192.168.1.0/24 --metrics-file /var/lib/node_exporter/textfile/nmap_scan.prom
+
+Distributed scan (coordinator hands work units to worker agents on other boxes):
+  python3 nmap_cli.py coordinator 10.0.0.0/16 --listen 0.0.0.0:8787 --token s3cret
+  python3 nmap_cli.py worker http://coordinator:8787 --token s3cret
+
+Watch a network and report changes (hosts that change are rescanned more often):
+  python3 nmap_cli.py monitor 192.168.1.0/24 --min-interval 5m --max-interval 1d
+
+Scan-job service for automation (warm scanners, queued jobs, results by job ID):
+  python3 nmap_cli.py serve --workers 4
+  curl -s -d '{"target": "192.168.1.1", "priority": 1}' localhost:8788/jobs
+
+Resume an interrupted scan (finished hosts/shards are checkpointed):
+  python3 nmap_cli.py 10.0.0.0/16 --workers 8 --resume
+
+Raw nmap XML of a host, from the compressed archive every scan is kept in:
+  python3 nmap_cli.py archive 10.0.0.5 --latest > host.xml
+
 🎯 SCAN TYPES:
   • Quick Scan      - Fast scan of most common ports
   • Intense Scan    - Comprehensive scan with OS detection  
@@ -77,8 +149,721 @@ def validate_target(target):
     if len(target.strip()) < 3:
         return False, "Target seems too short"
     
+    from scanner.targets import parse_target
+    for token in target.split():
+        try:
+            parse_target(token)
+        except ValueError as e:
+            return False, str(e)
+    
     return True, "Valid"
 
+def load_targets(args):
+    """TargetSet from the target, -iL and the exclusions, or None for a plain target
+    
+    Raises ValueError if there is nothing left to scan.
+    """
+    if not (args.input_list or args.exclude or args.exclude_file):
+        return None
+    from scanner.targets import TargetSet, read_targets, split_target_list
+    targets = TargetSet()
+    if args.target:
+        targets.add_tokens(args.target.split())
+    if args.input_list:
+        read_targets(args.input_list, targets)
+    excluded = TargetSet()
+    if args.exclude:
+        excluded.add_tokens(split_target_list(args.exclude))
+    if args.exclude_file:
+        read_targets(args.exclude_file, excluded)
+    for message in (targets.invalid + excluded.invalid)[:5]:
+        print(f"⚠️  Skipped: {message}")
+    if len(targets.invalid) + len(excluded.invalid) > 5:
+        print(f"⚠️  ... {len(targets.invalid) + len(excluded.invalid) - 5} more invalid targets skipped")
+    targets.exclude(excluded)
+    if not targets:
+        raise ValueError("No targets left to scan")
+    return targets
+
+def stream_scan(scanner, parser_obj, args, records=None, history=None, checkpoint=None):
+    """Run a streaming scan, printing and saving each host block as it arrives"""
+    output_file = None
+    try:
+        if args.output:
+            output_file = open(args.output, 'w', encoding='utf-8')
+            output_file.write(f"Scan Results - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            output_file.write("=" * 60 + "\n")
+            output_file.write(f"Target: {args.target}\n")
+            output_file.write(f"Scan Type: {args.scan_type}\n")
+            if args.ports:
+                output_file.write(f"Port Range: {args.ports}\n")
+            output_file.write("\n")
+        
+        if records is None:
+            records = scanner.scan_stream(args.target, args.scan_type, args.ports,
+                                          checkpoint=checkpoint)
+        if history:
+            scan_id = history.begin_scan(args.target, args.scan_type,
+                                         scanner.get_scan_arguments(args.scan_type, args.ports))
+            records = history.record_stream(scan_id, records)
+        console = sys.stdout
+        if scanner.profiler:
+            records = scanner.profiler.count_hosts(records)
+            console = ProfiledWriter(console, scanner.profiler)
+            if output_file:
+                output_file = ProfiledWriter(output_file, scanner.profiler)
+        with phase_context(scanner.profiler, 'format'):
+            for block in parser_obj.format_stream(records, args.target, args.scan_type):
+                print(block, file=console, flush=True)
+                if output_file:
+                    output_file.write(block + "\n")
+        if checkpoint is not None and not scanner.stop_requested.is_set():
+            checkpoint.finish()
+    finally:
+        if output_file:
+            output_file.close()
+            print(f"\n💾 Results saved to: {args.output}")
+    
+    return 0
+
+def pipeline_scan(scanner, parser_obj, args, history=None):
+    """Run host discovery and port scanning as overlapping stages"""
+    from scanner.pipeline import DiscoveryPipeline
+    pipeline = DiscoveryPipeline(scanner, port_workers=args.workers)
+    records = pipeline.run(args.target, args.scan_type, args.ports)
+    try:
+        exit_code = stream_scan(scanner, parser_obj, args, records, history)
+    except KeyboardInterrupt:
+        # The pipeline's nmaps run in their own process groups; Ctrl-C only reached us
+        pipeline.stop()
+        raise
+    print(parser_obj.format_pipeline_stats(pipeline.stats()))
+    if scanner.profiler:
+        scanner.profiler.count('errors', sum(len(stage.errors) for stage in pipeline.stats()))
+    return exit_code
+
+def scan_batches(scanner, args):
+    """HostRecords of every batch of a target list too large for one nmap run"""
+    return scanner.scan_batches(args.targets.batches(args.batch_size), args.scan_type, args.ports,
+                                workers=args.workers, hosts_per_shard=args.shard_size,
+                                engine=args.engine, port_slices=args.port_slices)
+
+def report_batch_errors(scanner):
+    """List the batches of a target list that couldn't be scanned"""
+    if scanner.profiler:
+        scanner.profiler.count('errors', len(scanner.batch_errors))
+    if scanner.batch_errors:
+        print(f"\n⚠️  {len(scanner.batch_errors)} batch(es) failed:")
+        for batch, error in scanner.batch_errors:
+            batch = batch if len(batch) <= 60 else batch[:57] + '...'
+            print(f"   {batch}: {error}")
+
+def batch_scan(scanner, parser_obj, args, history=None):
+    """Scan a multi-batch target list, printing each host as it arrives"""
+    exit_code = stream_scan(scanner, parser_obj, args, scan_batches(scanner, args), history)
+    report_batch_errors(scanner)
+    return 1 if scanner.batch_errors else exit_code
+
+def open_history(args):
+    """Open the scan history store unless disabled; never fatal"""
+    if args.no_history:
+        return None
+    try:
+        from scanner.history import ScanHistory
+        return ScanHistory(args.history_db)
+    except Exception as e:
+        print(f"⚠️  Scan history disabled: {e}")
+        return None
+
+def open_checkpoint(args, scanner):
+    """Open the checkpoint file of an nmap scan unless disabled; never fatal"""
+    if (args.no_checkpoint or args.pipeline or args.engine != 'nmap' or not scanner.nmap_available
+            or args.targets is not None or scanner.port_model is not None):
+        return None
+    try:
+        from scanner.checkpoint import ScanCheckpoint
+        checkpoint = ScanCheckpoint(args.target, args.scan_type,
+                                    scanner.get_scan_arguments(args.scan_type, args.ports),
+                                    resume=args.resume)
+    except Exception as e:
+        print(f"⚠️  Checkpointing disabled: {e}")
+        return None
+    if checkpoint.discarded:
+        print("♻️  Starting over an unfinished run of this scan (use --resume to continue it)")
+    elif len(checkpoint):
+        print(f"⏯️  Resuming: {len(checkpoint)} finished hosts/shards are skipped")
+    return checkpoint
+
+def finish_checkpoint(checkpoint, results):
+    """Drop the checkpoint of a scan that completed; keep it if any part failed"""
+    if checkpoint is not None and 'error' not in results and not results.get('shard_errors'):
+        checkpoint.finish()
+
+def record_history(history, args, scanner, results):
+    """Store a finished scan's results in the history database"""
+    if not history or 'scan_result' not in results:
+        return
+    try:
+        history.record_scan(args.target, args.scan_type, results['scan_result'],
+                            scanner.get_scan_arguments(args.scan_type, args.ports))
+    except Exception as e:
+        print(f"⚠️  Could not record scan history: {e}")
+
+def query_main(argv):
+    """'query' subcommand: search recorded scans without re-scanning"""
+    parser = argparse.ArgumentParser(
+        prog='nmap_cli.py query',
+        description='Search the local scan history',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python3 nmap_cli.py query --port 3389 --since 7d
+  python3 nmap_cli.py query --host 192.168.1.10
+  python3 nmap_cli.py query --service ssh --since 2024-01-01
+  python3 nmap_cli.py query --scans
+        """
+    )
+    parser.add_argument('--port', type=int, help='Port number')
+    parser.add_argument('--host', help='Host address')
+    parser.add_argument('--service', help='Service name (e.g. ssh, http)')
+    parser.add_argument('--state', default='open',
+                       help='Port state to match, or "any" (default: open)')
+    parser.add_argument('--protocol', default='tcp', choices=['tcp', 'udp', 'sctp', 'ip'],
+                       help='Protocol (default: tcp)')
+    parser.add_argument('--since', help='Only results newer than this (e.g. 7d, 24h, 2024-01-31)')
+    parser.add_argument('--until', help='Only results older than this')
+    parser.add_argument('--limit', type=int, default=100, help='Maximum rows (default: 100)')
+    parser.add_argument('--scans', action='store_true', help='List recent scans instead of ports')
+    parser.add_argument('--history-db', help='History database path (default: user data dir)')
+    args = parser.parse_args(argv)
+    
+    from scanner.history import ScanHistory, parse_since
+    try:
+        since = parse_since(args.since)
+        until = parse_since(args.until)
+    except ValueError as e:
+        print(f"❌ Error: {e}")
+        return 1
+    
+    with ScanHistory(args.history_db) as history:
+        if args.scans:
+            scans = history.list_scans(args.limit)
+            print(f"🗂️  Recent scans: {len(scans)}")
+            print("-" * 60)
+            for scan in scans:
+                started = datetime.fromtimestamp(scan['started_at']).strftime('%Y-%m-%d %H:%M:%S')
+                print(f"   #{scan['scan_id']:<5} {started}  {scan['scan_type']:<18} {scan['target']}"
+                      f"  ({scan['hosts']} hosts, {scan['ports']} ports)")
+            return 0
+        
+        state = None if args.state == 'any' else args.state
+        rows = history.query_ports(port=args.port, state=state, since=since, until=until,
+                                   host=args.host, service=args.service,
+                                   protocol=args.protocol, limit=args.limit)
+    
+    print(f"🔎 Matches: {len(rows)}")
+    print("-" * 60)
+    for row in rows:
+        seen = datetime.fromtimestamp(row['seen_at']).strftime('%Y-%m-%d %H:%M:%S')
+        service = row['service'] or 'unknown'
+        if row['product']:
+            service += f" ({row['product']} {row['version']})".replace(" )", ")")
+        hostname = f" [{row['hostname']}]" if row['hostname'] else ""
+        print(f"   {seen}  {row['address']}{hostname}  {row['port']}/{row['protocol']} "
+              f"{row['state'].upper()} - {service}")
+    return 0
+
+def archive_main(argv):
+    """'archive' subcommand: fetch a host's raw nmap XML from the scan archive"""
+    parser = argparse.ArgumentParser(
+        prog='nmap_cli.py archive',
+        description='Look a host up in the archive of raw nmap XML',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Each match is printed as a complete nmap XML document holding just that
+host, with the <nmaprun> header and run stats of the scan it came from.
+
+Examples:
+  python3 nmap_cli.py archive 192.168.1.10
+  python3 nmap_cli.py archive 192.168.1.10 --latest -o host.xml
+  python3 nmap_cli.py archive 192.168.1.10 --scan 42
+  python3 nmap_cli.py archive --scans
+        """
+    )
+    parser.add_argument('address', nargs='?', help='Host IP address')
+    parser.add_argument('--scan', type=int, help='Only this archived scan')
+    parser.add_argument('--latest', action='store_true', help='Only the most recent scan of the host')
+    parser.add_argument('--scans', action='store_true', help='List archived scans instead')
+    parser.add_argument('--limit', type=int, default=50, help='Maximum scans listed with --scans (default: 50)')
+    parser.add_argument('--archive-dir', help='Archive directory (default: user data dir)')
+    parser.add_argument('--output', '-o', help='Write the XML to this file instead of stdout')
+    args = parser.parse_args(argv)
+    
+    from scanner.archive import XmlArchive, host_document
+    archive = XmlArchive(args.archive_dir)
+    if args.scans:
+        scans = archive.list_scans(args.limit)
+        print(f"📦 Archived scans: {len(scans)}")
+        print("-" * 60)
+        for scan in scans:
+            started = datetime.fromtimestamp(scan['started_at']).strftime('%Y-%m-%d %H:%M:%S')
+            ratio = scan['raw_bytes'] / scan['stored_bytes'] if scan['stored_bytes'] else 0
+            print(f"   #{scan['scan']:<6} {started}  {scan['target'][:40]:<40}  {scan['hosts']} hosts, "
+                  f"{scan['raw_bytes'] / 1048576:.1f} MB ({ratio:.1f}x compressed)"
+                  f"{'' if scan['complete'] else '  [incomplete]'}")
+        return 0
+    if not args.address:
+        parser.error("an address is required (or --scans)")
+    
+    started = time.perf_counter()
+    try:
+        matches = archive.lookup(args.address, args.scan)
+    except ValueError:
+        print(f"❌ Error: '{args.address}' is not an IP address", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - started
+    if args.latest:
+        matches = matches[-1:]
+    print(f"📦 {len(matches)} archived scans of {args.address} ({elapsed * 1000:.1f} ms)", file=sys.stderr)
+    if not matches:
+        return 1
+    
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for meta, host_xml in matches:
+            finished = datetime.fromtimestamp(meta['finished_at']).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"   #{meta['scan']} {finished}  {meta['command_line']}", file=sys.stderr)
+            out.write(host_document(meta, host_xml))
+    finally:
+        if args.output:
+            out.close()
+    return 0
+
+def parse_listen(value, default_port):
+    """(host, port) from --listen's host:port, host or :port"""
+    host, _, port = value.rpartition(':') if ':' in value else (value, '', '')
+    return host.strip('[]') or '127.0.0.1', int(port) if port else default_port
+
+def coordinator_main(argv):
+    """'coordinator' subcommand: split a scan into units and hand them to worker agents"""
+    from scanner.distributed import DEFAULT_LEASE_TIMEOUT, DEFAULT_MAX_ATTEMPTS, DEFAULT_PORT, ScanCoordinator
+    parser = argparse.ArgumentParser(
+        prog='nmap_cli.py coordinator',
+        description='Distribute a scan over worker agents (python3 nmap_cli.py worker URL)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python3 nmap_cli.py coordinator 10.0.0.0/16 --listen 0.0.0.0:8787 --token s3cret
+  python3 nmap_cli.py worker http://coordinator:8787 --token s3cret   (on each scanning box)
+  python3 nmap_cli.py coordinator -iL targets.txt --unit-size 1024 --format jsonl -o hosts.jsonl
+        """
+    )
+    parser.add_argument('target', nargs='?', help='Target IP address, hostname, or network range')
+    parser.add_argument('--input-list', '-iL', metavar='FILE', help='Read targets from FILE ("-" for stdin)')
+    parser.add_argument('--exclude', help='Comma-separated targets to leave out')
+    parser.add_argument('--exclude-file', metavar='FILE', help='Leave out the targets listed in FILE')
+    parser.add_argument('--scan-type', '-s',
+                       choices=['Quick Scan', 'Intense Scan', 'Ping Scan', 'Port Scan', 'Service Detection'],
+                       default='Quick Scan', help='Type of scan to perform (default: Quick Scan)')
+    parser.add_argument('--ports', '-p', help='Port range (e.g., "1-1000" or "22,80,443")')
+    parser.add_argument('--unit-size', type=int, default=256,
+                       help='Maximum hosts per work unit (default: 256, one /24)')
+    parser.add_argument('--listen', default=f'127.0.0.1:{DEFAULT_PORT}',
+                       help=f'Address to serve workers on (default: 127.0.0.1:{DEFAULT_PORT})')
+    parser.add_argument('--token', default=os.environ.get('NMAP_SCANNER_TOKEN'),
+                       help='Shared secret workers must present (default: $NMAP_SCANNER_TOKEN)')
+    parser.add_argument('--lease-timeout', type=float, default=DEFAULT_LEASE_TIMEOUT,
+                       help=f'Seconds without a heartbeat before a unit is reassigned (default: {DEFAULT_LEASE_TIMEOUT:.0f})')
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                       help=f'Tries per unit before it is given up (default: {DEFAULT_MAX_ATTEMPTS})')
+    parser.add_argument('--format', '-f', choices=['text', 'jsonl', 'csv', 'msgpack'], default='text',
+                       help='Output format (default: text)')
+    parser.add_argument('--output', '-o', help='Output file to save results')
+    parser.add_argument('--no-history', action='store_true',
+                       help='Do not record this scan in the local history database')
+    parser.add_argument('--history-db', help='History database path (default: user data dir)')
+    args = parser.parse_args(argv)
+    
+    # Progress messages go to stderr when stdout carries exported records
+    info = sys.stdout if args.format == 'text' else sys.stderr
+    try:
+        if args.unit_size < 1 or args.lease_timeout <= 0:
+            raise ValueError("--unit-size and --lease-timeout must be positive")
+        if args.ports:
+            from scanner.ports import normalize_port_spec
+            normalize_port_spec(args.ports)
+        with contextlib.redirect_stdout(info):
+            targets = load_targets(args)
+        if targets is not None:
+            units = list(targets.batches(args.unit_size))
+            label = f"-iL {'stdin' if args.input_list == '-' else args.input_list}" if args.input_list else args.target
+        else:
+            is_valid, message = validate_target(args.target)
+            if not is_valid:
+                raise ValueError(message)
+            from scanner.sharding import split_target
+            units = split_target(args.target, args.unit_size)
+            label = args.target
+        host, port = parse_listen(args.listen, DEFAULT_PORT)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}", file=info)
+        return 1
+    
+    coordinator = ScanCoordinator(units, args.scan_type, args.ports, token=args.token,
+                                  lease_timeout=args.lease_timeout, max_attempts=args.max_attempts)
+    try:
+        host, port = coordinator.serve(host, port)
+    except OSError as e:
+        print(f"❌ Error: cannot listen on {args.listen}: {e}", file=info)
+        return 1
+    print(f"🛰️  Coordinator on http://{host}:{port}: {len(units)} units of {label}", file=info)
+    print(f"   Start workers with: python3 nmap_cli.py worker http://{host}:{port}", file=info)
+    if not args.token and host not in ('127.0.0.1', 'localhost', '::1'):
+        print("⚠️  No --token set: anyone who can reach this port can take part in the scan", file=info)
+    
+    with contextlib.redirect_stdout(info):
+        history = open_history(args)
+    on_result = None
+    if history:
+        scan_id = history.begin_scan(label, args.scan_type,
+                                     NmapScanner().get_scan_arguments(args.scan_type, args.ports))
+        on_result = lambda records: history.add_hosts(scan_id, records)
+    
+    def on_progress(status):
+        print(f"📦 {status['finished']}/{status['units']} units, {status['hosts']} hosts, "
+              f"{status['workers']} workers ({status['elapsed']:.0f}s)", file=info, flush=True)
+    
+    interrupted = False
+    try:
+        scan_result = coordinator.run(on_result, on_progress)
+        coordinator.linger()
+    except KeyboardInterrupt:
+        interrupted = True
+        print("\n\n⏹️  Scan interrupted by user", file=info)
+        scan_result = ScanResult(coordinator.records, ServiceTable())
+    finally:
+        coordinator.close()
+        if history:
+            history.close()
+    
+    results = {
+        'hosts': scan_result.all_hosts(),
+        'scan_result': scan_result,
+        'scan_type': args.scan_type,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    if coordinator.unit_errors:
+        results['shard_errors'] = coordinator.unit_errors
+    if interrupted:
+        results['partial'] = True
+    
+    if args.format == 'text':
+        output_file = open(args.output, 'w', encoding='utf-8') if args.output else None
+        try:
+            parser_obj = NmapParser()
+            parser_obj.write_results(results, label, args.scan_type,
+                                     *([sys.stdout] + ([output_file] if output_file else [])))
+            print()
+        finally:
+            if output_file:
+                output_file.close()
+                print(f"\n💾 Results saved to: {args.output}")
+    else:
+        from scanner.exporters import export_records, get_exporter
+        _, binary = get_exporter(args.format)
+        if args.output:
+            output_file = open(args.output, 'wb') if binary else open(args.output, 'w', encoding='utf-8', newline='')
+        else:
+            output_file = sys.stdout.buffer if binary else sys.stdout
+        try:
+            count = export_records(scan_result.hosts, args.format, output_file)
+        finally:
+            if args.output:
+                output_file.close()
+            else:
+                output_file.flush()
+        print(f"\n💾 {count} {args.format} records written to {args.output or 'stdout'}", file=info)
+        for unit, error in coordinator.unit_errors:
+            print(f"⚠️  Unit failed: {unit[:60]}: {error}", file=info)
+    return 1 if interrupted or coordinator.unit_errors else 0
+
+def worker_main(argv):
+    """'worker' subcommand: scan work units handed out by a coordinator"""
+    from scanner.distributed import CoordinatorClient, ScanWorker
+    parser = argparse.ArgumentParser(
+        prog='nmap_cli.py worker',
+        description='Scan work units for a coordinator (python3 nmap_cli.py coordinator ...)')
+    parser.add_argument('url', help='Coordinator address, e.g. http://10.0.0.5:8787')
+    parser.add_argument('--token', default=os.environ.get('NMAP_SCANNER_TOKEN'),
+                       help='Shared secret set on the coordinator (default: $NMAP_SCANNER_TOKEN)')
+    parser.add_argument('--name', help='Worker name shown by the coordinator (default: host-pid)')
+    parser.add_argument('--workers', '-w', type=int, default=1,
+                       help='Parallel nmap processes per unit (default: 1)')
+    parser.add_argument('--engine', choices=['auto', 'nmap', 'native'], default='auto',
+                       help='Scan engine (default: auto)')
+    parser.add_argument('--adaptive-timing', action='store_true',
+                       help='Tune nmap rate limits from earlier runs on the same network')
+    args = parser.parse_args(argv)
+    
+    timing = None
+    if args.adaptive_timing:
+        from scanner.timing import TimingController
+        timing = TimingController()
+    scanner = NmapScanner(timing=timing)
+    if args.engine == 'auto':
+        args.engine = 'nmap' if scanner.nmap_available else 'native'
+    worker = ScanWorker(scanner, CoordinatorClient(args.url, args.token), name=args.name,
+                        workers=args.workers, engine=args.engine)
+    print(f"🛠️  Worker {worker.name} ({args.engine}) working for {args.url}")
+    try:
+        worker.run()
+    except PermissionError as e:
+        print(f"❌ Error: {e}")
+        return 1
+    except KeyboardInterrupt:
+        # The coordinator hands our unit to another worker once the lease expires
+        worker.stop()
+        print("\n\n⏹️  Worker stopped by user")
+        return 1
+    print(f"✅ Done: {worker.units_done} units, {worker.hosts_done} hosts")
+    return 0
+
+def monitor_main(argv):
+    """'monitor' subcommand: rescan hosts on adaptive schedules and report changes"""
+    from scanner import monitor as monitor_module
+    parser = argparse.ArgumentParser(
+        prog='nmap_cli.py monitor',
+        description='Watch a network: rescan hosts as often as they change and report what changed',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Hosts that changed recently are checked every --min-interval; each check
+that finds nothing new doubles a host's interval, up to --max-interval.
+The whole target is swept every --sweep-interval to find new hosts.
+
+Examples:
+  python3 nmap_cli.py monitor 192.168.1.0/24 --min-interval 5m --max-interval 1d
+  python3 nmap_cli.py monitor -iL estate.txt --events-file changes.jsonl
+  python3 nmap_cli.py monitor 10.0.0.0/16 --once      (one cycle, e.g. from cron)
+        """
+    )
+    parser.add_argument('target', nargs='?', help='Target IP address, hostname, or network range')
+    parser.add_argument('--input-list', '-iL', metavar='FILE', help='Read targets from FILE ("-" for stdin)')
+    parser.add_argument('--exclude', help='Comma-separated targets to leave out')
+    parser.add_argument('--exclude-file', metavar='FILE', help='Leave out the targets listed in FILE')
+    parser.add_argument('--scan-type', '-s',
+                       choices=['Quick Scan', 'Intense Scan', 'Port Scan', 'Service Detection'],
+                       default='Quick Scan', help='Type of scan to perform (default: Quick Scan)')
+    parser.add_argument('--ports', '-p', help='Port range (e.g., "1-1000" or "22,80,443")')
+    parser.add_argument('--engine', choices=['auto', 'nmap', 'native'], default='auto',
+                       help='Scan engine (default: auto)')
+    parser.add_argument('--min-interval', default='5m',
+                       help='Check interval of hosts that just changed (default: 5m)')
+    parser.add_argument('--max-interval', default='1d',
+                       help='Longest interval between checks of a stable host (default: 1d)')
+    parser.add_argument('--sweep-interval',
+                       help='How often to sweep the whole target for new hosts (default: --max-interval)')
+    parser.add_argument('--batch-size', type=int, default=monitor_module.DEFAULT_BATCH_SIZE,
+                       help=f'Hosts per nmap run (default: {monitor_module.DEFAULT_BATCH_SIZE})')
+    parser.add_argument('--events-file', help='Append every change as a JSON line to this file')
+    parser.add_argument('--once', action='store_true', help='Run one cycle and exit')
+    args = parser.parse_args(argv)
+    
+    try:
+        min_interval = parse_duration(args.min_interval)
+        max_interval = parse_duration(args.max_interval)
+        sweep_interval = parse_duration(args.sweep_interval) if args.sweep_interval else max_interval
+        if args.batch_size < 1 or min_interval <= 0:
+            raise ValueError("--batch-size and --min-interval must be positive")
+        if args.ports:
+            from scanner.ports import normalize_port_spec
+            normalize_port_spec(args.ports)
+        targets = load_targets(args)
+        if targets is not None:
+            sweep_targets = list(targets.batches(args.batch_size))
+            label = f"-iL {args.input_list}" if args.input_list else args.target
+        else:
+            is_valid, message = validate_target(args.target)
+            if not is_valid:
+                raise ValueError(message)
+            from scanner.sharding import split_target
+            sweep_targets = split_target(args.target, args.batch_size)
+            label = args.target
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+        return 1
+    
+    # No result cache: a cached answer would hide the very changes we're watching for
+    scanner = NmapScanner()
+    if args.engine == 'auto':
+        args.engine = 'nmap' if scanner.nmap_available else 'native'
+    state = monitor_module.MonitorState(label, scanner.get_scan_arguments(args.scan_type, args.ports))
+    monitor = monitor_module.ScanMonitor(scanner, sweep_targets, state, args.scan_type, args.ports, args.engine,
+                                         min_interval, max_interval, sweep_interval, args.batch_size)
+    parser_obj = NmapParser()
+    print(f"👁️  Monitoring {label}: {len(state.hosts)} hosts known, "
+          f"checks every {args.min_interval} to {args.max_interval}")
+    
+    checked_before = [0]
+    def on_events(events, errors):
+        for event in events:
+            print(parser_obj.format_monitor_event(event))
+        if events and args.events_file:
+            stamp = datetime.now().isoformat(timespec='seconds')
+            with open(args.events_file, 'a', encoding='utf-8') as f:
+                for event in events:
+                    f.write(json.dumps(dict(event, time=stamp)) + "\n")
+        checked = monitor.counters['hosts_checked'] - checked_before[0]
+        checked_before[0] = monitor.counters['hosts_checked']
+        print(parser_obj.format_monitor_cycle(monitor, checked, events, errors), flush=True)
+    
+    try:
+        monitor.run(on_events, once=args.once)
+    except KeyboardInterrupt:
+        monitor.stop()
+        state.save()
+        print("\n\n⏹️  Monitoring stopped by user")
+    return 0
+
+def parse_duration(value):
+    """Seconds in a duration such as 90, 90s, 15m, 6h or 1d"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*', str(value))
+    if not match:
+        raise ValueError(f"Invalid duration '{value}' (use e.g. 90s, 15m, 6h or 1d)")
+    return float(match.group(1)) * {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+
+def serve_main(argv):
+    """'serve' subcommand: long-running HTTP service that runs queued scan jobs"""
+    from scanner.service import DEFAULT_PORT, DEFAULT_WORKERS, ScanService
+    parser = argparse.ArgumentParser(
+        prog='nmap_cli.py serve',
+        description='Run scan jobs submitted over a local HTTP API on a pool of warm scanners',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"""
+API (JSON):
+  POST   /jobs            {{"target": "192.168.1.1", "scan_type": "Quick Scan", "ports": "22,80",
+                           "priority": 10, "stream": false}}  (lower priority runs first)
+  GET    /jobs/ID         status and hosts (?offset=N to skip hosts already fetched)
+  GET    /jobs/ID/stream  hosts as JSON Lines while the job runs
+  DELETE /jobs/ID         cancel
+  GET    /jobs, /health
+
+Examples:
+  python3 nmap_cli.py serve --workers 4
+  curl -s -d '{{"target": "192.168.1.1"}}' localhost:{DEFAULT_PORT}/jobs
+  curl -sN localhost:{DEFAULT_PORT}/jobs/JOB_ID/stream
+        """
+    )
+    parser.add_argument('--listen', default=f'127.0.0.1:{DEFAULT_PORT}',
+                       help=f'Address to serve on (default: 127.0.0.1:{DEFAULT_PORT})')
+    parser.add_argument('--workers', '-w', type=int, default=DEFAULT_WORKERS,
+                       help=f'Jobs run at once, each on its own scanner (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--token', default=os.environ.get('NMAP_SCANNER_TOKEN'),
+                       help='Shared secret clients must send as a bearer token (default: $NMAP_SCANNER_TOKEN)')
+    parser.add_argument('--cache-ttl', type=int, default=300,
+                       help='Reuse results of an identical scan from the last N seconds (default: 300)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Always run nmap; do not read or write the result cache')
+    parser.add_argument('--adaptive-timing', action='store_true',
+                       help='Tune nmap rate limits from earlier runs on the same network')
+    args = parser.parse_args(argv)
+    
+    # The pool shares one cache and timing controller; both are thread-safe
+    cache = None
+    if not args.no_cache and args.cache_ttl > 0:
+        from scanner.cache import ResultCache
+        cache = ResultCache(ttl=args.cache_ttl)
+    timing = None
+    if args.adaptive_timing:
+        from scanner.timing import TimingController
+        timing = TimingController()
+    try:
+        host, port = parse_listen(args.listen, DEFAULT_PORT)
+        service = ScanService(args.workers, lambda: NmapScanner(cache=cache, timing=timing), token=args.token)
+        service.start()
+        host, port = service.serve(host, port)
+    except (OSError, ValueError, threading.BrokenBarrierError) as e:
+        print(f"❌ Error: cannot start the service: {e}")
+        return 1
+    print(f"🛎️  Scan service on http://{host}:{port} with {service.workers} workers (Ctrl-C to stop)")
+    if not args.token and host not in ('127.0.0.1', 'localhost', '::1'):
+        print("⚠️  No --token set: anyone who can reach this port can run scans")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print("\n\n⏹️  Service stopped by user")
+    finally:
+        service.close()
+    return 0
+
+def export_scan(scanner, parser_obj, args, history=None, checkpoint=None):
+    """Run the scan and write machine-readable records instead of the text report
+    
+    Called with stdout redirected to stderr, so progress messages never mix
+    with the records; those go to --output or the real stdout.
+    """
+    from scanner.exporters import export_records, get_exporter
+    _, binary = get_exporter(args.format)
+    
+    use_nmap = args.engine == 'nmap' and scanner.nmap_available
+    results = None
+    if args.targets is not None:
+        records = scan_batches(scanner, args)
+    elif args.pipeline and use_nmap:
+        from scanner.pipeline import DiscoveryPipeline
+        records = DiscoveryPipeline(scanner, port_workers=args.workers).run(
+            args.target, args.scan_type, args.ports)
+    elif args.stream and use_nmap:
+        records = scanner.scan_stream(args.target, args.scan_type, args.ports,
+                                      checkpoint=checkpoint)
+    else:
+        results = scanner.scan(args.target, args.scan_type, args.ports,
+                               workers=args.workers, hosts_per_shard=args.shard_size,
+                               engine=args.engine, port_slices=args.port_slices,
+                               checkpoint=checkpoint)
+        finish_checkpoint(checkpoint, results)
+        checkpoint = None
+        if 'scan_result' not in results:
+            print(parser_obj.format_results(results, args.target, args.scan_type))
+            return 1
+        if not results.get('cached'):
+            record_history(history, args, scanner, results)
+        records = results['scan_result'].hosts
+        history = None
+    
+    if history:
+        scan_id = history.begin_scan(args.target, args.scan_type,
+                                     scanner.get_scan_arguments(args.scan_type, args.ports))
+        records = history.record_stream(scan_id, records)
+    if scanner.profiler and results is None:
+        records = scanner.profiler.count_hosts(records)
+    
+    if args.output:
+        if binary:
+            output_file = open(args.output, 'wb')
+        else:
+            output_file = open(args.output, 'w', encoding='utf-8', newline='')
+    else:
+        output_file = sys.__stdout__.buffer if binary else sys.__stdout__
+    
+    writer = ProfiledWriter(output_file, scanner.profiler) if scanner.profiler else output_file
+    try:
+        with phase_context(scanner.profiler, 'format'):
+            count = export_records(records, args.format, writer)
+    finally:
+        if args.output:
+            output_file.close()
+        else:
+            output_file.flush()
+    if checkpoint is not None and not scanner.stop_requested.is_set():
+        checkpoint.finish()
+    
+    destination = args.output or 'stdout'
+    print(f"\n💾 {count} {args.format} records written to {destination}")
+    if args.targets is not None:
+        report_batch_errors(scanner)
+        return 1 if scanner.batch_errors else 0
+    return 0
+
 def main():
     """Main CLI function"""
     parser = argparse.ArgumentParser(
@@ -94,8 +879,19 @@ For more help: python3 nmap_cli.py --help-detailed
         """
     )
     
-    parser.add_argument('target', 
+    parser.add_argument('target', nargs='?',
                        help='Target IP address, hostname, or network range')
+    parser.add_argument('--input-list', '-iL',
+                       metavar='FILE',
+                       help='Read targets from FILE ("-" for stdin): IPs, CIDRs, ranges and hostnames, one or more per line')
+    parser.add_argument('--exclude',
+                       help='Comma-separated targets to leave out')
+    parser.add_argument('--exclude-file',
+                       metavar='FILE',
+                       help='Leave out the targets listed in FILE')
+    parser.add_argument('--batch-size',
+                       type=int, default=4096,
+                       help='Addresses per nmap run for target lists too large for one (default: 4096)')
     parser.add_argument('--scan-type', '-s',
                        choices=['Quick Scan', 'Intense Scan', 'Ping Scan', 
                                'Port Scan', 'Service Detection'],
@@ -103,6 +899,77 @@ For more help: python3 nmap_cli.py --help-detailed
                        help='Type of scan to perform (default: Quick Scan)')
     parser.add_argument('--ports', '-p',
                        help='Port range (e.g., "1-1000" or "22,80,443")')
+    parser.add_argument('--workers', '-w',
+                       type=int, default=1,
+                       help='Number of parallel nmap processes; large targets are split into shards (default: 1)')
+    parser.add_argument('--shard-size',
+                       type=int, default=256,
+                       help='Maximum hosts per shard when --workers > 1 (default: 256, one /24)')
+    parser.add_argument('--engine',
+                       choices=['auto', 'nmap', 'native'],
+                       default='auto',
+                       help='Scan engine: nmap, native TCP connect scan, or auto (nmap when installed, else native; default: auto)')
+    parser.add_argument('--port-slices',
+                       type=int, default=1,
+                       help='Split --ports into N slices scanned by parallel nmap processes (default: 1)')
+    parser.add_argument('--stream',
+                       action='store_true',
+                       help='Print each host as soon as nmap finishes it (low memory, for large ranges)')
+    parser.add_argument('--pipeline',
+                       action='store_true',
+                       help='Ping-sweep first and port-scan live hosts as they are found (uses --workers port scanners)')
+    parser.add_argument('--cache-ttl',
+                       type=int, default=300,
+                       help='Reuse results of an identical scan from the last N seconds (default: 300)')
+    parser.add_argument('--no-cache',
+                       action='store_true',
+                       help='Always run nmap; do not read or write the result cache')
+    parser.add_argument('--no-history',
+                       action='store_true',
+                       help='Do not record this scan in the local history database')
+    parser.add_argument('--history-db',
+                       help='History database path (default: user data dir)')
+    parser.add_argument('--no-archive',
+                       action='store_true',
+                       help='Do not keep the raw nmap XML in the compressed archive (see: nmap_cli.py archive)')
+    parser.add_argument('--archive-dir',
+                       help='Raw XML archive directory (default: user data dir)')
+    parser.add_argument('--resume',
+                       action='store_true',
+                       help='Continue an interrupted run of the same scan, skipping finished hosts/shards')
+    parser.add_argument('--no-checkpoint',
+                       action='store_true',
+                       help='Do not record finished hosts/shards for --resume')
+    parser.add_argument('--adaptive-timing',
+                       action='store_true',
+                       help='Tune --min-rate/--max-rate/--max-retries/--min-hostgroup from earlier runs on the same network')
+    parser.add_argument('--likely-ports',
+                       action='store_true',
+                       help='Scan the ports most often open on the target\'s networks (per the history) first, then the rest')
+    parser.add_argument('--port-history',
+                       default='90d',
+                       help='How far back --likely-ports looks, e.g. 30d or 2024-01-31 (default: 90d)')
+    parser.add_argument('--incremental',
+                       action='store_true',
+                       help='Service/Intense scans: port scan first, then version-detect only ports without a cached fingerprint')
+    parser.add_argument('--fingerprint-ttl',
+                       type=int, default=7 * 86400,
+                       help='Reuse a port\'s cached version fingerprint for N seconds with --incremental (default: 7 days)')
+    parser.add_argument('--resolve',
+                       action='store_true',
+                       help='Resolve target hostnames in parallel with a TTL cache and run nmap with -n')
+    parser.add_argument('--reverse-dns',
+                       action='store_true',
+                       help='Like --resolve, plus cached parallel reverse lookups for hosts without a name')
+    parser.add_argument('--profile',
+                       action='store_true',
+                       help='Print how long each phase took (nmap, XML parsing, formatting, writes)')
+    parser.add_argument('--metrics-file',
+                       help='Write scan metrics in Prometheus text format (e.g. for the node exporter textfile collector)')
+    parser.add_argument('--format', '-f',
+                       choices=['text', 'jsonl', 'csv', 'msgpack'],
+                       default='text',
+                       help='Output format: text report, or machine-readable records (default: text)')
     parser.add_argument('--output', '-o',
                        help='Output file to save results')
     parser.add_argument('--verbose', '-v',
@@ -115,6 +982,20 @@ For more help: python3 nmap_cli.py --help-detailed
                        action='store_true',
                        help='Show detailed help and examples')
     
+    # Subcommands
+    if len(sys.argv) > 1 and sys.argv[1] == 'query':
+        return query_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == 'coordinator':
+        return coordinator_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == 'worker':
+        return worker_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        return serve_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == 'monitor':
+        return monitor_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == 'archive':
+        return archive_main(sys.argv[2:])
+    
     # Parse arguments
     args = parser.parse_args()
     
@@ -127,63 +1008,256 @@ For more help: python3 nmap_cli.py --help-detailed
     if args.banner:
         print_banner()
     
-    # Validate target
-    is_valid, message = validate_target(args.target)
-    if not is_valid:
-        print(f"❌ Error: {message}")
+    if args.workers < 1 or args.shard_size < 1 or args.port_slices < 1 or args.batch_size < 1:
+        print("❌ Error: --workers, --shard-size, --port-slices and --batch-size must be at least 1")
+        return 1
+
+    if args.likely_ports and args.resume:
+        # Prioritized scans run in several passes, which a checkpoint can't record
+        print("❌ Error: --likely-ports can't be combined with --resume")
+        return 1
+    if args.incremental and args.pipeline:
+        # The pipeline's port stage runs the full profile on each batch of live hosts
+        print("❌ Error: --incremental can't be combined with --pipeline")
         return 1
+
+    # Progress messages go to stderr when stdout carries exported records
+    info = sys.stdout if args.format == 'text' else sys.stderr
+    
+    # Collect target lists; a list that fits one batch is scanned like a plain target
+    try:
+        with contextlib.redirect_stdout(info):
+            args.targets = load_targets(args)
+    except (OSError, ValueError) as e:
+        print(f"❌ Error: {e}")
+        return 1
+    if args.targets is not None:
+        print(f"📋 Targets: {args.targets.describe()}", file=info)
+        batches = args.targets.batches(args.batch_size)
+        first = next(batches)
+        if next(batches, None) is None:
+            args.target = first
+            args.targets = None
+        else:
+            args.target = f"-iL {'stdin' if args.input_list == '-' else args.input_list}"
+            if args.resume:
+                print("⚠️  --resume is not supported for multi-batch target lists", file=info)
+            if args.pipeline:
+                print("⚠️  --pipeline is not supported for multi-batch target lists; scanning batch by batch",
+                      file=info)
+    else:
+        # Validate target
+        is_valid, message = validate_target(args.target)
+        if not is_valid:
+            print(f"❌ Error: {message}")
+            return 1
+    
+    if args.ports:
+        from scanner.ports import normalize_port_spec
+        try:
+            normalize_port_spec(args.ports)
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            return 1
     
     # Initialize scanner components
     try:
-        scanner = NmapScanner()
+        cache = None
+        if not args.no_cache and args.cache_ttl > 0:
+            from scanner.cache import ResultCache
+            cache = ResultCache(ttl=args.cache_ttl)
+        timing = None
+        if args.adaptive_timing:
+            from scanner.timing import TimingController
+            timing = TimingController()
+        profiler = None
+        if args.profile or args.metrics_file:
+            from scanner.profiling import ScanProfiler
+            profiler = ScanProfiler()
+        resolver = None
+        if args.resolve or args.reverse_dns:
+            from scanner.resolver import BulkResolver
+            resolver = BulkResolver(reverse=args.reverse_dns)
+        fingerprints = None
+        if args.incremental:
+            from scanner.fingerprints import FingerprintCache
+            fingerprints = FingerprintCache(ttl=args.fingerprint_ttl)
+        port_model = None
+        if args.likely_ports:
+            from scanner.history import ScanHistory, parse_since
+            from scanner.portmodel import PortModel
+            with ScanHistory(args.history_db) as history:
+                port_model = PortModel.from_history(history, parse_since(args.port_history))
+        archive = None
+        if not args.no_archive:
+            from scanner.archive import XmlArchive
+            archive = XmlArchive(args.archive_dir)
+        scanner = NmapScanner(cache=cache, timing=timing, profiler=profiler, resolver=resolver,
+                              fingerprints=fingerprints, archive=archive, port_model=port_model)
         parser_obj = NmapParser()
     except Exception as e:
         print(f"❌ Error initializing scanner: {e}")
         return 1
     
+    if args.engine == 'auto':
+        # Probing nmap prints where it was found; keep that out of record output on stdout
+        with contextlib.redirect_stdout(info):
+            args.engine = 'nmap' if scanner.nmap_available else 'native'
+    
     # Print scan information
-    print(f"\n🎯 Target: {args.target}")
-    print(f"📊 Scan Type: {args.scan_type}")
+    print(f"\n🎯 Target: {args.target}", file=info)
+    print(f"📊 Scan Type: {args.scan_type}", file=info)
     if args.ports:
-        print(f"🔍 Port Range: {args.ports}")
-    print(f"⏰ Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print("=" * 60)
+        print(f"🔍 Port Range: {args.ports}", file=info)
+    if args.engine == 'native':
+        print("⚡ Engine: native TCP connect scan", file=info)
+    if timing and args.engine == 'nmap' and args.targets is None:
+        print(f"📈 Timing: {timing.arguments(args.target)}", file=info)
+    if resolver:
+        print(f"🌐 DNS: hostnames resolved up front{', with reverse lookups' if resolver.reverse_enabled else ''}",
+              file=info)
+    if port_model is not None and args.engine == 'nmap':
+        known = port_model.networks(args.target)
+        if known:
+            print(f"🎲 Likely ports: from the history of {len(known)} of the target's networks", file=info)
+        elif len(port_model):
+            print(f"🎲 Likely ports: no history for this target, using all {len(port_model)} known networks",
+                  file=info)
+        else:
+            print("🎲 Likely ports: no open ports in the history yet; scanning in the usual order", file=info)
+    if args.workers > 1:
+        print(f"🧩 Workers: {args.workers} (up to {args.shard_size} hosts per shard)", file=info)
+    if args.port_slices > 1:
+        print(f"🔪 Port slices: {args.port_slices}", file=info)
+    print(f"⏰ Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", file=info)
+    print("=" * 60, file=info)
     
     # Perform the scan
+    checkpoint = None
     try:
         if args.verbose:
-            print(f"🔍 Starting {args.scan_type} of {args.target}...")
+            print(f"🔍 Starting {args.scan_type} of {args.target}...", file=info)
+        
+        if args.format != 'text':
+            with contextlib.redirect_stdout(sys.stderr):
+                checkpoint = open_checkpoint(args, scanner)
+                return export_scan(scanner, parser_obj, args, open_history(args), checkpoint)
+        
+        history = open_history(args)
+        checkpoint = open_checkpoint(args, scanner)
+        
+        use_nmap = args.engine == 'nmap' and scanner.nmap_available
+        
+        if args.targets is not None:
+            return batch_scan(scanner, parser_obj, args, history)
         
-        results = scanner.scan(args.target, args.scan_type, args.ports)
-        formatted_results = parser_obj.format_results(results, args.target, args.scan_type)
+        if args.pipeline and use_nmap:
+            return pipeline_scan(scanner, parser_obj, args, history)
         
-        # Display results
-        print(formatted_results)
+        if args.stream and use_nmap:
+            return stream_scan(scanner, parser_obj, args, history=history, checkpoint=checkpoint)
         
+        results = scanner.scan(args.target, args.scan_type, args.ports,
+                               workers=args.workers, hosts_per_shard=args.shard_size,
+                               engine=args.engine, port_slices=args.port_slices,
+                               checkpoint=checkpoint)
+        finish_checkpoint(checkpoint, results)
+        if not results.get('cached'):
+            record_history(history, args, scanner, results)
+        if args.verbose and cache:
+            stats = cache.stats()
+            print(f"♻️  Cache: {stats['memory_hits'] + stats['disk_hits']} hits, "
+                  f"{stats['misses']} misses, {stats['evictions']} evictions")
+        if args.verbose and resolver:
+            stats = resolver.stats()
+            print(f"🌐 DNS: {stats['lookups']} lookups, {stats['hits']} cache hits")
+        if 'port_passes' in results:
+            passes = results['port_passes']
+            print(f"🎲 Likely ports: {passes['likely']} scanned first (done after {passes['likely_seconds']}s), "
+                  f"then {passes['rest']} more")
+        if fingerprints and 'fingerprints' in results:
+            stats = fingerprints.stats()
+            print(f"🧬 Fingerprints: {results['fingerprints']['cached']} cached, "
+                  f"{results['fingerprints']['detected']} detected in {results['fingerprints']['runs']} nmap runs "
+                  f"({stats['hit_rate']:.0%} hit rate, {stats['evictions']} evictions)")
+        if args.verbose and timing and not results.get('cached'):
+            profile = timing.profile(args.target)
+            print(f"📈 Next run: {profile.arguments()} "
+                  f"(smoothed loss {profile.loss:.1%})")
+
         # Save to file if requested
+        output_file = None
         if args.output:
             try:
-                with open(args.output, 'w', encoding='utf-8') as f:
-                    f.write(f"Scan Results - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    f.write("=" * 60 + "\n")
-                    f.write(f"Target: {args.target}\n")
-                    f.write(f"Scan Type: {args.scan_type}\n")
-                    if args.ports:
-                        f.write(f"Port Range: {args.ports}\n")
-                    f.write("\n" + formatted_results)
-                
-                print(f"\n💾 Results saved to: {args.output}")
+                output_file = open(args.output, 'w', encoding='utf-8')
+                output_file.write(f"Scan Results - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                output_file.write("=" * 60 + "\n")
+                output_file.write(f"Target: {args.target}\n")
+                output_file.write(f"Scan Type: {args.scan_type}\n")
+                if args.ports:
+                    output_file.write(f"Port Range: {args.ports}\n")
+                output_file.write("\n")
             except Exception as e:
                 print(f"❌ Error saving results: {e}")
+                output_file = None
+        
+        # Display results, writing each host block as soon as it is formatted
+        streams = [sys.stdout] + ([output_file] if output_file else [])
+        if profiler:
+            streams = [ProfiledWriter(stream, profiler) for stream in streams]
+        try:
+            with phase_context(profiler, 'format'):
+                parser_obj.write_results(results, args.target, args.scan_type, *streams)
+            print()
+        finally:
+            if output_file:
+                output_file.close()
+        
+        if output_file:
+            print(f"\n💾 Results saved to: {args.output}")
         
         return 0
         
     except KeyboardInterrupt:
-        print("\n\n⏹️  Scan interrupted by user")
+        # nmap runs in its own process group, so kill it ourselves
+        scanner.stop()
+        print("\n\n⏹️  Scan interrupted by user", file=info)
+        if checkpoint is not None and len(checkpoint):
+            checkpoint.close()
+            if args.format == 'text' and not args.stream:
+                partial = checkpoint.partial_result()
+                parser_obj.write_results({
+                    'hosts': partial.all_hosts(),
+                    'scan_result': partial,
+                    'scan_type': args.scan_type,
+                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'partial': True,
+                }, args.target, args.scan_type, sys.stdout)
+                print()
+            print(f"💾 {len(checkpoint)} finished hosts/shards checkpointed; "
+                  "run the same command with --resume to continue", file=info)
         return 1
     except Exception as e:
+        if profiler:
+            profiler.count('errors')
         print(f"\n❌ Scan failed: {e}")
         return 1
+    finally:
+        if profiler:
+            report_profile(profiler, parser_obj, args, info)
+
+def report_profile(profiler, parser_obj, args, info):
+    """Print the --profile breakdown and write the --metrics-file"""
+    profiler.finish()
+    if args.profile:
+        print(parser_obj.format_profile(profiler), file=info)
+    if args.metrics_file:
+        try:
+            profiler.write_prometheus(args.metrics_file,
+                                      {'target': args.target, 'scan_type': args.scan_type})
+            print(f"📏 Metrics written to: {args.metrics_file}", file=info)
+        except OSError as e:
+            print(f"⚠️  Could not write metrics file: {e}", file=info)
 
 if __name__ == "__main__":
     exit_code = main()
@@ -0,0 +1,374 @@
+import contextlib
+import heapq
+import ipaddress
+import json
+import mmap
+import os
+import re
+import socket
+import struct
+import threading
+import time
+import zlib
+from scanner.paths import get_data_dir
+
+BLOCKS_FILE = 'blocks.dat'
+SCANS_FILE = 'scans.jsonl'
+LOCK_FILE = 'index.lock'
+# Uncompressed host XML per block; a lookup decompresses (part of) one block
+BLOCK_SIZE = 256 * 1024
+COMPRESS_LEVEL = 6
+# Index segments (one per scan) are merged into one once there are more than this
+MAX_SEGMENTS = 16
+# address key, host block offset and compressed length, host offset and length inside
+# the block, scan id, scan metadata block offset and compressed length
+INDEX_STRUCT = struct.Struct('<16sQIIIIQI')
+KEY_SIZE = 16
+HOST_START = re.compile(rb'<host[\s>]')
+HOST_END = b'</host>'
+ADDRESS = re.compile(rb'<address addr="([^"]+)" addrtype="ipv[46]"')
+COMMAND_LINE = re.compile(rb'<nmaprun [^>]*?args="([^"]*)"')
+SEGMENT_NAME = re.compile(r'^index-(\d+)(?:-(\d+))?\.idx$')
+
+
+def address_key(address):
+    """16-byte sort key of an IPv4 or IPv6 address (IPv4 as its IPv4-mapped IPv6 form)"""
+    try:
+        return b'\0' * 10 + b'\xff\xff' + socket.inet_pton(socket.AF_INET, address)
+    except OSError:
+        pass
+    try:
+        return socket.inet_pton(socket.AF_INET6, address)
+    except OSError:
+        # Scoped (fe80::1%eth0) or otherwise unusual forms; ValueError if not an address at all
+        return ipaddress.ip_address(address).packed
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path (created if missing) across processes"""
+    with open(path, 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 s; keep waiting like flock does
+                    continue
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def search_segment(path, key):
+    """Index records for key in one segment, by binary search over the memory-mapped file"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < INDEX_STRUCT.size:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+            size = INDEX_STRUCT.size
+            count = len(index) // size
+            lo, hi = 0, count
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if index[mid * size:mid * size + KEY_SIZE] < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            records = []
+            while lo < count and index[lo * size:lo * size + KEY_SIZE] == key:
+                records.append(INDEX_STRUCT.unpack_from(index, lo * size))
+                lo += 1
+            return records
+
+
+def iter_segment(path):
+    """Raw records of one segment in key order"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < INDEX_STRUCT.size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as index:
+            size = INDEX_STRUCT.size
+            for offset in range(0, len(index) - size + 1, size):
+                yield index[offset:offset + size]
+
+
+class ArchiveWriter:
+    """Archive one nmap run's XML output, fed in chunks of any size
+
+    Whole <host> elements are packed into BLOCK_SIZE blocks, each
+    compressed on its own and appended to the archive as soon as it's
+    full, so memory use is one block whatever the size of the scan.
+    Everything before the first host (the <nmaprun> header) and after
+    the last (run stats) is kept with the scan's metadata.
+    """
+
+    def __init__(self, archive, target=''):
+        self.archive = archive
+        self.target = target
+        self.started_at = time.time()
+        self.buffer = bytearray()
+        self.in_host = False
+        self.header = bytearray()
+        self.trailer = bytearray()
+        self.block = bytearray()
+        self.block_hosts = []
+        self.entries = []
+        self.hosts = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.scan_id = None
+
+    def feed(self, data):
+        self.raw_bytes += len(data)
+        buffer = self.buffer
+        buffer += data
+        pos = 0
+        while True:
+            if self.in_host:
+                end = buffer.find(HOST_END, pos)
+                if end < 0:
+                    break
+                end += len(HOST_END)
+                self.add_host(bytes(buffer[pos:end]))
+                pos = end
+                self.in_host = False
+            else:
+                match = HOST_START.search(buffer, pos)
+                if match is None:
+                    # Keep what could be the start of a '<host' cut off by the chunk boundary
+                    keep = max(pos, len(buffer) - len(b'<host'))
+                    self.outside(buffer[pos:keep])
+                    pos = keep
+                    break
+                self.outside(buffer[pos:match.start()])
+                pos = match.start()
+                self.in_host = True
+        del buffer[:pos]
+
+    def outside(self, data):
+        """Bytes between host elements: the header before the first, the trailer after the last"""
+        if self.hosts:
+            self.trailer += data
+        else:
+            self.header += data
+
+    def add_host(self, xml):
+        match = ADDRESS.search(xml)
+        if match is not None:
+            try:
+                self.block_hosts.append((address_key(match.group(1).decode()), len(self.block), len(xml)))
+            except ValueError:
+                pass
+        self.block += xml
+        self.hosts += 1
+        # Progress reports between hosts aren't kept, only what follows the last one
+        self.trailer.clear()
+        if len(self.block) >= BLOCK_SIZE:
+            self.flush_block()
+
+    def flush_block(self):
+        if not self.block:
+            return
+        data = zlib.compress(bytes(self.block), COMPRESS_LEVEL)
+        offset = self.archive.append_block(data)
+        self.entries.extend((key, offset, len(data), start, length) for key, start, length in self.block_hosts)
+        self.stored_bytes += len(data)
+        self.block = bytearray()
+        self.block_hosts = []
+
+    def close(self, complete=True):
+        """Write the last block, the scan's metadata and its index segment; returns the scan id
+
+        An incomplete run (nmap killed or interrupted) keeps the hosts it
+        finished; a host nmap was halfway through writing is dropped.
+        """
+        if self.scan_id is not None:
+            return self.scan_id
+        if not self.in_host:
+            self.outside(self.buffer)
+        self.buffer = bytearray()
+        self.flush_block()
+        match = COMMAND_LINE.search(self.header)
+        self.scan_id = self.archive.commit(self, {
+            'target': self.target,
+            'command_line': match.group(1).decode(errors='replace') if match else '',
+            'started_at': self.started_at,
+            'finished_at': time.time(),
+            'hosts': self.hosts,
+            'raw_bytes': self.raw_bytes,
+            'stored_bytes': self.stored_bytes,
+            'complete': complete,
+        })
+        return self.scan_id
+
+
+class XmlArchive:
+    """Compressed archive of raw nmap XML with a per-address index
+
+    The archive directory holds blocks.dat (independently zlib-compressed
+    blocks of <host> elements, plus one metadata block per scan),
+    scans.jsonl (one line per archived scan) and sorted index segments
+    of fixed-size records. Looking a host up memory-maps the segments,
+    binary-searches them for its address and decompresses only the
+    block that holds each match, so it costs the same for a 1 MB
+    archive as for a 100 GB one.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_data_dir('archive')
+        os.makedirs(self.path, exist_ok=True)
+        self.blocks_path = os.path.join(self.path, BLOCKS_FILE)
+        self.lock = threading.Lock()
+        self.index_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def locked_index(self):
+        """Serialize scan id claims, segment writes and compactions across threads and processes"""
+        with self.index_lock, file_lock(os.path.join(self.path, LOCK_FILE)):
+            yield
+
+    def writer(self, target=''):
+        return ArchiveWriter(self, target)
+
+    def add(self, xml, target='', complete=True):
+        """Archive a whole nmap XML output; returns the scan id"""
+        writer = self.writer(target)
+        writer.feed(xml)
+        return writer.close(complete)
+
+    def append_block(self, data):
+        """Append a compressed block; returns its offset"""
+        with self.lock:
+            fd = os.open(self.blocks_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | getattr(os, 'O_BINARY', 0),
+                         0o644)
+            try:
+                os.write(fd, data)
+                # With O_APPEND the position is the end of our own write, even if others append too
+                return os.lseek(fd, 0, os.SEEK_CUR) - len(data)
+            finally:
+                os.close(fd)
+
+    def segments(self):
+        """[(first scan id, last scan id, path)] of every index segment"""
+        segments = []
+        for name in os.listdir(self.path):
+            match = SEGMENT_NAME.match(name)
+            if match:
+                first = int(match.group(1))
+                segments.append((first, int(match.group(2) or first), os.path.join(self.path, name)))
+        return sorted(segments)
+
+    def commit(self, writer, info):
+        writer.entries.sort(key=lambda entry: entry[0])
+        with self.locked_index():
+            segments = self.segments()
+            scan_id = max((last for _, last, _ in segments), default=0) + 1
+            segment_path = os.path.join(self.path, f'index-{scan_id:08d}.idx')
+            info = dict(info, scan=scan_id)
+            meta = dict(info, header=writer.header.decode(errors='replace'),
+                        trailer=writer.trailer.decode(errors='replace'))
+            meta_data = zlib.compress(json.dumps(meta, separators=(',', ':')).encode(), COMPRESS_LEVEL)
+            meta_offset = self.append_block(meta_data)
+
+            tmp_path = segment_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(b''.join(INDEX_STRUCT.pack(key, offset, length, start, size, scan_id,
+                                                   meta_offset, len(meta_data))
+                                 for key, offset, length, start, size in writer.entries))
+            os.replace(tmp_path, segment_path)
+            with open(os.path.join(self.path, SCANS_FILE), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(info, separators=(',', ':')) + "\n")
+            # Only the commit whose segment takes the count past the limit merges
+            if len(segments) == MAX_SEGMENTS:
+                self.compact_locked()
+        return scan_id
+
+    def compact(self):
+        """Merge every index segment into one"""
+        with self.locked_index():
+            self.compact_locked()
+
+    def compact_locked(self):
+        segments = self.segments()
+        if len(segments) < 2:
+            return
+        first, last = segments[0][0], max(last for _, last, _ in segments)
+        path = os.path.join(self.path, f'index-{first:08d}-{last:08d}.idx')
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            for record in heapq.merge(*(iter_segment(p) for _, _, p in segments), key=lambda r: r[:KEY_SIZE]):
+                f.write(record)
+        os.replace(tmp_path, path)
+        for _, _, segment_path in segments:
+            if segment_path != path:
+                try:
+                    os.remove(segment_path)
+                except OSError:
+                    pass
+
+    def read_block(self, f, offset, length, end=None):
+        """Decompress a block, stopping once its first end bytes are out"""
+        f.seek(offset)
+        data = f.read(length)
+        if end is None:
+            return zlib.decompress(data)
+        return zlib.decompressobj().decompress(data, end)
+
+    def lookup(self, address, scan_id=None):
+        """[(scan metadata, host XML)] of every archived scan that reported address, oldest first
+
+        The metadata has the scan's header and trailer, so header + host
+        XML + trailer is a complete nmap XML document for that host.
+        """
+        key = address_key(address)
+        records = set()
+        for first, last, path in self.segments():
+            if scan_id is not None and not first <= scan_id <= last:
+                continue
+            try:
+                records.update(record[1:] for record in search_segment(path, key))
+            except (FileNotFoundError, ValueError):
+                # Merged away by a compaction since we listed it; the merged segment has its records
+                continue
+        if scan_id is not None:
+            records = {record for record in records if record[4] == scan_id}
+        if not records:
+            return []
+        results = []
+        with open(self.blocks_path, 'rb') as f:
+            for offset, length, start, size, _, meta_offset, meta_length in sorted(records, key=lambda r: r[4]):
+                meta = json.loads(self.read_block(f, meta_offset, meta_length))
+                block = self.read_block(f, offset, length, start + size)
+                results.append((meta, block[start:start + size]))
+        return results
+
+    def list_scans(self, limit=None):
+        """Metadata (without header and trailer) of archived scans, newest first"""
+        try:
+            with open(os.path.join(self.path, SCANS_FILE), 'r', encoding='utf-8') as f:
+                scans = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return []
+        scans.reverse()
+        return scans[:limit] if limit else scans
+
+
+def host_document(meta, host_xml):
+    """A complete nmap XML document holding one archived host"""
+    trailer = meta.get('trailer') or ''
+    if '</nmaprun>' not in trailer:
+        trailer += '</nmaprun>\n'
+    return meta.get('header', '') + host_xml.decode(errors='replace') + trailer
@@ -0,0 +1,142 @@
+import asyncio
+import io
+import itertools
+import shlex
+from datetime import datetime
+from scanner.nmap_wrapper import NmapScanner
+from scanner.models import ScanResult
+from scanner.streaming import iter_nmap_xml
+
+
+class AsyncNmapScanner(NmapScanner):
+    """Run many nmap scans concurrently on asyncio subprocesses
+
+    At most max_concurrent nmap processes run at once; further scans wait
+    on a semaphore. Each scan can be awaited, given a timeout, or cancelled,
+    and cancelling a scan kills its nmap process. The coroutines are
+    scan_async() and run_nmap_async(), so the inherited blocking scan()
+    and run_nmap() keep working.
+    """
+
+    def __init__(self, max_concurrent=8):
+        super().__init__()
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.semaphore = None
+        self.tasks = {}
+        self.scan_ids = itertools.count(1)
+
+    def get_semaphore(self):
+        # Created on first use so it binds to the running event loop
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self.semaphore
+
+    async def scan_async(self, target, scan_type="Quick Scan", port_range=None, timeout=None):
+        """Perform one nmap scan; returns the same result dict as NmapScanner.scan"""
+        if not self.nmap_available:
+            return self.simulate_scan(target, scan_type)
+
+        args = self.get_scan_arguments(scan_type, port_range)
+        try:
+            async with self.get_semaphore():
+                xml_output = await self.run_nmap_async(target, args, timeout)
+            run_info = {}
+            host_records = list(iter_nmap_xml(io.BytesIO(xml_output), run_info))
+            scan_result = ScanResult.from_host_records(host_records, run_info['command_line'],
+                                                       run_info['scanstats'])
+        except asyncio.TimeoutError:
+            return self.error_result(f"Scan timed out after {timeout}s", scan_type)
+        except Exception as e:
+            return self.error_result(str(e), scan_type)
+
+        return {
+            'hosts': scan_result.all_hosts(),
+            'scan_result': scan_result,
+            'scan_type': scan_type,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    async def run_nmap_async(self, target, args, timeout=None):
+        """Run nmap with XML on stdout, killing it on timeout or cancellation"""
+        process = await asyncio.create_subprocess_exec(
+            self.nmap_path or 'nmap', '-oX', '-', *shlex.split(args), *shlex.split(target),
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except BaseException:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+
+        if process.returncode != 0:
+            errors = [line for line in stderr.decode(errors='replace').splitlines() if line]
+            raise RuntimeError(errors[0] if errors else f"nmap exited with status {process.returncode}")
+        return stdout
+
+    def error_result(self, message, scan_type):
+        return {
+            'error': message,
+            'hosts': [],
+            'scan_type': scan_type,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def submit(self, target, scan_type="Quick Scan", port_range=None, timeout=None):
+        """Start a scan in the background and return its scan id
+
+        Must be called from a running event loop. Use wait() to get the
+        result and cancel() to stop it.
+        """
+        scan_id = next(self.scan_ids)
+        task = asyncio.ensure_future(self.scan_async(target, scan_type, port_range, timeout))
+        self.tasks[scan_id] = (task, scan_type)
+        return scan_id
+
+    async def wait(self, scan_id):
+        """Wait for a submitted scan and return its result dict"""
+        task, scan_type = self.tasks[scan_id]
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                raise
+            return self.error_result("Scan cancelled", scan_type)
+        finally:
+            if task.done():
+                self.tasks.pop(scan_id, None)
+
+    def cancel(self, scan_id):
+        """Cancel a submitted scan, killing its nmap process; False if already done"""
+        if scan_id not in self.tasks:
+            return False
+        task = self.tasks[scan_id][0]
+        return not task.done() and task.cancel()
+
+    def running_scans(self):
+        return [scan_id for scan_id, (task, _) in self.tasks.items() if not task.done()]
+
+    async def scan_many(self, jobs, timeout=None):
+        """Run several scans concurrently, bounded by max_concurrent
+
+        jobs is a list of targets or (target, scan_type, port_range) tuples;
+        results come back in the same order. A scan that fails, times out or
+        is cancelled yields an error result instead of stopping the others.
+        """
+        scan_ids = []
+        for job in jobs:
+            if isinstance(job, str):
+                job = (job,)
+            job = tuple(job)
+            target, scan_type, port_range = job + ("Quick Scan", None)[len(job) - 1:]
+            scan_ids.append(self.submit(target, scan_type, port_range, timeout))
+        return [await self.wait(scan_id) for scan_id in scan_ids]
+
+
+def run_concurrent_scans(jobs, max_concurrent=8, timeout=None):
+    """Blocking helper that runs jobs on an AsyncNmapScanner and returns the results"""
+    scanner = AsyncNmapScanner(max_concurrent)
+    return asyncio.run(scanner.scan_many(jobs, timeout))
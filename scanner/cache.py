@@ -0,0 +1,183 @@
+import hashlib
+import ipaddress
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from scanner.models import ScanResult
+from scanner.paths import get_cache_dir
+
+DEFAULT_TTL = 300
+DEFAULT_MEMORY_ENTRIES = 64
+DEFAULT_DISK_BYTES = 64 * 1024 * 1024
+
+
+def normalize_target(target):
+    """Canonical form of a target string so equivalent targets share a cache key
+
+    Token order, duplicates, hostname case and host bits in CIDRs
+    (192.168.1.7/24 vs 192.168.1.0/24) don't change what nmap scans.
+    """
+    tokens = set()
+    for token in target.split():
+        try:
+            network = ipaddress.ip_network(token, strict=False)
+            tokens.add(str(network.network_address) if network.num_addresses == 1 else str(network))
+        except ValueError:
+            tokens.add(token.lower().rstrip('.'))
+    return " ".join(sorted(tokens))
+
+
+def make_cache_key(target, arguments, nmap_version):
+    key_source = json.dumps([normalize_target(target), " ".join(arguments.split()), nmap_version or ''])
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Two-tier TTL cache of scan results
+
+    A small in-memory LRU sits in front of an on-disk tier (one JSON file
+    per entry). Entries expire after ttl seconds; the memory tier is capped
+    by entry count and the disk tier by total bytes, oldest evicted first.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MEMORY_ENTRIES,
+                 max_disk_bytes=DEFAULT_DISK_BYTES, directory=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.directory = directory or get_cache_dir('results')
+        os.makedirs(self.directory, exist_ok=True)
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0,
+                         'expired': 0, 'stores': 0, 'evictions': 0}
+
+    def path_for(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, target, arguments, nmap_version, scan_type):
+        """Return a cached result dict or None"""
+        key = make_cache_key(target, arguments, nmap_version)
+        now = time.time()
+
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.memory.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return self.build_result(entry[1], entry[2], scan_type)
+                del self.memory[key]
+                self.counters['expired'] += 1
+
+        try:
+            with open(self.path_for(key), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            with self.lock:
+                self.counters['misses'] += 1
+            return None
+
+        if data.get('expires_at', 0) <= now:
+            self.remove_file(key)
+            with self.lock:
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+            return None
+
+        scan_result = ScanResult.from_dict(data['scan_result'])
+        with self.lock:
+            self.counters['disk_hits'] += 1
+            self.remember(key, data['expires_at'], scan_result, data['timestamp'])
+        return self.build_result(scan_result, data['timestamp'], scan_type)
+
+    def put(self, target, arguments, nmap_version, results):
+        """Store a successful scan's result dict"""
+        if 'scan_result' not in results or results.get('error') or results.get('shard_errors'):
+            return
+        key = make_cache_key(target, arguments, nmap_version)
+        expires_at = time.time() + self.ttl
+
+        with self.lock:
+            self.counters['stores'] += 1
+            self.remember(key, expires_at, results['scan_result'], results['timestamp'])
+
+        data = {
+            'expires_at': expires_at,
+            'timestamp': results['timestamp'],
+            'scan_result': results['scan_result'].to_dict(),
+        }
+        path = self.path_for(key)
+        try:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(path + '.tmp', path)
+        except OSError:
+            return
+        self.enforce_disk_limit()
+
+    def remember(self, key, expires_at, scan_result, timestamp):
+        # Caller holds self.lock
+        self.memory[key] = (expires_at, scan_result, timestamp)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+            self.counters['evictions'] += 1
+
+    def build_result(self, scan_result, timestamp, scan_type):
+        return {
+            'hosts': scan_result.all_hosts(),
+            'scan_result': scan_result,
+            'scan_type': scan_type,
+            'timestamp': timestamp,
+            'cached': True
+        }
+
+    def remove_file(self, key):
+        try:
+            os.remove(self.path_for(key))
+        except OSError:
+            pass
+
+    def enforce_disk_limit(self):
+        """Drop expired files, then the oldest ones until under max_disk_bytes"""
+        now = time.time()
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_mtime + self.ttl <= now:
+                self.remove_file(name[:-5])
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name[:-5]))
+            total += stat.st_size
+
+        entries.sort()
+        while total > self.max_disk_bytes and entries:
+            _, size, key = entries.pop(0)
+            self.remove_file(key)
+            total -= size
+            with self.lock:
+                self.counters['evictions'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+        for name in os.listdir(self.directory):
+            if name.endswith('.json'):
+                self.remove_file(name[:-5])
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,104 @@
+import json
+import os
+import time
+from scanner.cache import make_cache_key
+from scanner.models import PROTOCOLS, ScanResult
+from scanner.paths import get_data_dir
+
+
+def restore_port_keys(scan):
+    """JSON turns port numbers into strings; turn them back in a 'scan' dict"""
+    for host_data in scan.values():
+        for protocol in PROTOCOLS:
+            if protocol in host_data:
+                host_data[protocol] = {int(port): info for port, info in host_data[protocol].items()}
+    return scan
+
+
+class ScanCheckpoint:
+    """Append-only JSON Lines state file of a scan's finished hosts and shards
+
+    The first line identifies the scan (target, scan type, nmap arguments);
+    every later line is one finished unit, a host or a shard run, with its
+    python-nmap style results, flushed as soon as the unit completes. A
+    crash or Ctrl-C loses at most the units still in flight, and a resumed
+    scan skips every unit already listed.
+    """
+
+    def __init__(self, target, scan_type, arguments, resume=False, path=None):
+        self.header = {'target': target, 'scan_type': scan_type, 'arguments': arguments}
+        if path is None:
+            name = make_cache_key(target, arguments, '')[:32] + '.jsonl'
+            os.makedirs(get_data_dir('checkpoints'), exist_ok=True)
+            path = get_data_dir('checkpoints', name)
+        self.path = path
+        self.units = {}
+        # An unfinished state file that this run starts over instead of resuming
+        self.discarded = not resume and os.path.exists(path)
+        if resume:
+            self.load()
+        self.file = open(path, 'a' if self.units else 'w', encoding='utf-8')
+        if not self.units:
+            self.write(dict(self.header, started_at=int(time.time())))
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = iter(f)
+                header = json.loads(next(lines, 'null'))
+                if not header or any(header.get(key) != value for key, value in self.header.items()):
+                    return
+                for line in lines:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Last line cut short by a crash
+                        continue
+                    restore_port_keys(entry['result'].get('scan', {}))
+                    self.units[entry['unit']] = entry['result']
+        except (OSError, ValueError):
+            self.units = {}
+
+    def write(self, entry):
+        self.file.write(json.dumps(entry, separators=(',', ':')) + "\n")
+        self.file.flush()
+
+    def is_done(self, unit):
+        return unit in self.units
+
+    def mark_done(self, unit, result):
+        """Record a finished unit and its python-nmap style result ({'scan': ..., 'nmap': ...})"""
+        self.units[unit] = result
+        self.write({'unit': unit, 'result': result})
+
+    def mark_host(self, host, host_data):
+        self.mark_done(host, {'scan': {host: host_data}})
+
+    def completed_hosts(self):
+        """Addresses of every host in a finished unit"""
+        return {host for result in self.units.values() for host in result.get('scan', {})}
+
+    def host_items(self):
+        """(host, host_data) for every recorded host"""
+        for result in self.units.values():
+            yield from result.get('scan', {}).items()
+
+    def partial_result(self):
+        """ScanResult of everything recorded so far"""
+        from scanner.sharding import merge_scan_results
+        return ScanResult.from_nmap(merge_scan_results(self.units.values()))
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def finish(self):
+        """The scan completed: the state file is no longer needed"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __len__(self):
+        return len(self.units)
@@ -0,0 +1,408 @@
+import hmac
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from scanner.models import ScanResult, ServiceTable
+
+DEFAULT_PORT = 8787
+DEFAULT_LEASE_TIMEOUT = 120.0
+DEFAULT_MAX_ATTEMPTS = 3
+# How long an idle worker waits before asking for work again
+POLL_INTERVAL = 2.0
+# How long a finished coordinator keeps telling late workers it is done
+DONE_GRACE = 2 * POLL_INTERVAL
+# Consecutive failed requests before a worker gives up on the coordinator
+MAX_CONNECT_FAILURES = 10
+MAX_REQUEST_BYTES = 256 * 1024 * 1024
+
+
+class WorkUnit:
+    """One target slice of a distributed scan and its lease state"""
+
+    def __init__(self, unit_id, target):
+        self.unit_id = unit_id
+        self.target = target
+        self.attempts = 0
+        self.lease = None
+        self.worker = None
+        self.deadline = None
+        self.errors = []
+
+
+class ScanCoordinator:
+    """Hand out the work units of one scan to worker agents over HTTP and merge the results
+
+    Workers lease a unit (POST /lease), renew the lease while nmap runs
+    (POST /renew) and send back its ScanResult (POST /complete). A lease
+    that isn't renewed within lease_timeout - a dead or partitioned worker
+    - is taken back and the unit goes to the next worker that asks, as
+    does a unit whose scan failed; after max_attempts it is given up and
+    listed in unit_errors. The first result for a unit wins, so a slow
+    worker whose lease expired still counts if it finishes first.
+
+    Results are merged on the thread that calls run(), so they can go
+    straight into a store that isn't thread-safe, like the SQLite history.
+    """
+
+    def __init__(self, units, scan_type="Quick Scan", port_range=None, token=None,
+                 lease_timeout=DEFAULT_LEASE_TIMEOUT, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.units = {str(i): WorkUnit(str(i), target) for i, target in enumerate(units)}
+        self.pending = deque(self.units)
+        self.leased = {}
+        self.scan_type = scan_type
+        self.port_range = port_range
+        self.token = token
+        self.lease_timeout = float(lease_timeout)
+        self.max_attempts = max(1, int(max_attempts))
+        self.lock = threading.Lock()
+        self.completed = queue.Queue()
+        self.finished_units = set()
+        self.unit_errors = []
+        self.records = []
+        # Worker name -> time of its last request, and whether it was told we're done
+        self.workers = {}
+        self.told_done = set()
+        self.server = None
+        self.started = time.monotonic()
+
+    def serve(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """Start answering workers on a background thread; returns the bound (host, port)"""
+        handler = type('Handler', (CoordinatorHandler,), {'coordinator': self, 'token': self.token})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='coordinator', daemon=True).start()
+        return self.server.server_address[:2]
+
+    @property
+    def done(self):
+        return len(self.finished_units) == len(self.units)
+
+    def lease(self, worker):
+        """Next unit for worker as a dict, {'wait': seconds} if all are out, or {'done': True}"""
+        with self.lock:
+            self.workers[worker] = time.monotonic()
+            self.expire_leases()
+            while self.pending:
+                unit = self.units[self.pending.popleft()]
+                if unit.unit_id in self.finished_units:
+                    continue
+                unit.attempts += 1
+                unit.lease = uuid.uuid4().hex
+                unit.worker = worker
+                unit.deadline = time.monotonic() + self.lease_timeout
+                self.leased[unit.unit_id] = unit
+                return {
+                    'unit': unit.unit_id,
+                    'lease': unit.lease,
+                    'target': unit.target,
+                    'scan_type': self.scan_type,
+                    'ports': self.port_range,
+                    'lease_timeout': self.lease_timeout,
+                }
+            if self.done:
+                self.told_done.add(worker)
+                return {'done': True}
+            return {'wait': POLL_INTERVAL}
+
+    def renew(self, unit_id, lease):
+        """Extend a lease; False if it expired and the unit went to someone else"""
+        with self.lock:
+            unit = self.units.get(unit_id)
+            if unit is None or unit.lease != lease or unit_id in self.finished_units:
+                return False
+            unit.deadline = time.monotonic() + self.lease_timeout
+            self.workers[unit.worker] = time.monotonic()
+            return True
+
+    def complete(self, unit_id, lease, worker, result=None, error=None):
+        """Take a worker's result (a ScanResult.to_dict()) or error for a unit
+
+        Returns True if the result was used; results for finished or
+        unknown units are ignored, and a result that can't be decoded
+        counts as a failed attempt.
+        """
+        records = None
+        if error is None:
+            try:
+                records = ScanResult.from_dict(result).hosts
+            except (KeyError, TypeError, ValueError) as e:
+                error = f"bad result: {e}"
+        with self.lock:
+            self.workers[worker] = time.monotonic()
+            unit = self.units.get(unit_id)
+            if unit is None or unit_id in self.finished_units:
+                return False
+            current = unit.lease == lease
+            if error is not None:
+                unit.errors.append(f"{worker}: {error}")
+                if current:
+                    self.release(unit)
+                return False
+            self.finished_units.add(unit_id)
+            unit.lease = None
+            self.leased.pop(unit_id, None)
+        self.completed.put(records)
+        return True
+
+    def release(self, unit):
+        """Put a unit back in the queue, or give up on it after max_attempts (lock held)"""
+        unit.lease = None
+        unit.deadline = None
+        self.leased.pop(unit.unit_id, None)
+        if unit.attempts >= self.max_attempts:
+            self.finished_units.add(unit.unit_id)
+            self.unit_errors.append((unit.target, "; ".join(unit.errors[-self.max_attempts:])))
+        else:
+            self.pending.append(unit.unit_id)
+
+    def expire_leases(self):
+        """Take back every lease past its deadline (lock held)"""
+        now = time.monotonic()
+        for unit in list(self.leased.values()):
+            if unit.deadline < now:
+                unit.errors.append(f"{unit.worker}: lease expired after {self.lease_timeout:g}s")
+                self.release(unit)
+
+    def status(self):
+        with self.lock:
+            leased = len(self.leased)
+            return {
+                'units': len(self.units),
+                'finished': len(self.finished_units),
+                'failed': len(self.unit_errors),
+                'leased': leased,
+                'pending': len(self.units) - len(self.finished_units) - leased,
+                'hosts': len(self.records),
+                'workers': len(self.workers),
+                'elapsed': round(time.monotonic() - self.started, 3),
+            }
+
+    def run(self, on_result=None, on_progress=None):
+        """Merge results until every unit is finished or failed; returns a ScanResult
+
+        on_result(records) is called with each unit's HostRecords as they
+        are merged (e.g. to record them in the history database), and
+        on_progress(status) whenever a unit finishes.
+        """
+        while True:
+            with self.lock:
+                self.expire_leases()
+                done = self.done
+            try:
+                records = self.completed.get(timeout=0.5)
+            except queue.Empty:
+                if done:
+                    break
+                continue
+            self.records.extend(records)
+            if on_result is not None:
+                on_result(records)
+            if on_progress is not None:
+                on_progress(self.status())
+        with self.lock:
+            self.unit_errors.sort()
+        return ScanResult(self.records, self.records[0].service_table if self.records else ServiceTable())
+
+    def linger(self, grace=DONE_GRACE):
+        """Keep answering until every recently seen worker has been told we're done"""
+        deadline = time.monotonic() + grace
+        while time.monotonic() < deadline:
+            with self.lock:
+                active = {worker for worker, seen in self.workers.items()
+                          if time.monotonic() - seen < self.lease_timeout}
+                if active <= self.told_done:
+                    return
+            time.sleep(0.1)
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class JsonRequestHandler(BaseHTTPRequestHandler):
+    """JSON request/response helpers and optional bearer-token check for the HTTP front ends"""
+    token = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def authorized(self):
+        if not self.token:
+            return True
+        offered = self.headers.get('Authorization', '')
+        return hmac.compare_digest(offered.encode(), f"Bearer {self.token}".encode())
+
+    def send_json(self, status, body):
+        payload = json.dumps(body, separators=(',', ':')).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            raise ValueError("request too large")
+        return json.loads(self.rfile.read(length) or b'{}')
+
+
+class CoordinatorHandler(JsonRequestHandler):
+    """JSON over HTTP front end of a ScanCoordinator"""
+    coordinator = None
+    server_version = 'NmapScannerCoordinator/1.0'
+
+    def do_GET(self):
+        if not self.authorized():
+            return self.send_json(401, {'error': 'unauthorized'})
+        if self.path == '/status':
+            return self.send_json(200, self.coordinator.status())
+        self.send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if not self.authorized():
+            return self.send_json(401, {'error': 'unauthorized'})
+        try:
+            body = self.read_json()
+            worker = str(body.get('worker') or self.client_address[0])
+            if self.path == '/lease':
+                return self.send_json(200, self.coordinator.lease(worker))
+            if self.path == '/renew':
+                renewed = self.coordinator.renew(str(body['unit']), body['lease'])
+                return self.send_json(200 if renewed else 409, {'ok': renewed})
+            if self.path == '/complete':
+                accepted = self.coordinator.complete(str(body['unit']), body['lease'], worker,
+                                                     body.get('result'), body.get('error'))
+                return self.send_json(200, {'accepted': accepted})
+        except (ValueError, KeyError, TypeError) as e:
+            return self.send_json(400, {'error': str(e)})
+        self.send_json(404, {'error': 'not found'})
+
+
+class CoordinatorClient:
+    """Worker side of the coordinator protocol"""
+
+    def __init__(self, url, token=None, timeout=30.0):
+        self.url = url.rstrip('/')
+        if '://' not in self.url:
+            self.url = f"http://{self.url}"
+        self.token = token
+        self.timeout = timeout
+
+    def post(self, path, body):
+        """POST JSON and return (status, decoded body); raises OSError if unreachable"""
+        request = urllib.request.Request(self.url + path, data=json.dumps(body).encode(), method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        if self.token:
+            request.add_header('Authorization', f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            if e.code == 401:
+                raise PermissionError("coordinator rejected the token") from None
+            return e.code, json.loads(e.read() or b'{}')
+
+
+class ScanWorker:
+    """Agent that leases work units from a coordinator and scans them with one NmapScanner
+
+    While a unit is being scanned a heartbeat thread renews its lease
+    every third of the lease timeout. If the coordinator can't be reached
+    the worker retries with backoff and gives up after
+    MAX_CONNECT_FAILURES attempts in a row.
+    """
+
+    def __init__(self, scanner, client, name=None, workers=1, engine="auto", log=print):
+        self.scanner = scanner
+        self.client = client
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.workers = max(1, int(workers))
+        self.engine = engine
+        self.log = log
+        self.units_done = 0
+        self.hosts_done = 0
+        self.stopped = threading.Event()
+
+    def request(self, path, body):
+        """client.post with retries; None once the coordinator is given up on"""
+        failures = 0
+        while not self.stopped.is_set():
+            try:
+                return self.client.post(path, dict(body, worker=self.name))
+            except PermissionError:
+                raise
+            except OSError as e:
+                failures += 1
+                if failures >= MAX_CONNECT_FAILURES:
+                    self.log(f"❌ Coordinator unreachable ({e}); giving up")
+                    return None
+                self.stopped.wait(min(30.0, 0.5 * 2 ** failures))
+        return None
+
+    def run(self):
+        """Scan units until the coordinator says the scan is done; returns units scanned"""
+        while not self.stopped.is_set():
+            response = self.request('/lease', {})
+            if response is None:
+                break
+            _, lease = response
+            if lease.get('done'):
+                break
+            if 'unit' not in lease:
+                self.stopped.wait(float(lease.get('wait', POLL_INTERVAL)))
+                continue
+            self.scan_unit(lease)
+        return self.units_done
+
+    def scan_unit(self, lease):
+        self.log(f"📦 Unit {lease['unit']}: {lease['target'][:60]}")
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self.heartbeat, args=(lease, heartbeat_stop), daemon=True)
+        heartbeat.start()
+        body = {'unit': lease['unit'], 'lease': lease['lease']}
+        try:
+            # Targets end up on nmap's command line; never let one pass as an option
+            if any(token.startswith('-') for token in lease['target'].split()):
+                raise ValueError(f"refusing target {lease['target'][:60]!r}")
+            results = self.scanner.scan(lease['target'], lease['scan_type'], lease['ports'],
+                                        workers=self.workers, engine=self.engine)
+        except Exception as e:
+            results = {'error': str(e)}
+        finally:
+            heartbeat_stop.set()
+        if 'scan_result' in results:
+            body['result'] = results['scan_result'].to_dict()
+        else:
+            body['error'] = results.get('error') or results.get('message', 'scan failed')
+        response = self.request('/complete', body)
+        if response is not None and response[1].get('accepted'):
+            self.units_done += 1
+            self.hosts_done += len(results['scan_result'])
+
+    def heartbeat(self, lease, stop):
+        interval = float(lease['lease_timeout']) / 3
+        while not stop.wait(interval):
+            try:
+                status, _ = self.client.post('/renew', {'unit': lease['unit'], 'lease': lease['lease'],
+                                                        'worker': self.name})
+            except OSError:
+                continue
+            if status == 409:
+                # Taken back by the coordinator; finish anyway, the first result wins
+                self.log(f"⚠️  Lease on unit {lease['unit']} expired")
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.scanner.stop()
@@ -0,0 +1,117 @@
+import csv
+import json
+from scanner.models import PORT_STATES, PORT_STRUCT, PROTOCOLS
+
+CSV_COLUMNS = ['address', 'hostname', 'host_state', 'protocol', 'port', 'state',
+               'service', 'product', 'version', 'extrainfo', 'cpe']
+
+
+def host_to_dict(record):
+    """Plain dict for one HostRecord, as written by the JSON Lines and msgpack exporters"""
+    services = record.service_table
+    ports = []
+    for port, code, state, service_id in PORT_STRUCT.iter_unpack(record.packed_ports):
+        name, product, version, extrainfo, cpe = services[service_id]
+        ports.append({
+            'port': port, 'protocol': PROTOCOLS[code], 'state': PORT_STATES[state],
+            'service': name, 'product': product, 'version': version,
+            'extrainfo': extrainfo, 'cpe': cpe,
+        })
+    return {
+        'address': record.address,
+        'state': record.state,
+        'hostnames': [name for name in record.hostnames if name],
+        'ports': ports,
+        'os': [{'name': name, 'accuracy': accuracy} for name, accuracy in record.os_matches],
+    }
+
+
+def write_jsonl(records, stream):
+    """Write one JSON object per host; returns the number of hosts written
+
+    Output is the same as json-encoding host_to_dict(), but the encoded
+    service part of each port is cached per service, since a scan usually
+    repeats the same few services across thousands of ports.
+    """
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+    service_fragments = {}
+    count = 0
+    for record in records:
+        services = record.service_table
+        ports = []
+        for port, code, state, service_id in PORT_STRUCT.iter_unpack(record.packed_ports):
+            service = services[service_id]
+            fragment = service_fragments.get(service)
+            if fragment is None:
+                name, product, version, extrainfo, cpe = service
+                fragment = encode({'service': name, 'product': product, 'version': version,
+                                   'extrainfo': extrainfo, 'cpe': cpe})[1:]
+                service_fragments[service] = fragment
+            ports.append(f'{{"port":{port},"protocol":"{PROTOCOLS[code]}","state":"{PORT_STATES[state]}",{fragment}')
+        stream.write(
+            f'{{"address":{encode(record.address)},"state":"{record.state}",'
+            f'"hostnames":{encode([name for name in record.hostnames if name])},'
+            f'"ports":[{",".join(ports)}],'
+            f'"os":{encode([{"name": name, "accuracy": accuracy} for name, accuracy in record.os_matches])}}}\n'
+        )
+        count += 1
+    return count
+
+
+def write_csv(records, stream):
+    """Write one CSV row per port (hosts without ports get one empty row)"""
+    writer = csv.writer(stream, lineterminator="\n")
+    writer.writerow(CSV_COLUMNS)
+    count = 0
+    for record in records:
+        hostname = ' '.join(name for name in record.hostnames if name)
+        host_state = record.state
+        services = record.service_table
+        rows = [(record.address, hostname, host_state, PROTOCOLS[code], port, PORT_STATES[state])
+                + services[service_id]
+                for port, code, state, service_id in PORT_STRUCT.iter_unpack(record.packed_ports)]
+        if not rows:
+            rows.append((record.address, hostname, host_state, '', '', '', '', '', '', '', ''))
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+def import_msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise RuntimeError("msgpack output needs the msgpack package. Install it with: pip install msgpack")
+    return msgpack
+
+
+def write_msgpack(records, stream):
+    """Write a stream of msgpack maps, one per host (needs the msgpack package)"""
+    msgpack = import_msgpack()
+    packer = msgpack.Packer()
+    count = 0
+    for record in records:
+        stream.write(packer.pack(host_to_dict(record)))
+        count += 1
+    return count
+
+
+# name -> (writer, needs a binary stream)
+EXPORTERS = {
+    'jsonl': (write_jsonl, False),
+    'csv': (write_csv, False),
+    'msgpack': (write_msgpack, True),
+}
+
+
+def get_exporter(format_name):
+    """Return (writer, binary) for a format, failing early if its dependency is missing"""
+    if format_name == 'msgpack':
+        import_msgpack()
+    return EXPORTERS[format_name]
+
+
+def export_records(records, format_name, stream):
+    """Serialize HostRecords in the given format; returns the record count"""
+    writer, _ = EXPORTERS[format_name]
+    return writer(records, stream)
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from scanner.models import (HostRecord, PORT_STATE_CODES, PORT_STRUCT, PROTOCOL_CODES, ScanResult,
+                            ServiceTable)
+from scanner.paths import get_cache_dir
+
+CACHE_FILE = 'fingerprints.json'
+DEFAULT_TTL = 7 * 86400
+MAX_CACHE_ENTRIES = 200000
+# Port sets detected in their own nmap run; hosts needing anything rarer share one run
+MAX_PORT_GROUPS = 8
+
+# Profiles that can run as a port scan plus version detection of new ports only,
+# mapped to their first pass in NmapScanner.get_scan_arguments
+INCREMENTAL_PROFILES = {
+    "Service Detection": "Service Detection/ports",
+    "Intense Scan": "Intense Scan/ports",
+}
+
+TCP = PROTOCOL_CODES['tcp']
+OPEN_CODES = (PORT_STATE_CODES['open'], PORT_STATE_CODES['open|filtered'])
+
+
+class FingerprintCache:
+    """-sV results (name, product, version, extrainfo, cpe) per host:port, kept on disk
+
+    Entries live for ttl seconds; once expired the port is fingerprinted
+    again. Beyond max_entries the least recently used entries are evicted
+    when the cache is saved.
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=MAX_CACHE_ENTRIES):
+        self.path = path or get_cache_dir(CACHE_FILE)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'expired': 0, 'stored': 0, 'evictions': 0}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            now = time.time()
+            self.entries = OrderedDict((key, entry) for key, entry in entries.items()
+                                       if entry[5] + self.ttl > now)
+        except (OSError, ValueError, TypeError, IndexError, AttributeError):
+            self.entries = OrderedDict()
+
+    def get(self, address, port):
+        """Cached service tuple for a TCP port, or None if unknown or expired"""
+        key = f"{address}/{port}"
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counters['misses'] += 1
+                return None
+            if entry[5] + self.ttl <= time.time():
+                del self.entries[key]
+                self.counters['expired'] += 1
+                self.counters['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return tuple(entry[:5])
+
+    def put(self, address, port, service):
+        key = f"{address}/{port}"
+        with self.lock:
+            self.entries[key] = list(service) + [time.time()]
+            self.entries.move_to_end(key)
+            self.counters['stored'] += 1
+
+    def save(self):
+        with self.lock:
+            excess = len(self.entries) - self.max_entries
+            for _ in range(max(0, excess)):
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+            entries = dict(self.entries)
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return dict(self.counters, entries=len(self.entries),
+                        hit_rate=self.counters['hits'] / lookups if lookups else 0.0)
+
+
+def open_tcp_ports(record):
+    """Open (or open|filtered) TCP port numbers of a HostRecord"""
+    return [port for port, code, state, _ in PORT_STRUCT.iter_unpack(record.packed_ports)
+            if code == TCP and state in OPEN_CODES]
+
+
+def plan_detection(scan_result, cache):
+    """Split the open TCP ports of a port scan into cached fingerprints and ports to detect
+
+    Returns (known, groups): known maps (address, port) to a cached
+    service tuple; groups is a list of (addresses, ports) nmap runs that
+    cover every port still to fingerprint. Hosts needing the same ports
+    share a run; past MAX_PORT_GROUPS distinct sets, the rest share one
+    run over the union of their ports.
+    """
+    known = {}
+    by_ports = {}
+    for record in scan_result.hosts:
+        if record.state != 'up':
+            continue
+        missing = []
+        for port in open_tcp_ports(record):
+            service = cache.get(record.address, port)
+            if service is None:
+                missing.append(port)
+            else:
+                known[(record.address, port)] = service
+        if missing:
+            by_ports.setdefault(tuple(missing), []).append(record.address)
+
+    groups = sorted(by_ports.items(), key=lambda item: len(item[1]), reverse=True)
+    plan = [(addresses, list(ports)) for ports, addresses in groups[:MAX_PORT_GROUPS]]
+    rest = groups[MAX_PORT_GROUPS:]
+    if rest:
+        plan.append(([address for _, addresses in rest for address in addresses],
+                     sorted({port for ports, _ in rest for port in ports})))
+    return known, plan
+
+
+def merge_fingerprints(scan_result, services):
+    """Copy of a port scan's ScanResult with services[(address, port)] on its open TCP ports"""
+    service_table = ServiceTable()
+    hosts = []
+    for record in scan_result.hosts:
+        entries = []
+        for port, code, state, service_id in PORT_STRUCT.iter_unpack(record.packed_ports):
+            service = record.service_table[service_id]
+            if code == TCP and state in OPEN_CODES:
+                service = services.get((record.address, port), service)
+            entries.append(PORT_STRUCT.pack(port, code, state, service_table.intern(*service)))
+        hosts.append(HostRecord(record.address, record.state, record.hostnames, record.os_matches,
+                                b''.join(entries), service_table))
+    return ScanResult(hosts, service_table, scan_result.command_line, scan_result.scanstats)
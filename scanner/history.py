@@ -0,0 +1,250 @@
+import re
+import sqlite3
+import time
+from datetime import datetime
+from scanner.models import PORT_STATES, PORT_STATE_CODES, PORT_STRUCT, PROTOCOLS, PROTOCOL_CODES
+from scanner.paths import get_data_dir
+
+DEFAULT_BATCH_SIZE = 20000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    started_at INTEGER NOT NULL,
+    target TEXT NOT NULL,
+    scan_type TEXT NOT NULL,
+    arguments TEXT NOT NULL DEFAULT '',
+    host_count INTEGER NOT NULL DEFAULT 0,
+    port_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS hosts (
+    id INTEGER PRIMARY KEY,
+    address TEXT NOT NULL UNIQUE,
+    hostname TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS services (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    product TEXT NOT NULL,
+    version TEXT NOT NULL,
+    extrainfo TEXT NOT NULL,
+    cpe TEXT NOT NULL,
+    UNIQUE (name, product, version, extrainfo, cpe)
+);
+CREATE TABLE IF NOT EXISTS host_observations (
+    scan_id INTEGER NOT NULL REFERENCES scans(id),
+    host_id INTEGER NOT NULL REFERENCES hosts(id),
+    state TEXT NOT NULL,
+    seen_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS port_observations (
+    scan_id INTEGER NOT NULL REFERENCES scans(id),
+    host_id INTEGER NOT NULL REFERENCES hosts(id),
+    protocol INTEGER NOT NULL,
+    port INTEGER NOT NULL,
+    state INTEGER NOT NULL,
+    service_id INTEGER NOT NULL REFERENCES services(id),
+    seen_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ports_port ON port_observations (port, state, seen_at);
+CREATE INDEX IF NOT EXISTS idx_ports_host ON port_observations (host_id, seen_at);
+CREATE INDEX IF NOT EXISTS idx_ports_service ON port_observations (service_id, seen_at);
+CREATE INDEX IF NOT EXISTS idx_host_obs_host ON host_observations (host_id, seen_at);
+"""
+
+
+def parse_since(value):
+    """Turn '7d', '24h', '30m', '2w' or an ISO date into a unix timestamp"""
+    if value is None:
+        return None
+    match = re.fullmatch(r'\s*(\d+)\s*([smhdw])\s*', value)
+    if match:
+        seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}[match.group(2)]
+        return int(time.time()) - int(match.group(1)) * seconds
+    try:
+        return int(datetime.fromisoformat(value.strip()).timestamp())
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}' (use e.g. 7d, 24h or 2024-01-31)")
+
+
+class ScanHistory:
+    """Local SQLite store of every scan's hosts, ports and services
+
+    Port rows keep protocol and state as the small integer codes used by
+    the result model and reference deduplicated host and service rows, so
+    millions of observations stay compact and the indexes stay small.
+    """
+
+    def __init__(self, path=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.path = path or get_data_dir('history.sqlite3')
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.host_ids = {}
+        self.service_ids = {}
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def begin_scan(self, target, scan_type, arguments='', started_at=None):
+        """Create the scan row and return its id"""
+        with self.connection:
+            cursor = self.connection.execute(
+                "INSERT INTO scans (started_at, target, scan_type, arguments) VALUES (?, ?, ?, ?)",
+                (int(started_at or time.time()), target, scan_type, arguments))
+        return cursor.lastrowid
+
+    def get_host_id(self, address, hostname):
+        host_id = self.host_ids.get(address)
+        if host_id is None:
+            self.connection.execute(
+                "INSERT INTO hosts (address, hostname) VALUES (?, ?) "
+                "ON CONFLICT (address) DO UPDATE SET hostname = excluded.hostname "
+                "WHERE excluded.hostname != ''", (address, hostname))
+            host_id = self.connection.execute(
+                "SELECT id FROM hosts WHERE address = ?", (address,)).fetchone()[0]
+            self.host_ids[address] = host_id
+        elif hostname:
+            self.connection.execute("UPDATE hosts SET hostname = ? WHERE id = ? AND hostname != ?",
+                                    (hostname, host_id, hostname))
+        return host_id
+
+    def get_service_id(self, service):
+        service_id = self.service_ids.get(service)
+        if service_id is None:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO services (name, product, version, extrainfo, cpe) "
+                "VALUES (?, ?, ?, ?, ?)", service)
+            service_id = self.connection.execute(
+                "SELECT id FROM services WHERE name = ? AND product = ? AND version = ? "
+                "AND extrainfo = ? AND cpe = ?", service).fetchone()[0]
+            self.service_ids[service] = service_id
+        return service_id
+
+    def add_hosts(self, scan_id, records, seen_at=None):
+        """Insert HostRecords for a scan, batched into executemany calls"""
+        for _ in self.record_stream(scan_id, records, seen_at):
+            pass
+
+    def record_stream(self, scan_id, records, seen_at=None):
+        """Pass HostRecords through while writing them in batches
+
+        Lets streaming scans be recorded without holding the whole result:
+        rows are flushed every batch_size ports and once the stream ends.
+        """
+        seen_at = int(seen_at or time.time())
+        host_rows = []
+        port_rows = []
+        try:
+            for record in records:
+                hostname = ', '.join(name for name in record.hostnames if name)
+                host_id = self.get_host_id(record.address, hostname)
+                host_rows.append((scan_id, host_id, record.state, seen_at))
+                services = record.service_table
+                for port, protocol, state, service_id in PORT_STRUCT.iter_unpack(record.packed_ports):
+                    port_rows.append((scan_id, host_id, protocol, port, state,
+                                      self.get_service_id(services[service_id]), seen_at))
+                if len(port_rows) >= self.batch_size:
+                    self.flush(scan_id, host_rows, port_rows)
+                yield record
+        finally:
+            self.flush(scan_id, host_rows, port_rows)
+
+    def flush(self, scan_id, host_rows, port_rows):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE scans SET host_count = host_count + ?, port_count = port_count + ? WHERE id = ?",
+                (len(host_rows), len(port_rows), scan_id))
+            self.connection.executemany(
+                "INSERT INTO host_observations (scan_id, host_id, state, seen_at) VALUES (?, ?, ?, ?)",
+                host_rows)
+            self.connection.executemany(
+                "INSERT INTO port_observations (scan_id, host_id, protocol, port, state, service_id, seen_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", port_rows)
+        host_rows.clear()
+        port_rows.clear()
+
+    def record_scan(self, target, scan_type, scan_result, arguments=''):
+        """Persist a complete ScanResult and return the scan id"""
+        scan_id = self.begin_scan(target, scan_type, arguments)
+        self.add_hosts(scan_id, scan_result.hosts)
+        return scan_id
+
+    def query_ports(self, port=None, state='open', since=None, until=None, host=None,
+                    service=None, protocol='tcp', limit=1000):
+        """Return port observations matching the filters, newest first
+
+        Each row is a dict with address, hostname, port, protocol, state,
+        service, product, version, seen_at and scan_id.
+        """
+        clauses = []
+        params = []
+        if port is not None:
+            clauses.append("p.port = ?")
+            params.append(int(port))
+        if state:
+            clauses.append("p.state = ?")
+            params.append(PORT_STATE_CODES[state])
+        if protocol:
+            clauses.append("p.protocol = ?")
+            params.append(PROTOCOL_CODES[protocol])
+        if since is not None:
+            clauses.append("p.seen_at >= ?")
+            params.append(int(since))
+        if until is not None:
+            clauses.append("p.seen_at < ?")
+            params.append(int(until))
+        if host:
+            clauses.append("h.address = ?")
+            params.append(host)
+        if service:
+            clauses.append("p.service_id IN (SELECT id FROM services WHERE name = ?)")
+            params.append(service)
+
+        sql = ("SELECT h.address, h.hostname, p.port, p.protocol, p.state, s.name, s.product, "
+               "s.version, p.seen_at, p.scan_id FROM port_observations p "
+               "JOIN hosts h ON h.id = p.host_id JOIN services s ON s.id = p.service_id")
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY p.seen_at DESC LIMIT ?"
+        params.append(int(limit))
+
+        return [
+            {
+                'address': address, 'hostname': hostname, 'port': port_number,
+                'protocol': PROTOCOLS[protocol_code], 'state': PORT_STATES[state_code],
+                'service': name, 'product': product, 'version': version,
+                'seen_at': seen_at, 'scan_id': scan_id,
+            }
+            for (address, hostname, port_number, protocol_code, state_code,
+                 name, product, version, seen_at, scan_id) in self.connection.execute(sql, params)
+        ]
+
+    def open_port_pairs(self, since=None, protocol='tcp'):
+        """Distinct (address, port) pairs seen open, optionally only since a unix timestamp"""
+        sql = ("SELECT DISTINCT h.address, p.port FROM port_observations p JOIN hosts h ON h.id = p.host_id "
+               "WHERE p.state = ? AND p.protocol = ?")
+        params = [PORT_STATE_CODES['open'], PROTOCOL_CODES[protocol]]
+        if since is not None:
+            sql += " AND p.seen_at >= ?"
+            params.append(int(since))
+        return self.connection.execute(sql, params)
+
+    def list_scans(self, limit=20):
+        """Most recent scans with their host and port counts"""
+        rows = self.connection.execute(
+            "SELECT id, started_at, target, scan_type, host_count, port_count "
+            "FROM scans ORDER BY started_at DESC, id DESC LIMIT ?", (int(limit),))
+        return [
+            {'scan_id': scan_id, 'started_at': started_at, 'target': target,
+             'scan_type': scan_type, 'hosts': hosts, 'ports': ports}
+            for scan_id, started_at, target, scan_type, hosts, ports in rows
+        ]
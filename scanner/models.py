@@ -0,0 +1,224 @@
+import base64
+import struct
+import sys
+
+# Alphabetical, so packed records sorted by protocol code list protocols
+# in the same order python-nmap's all_protocols() did
+PROTOCOLS = ('ip', 'sctp', 'tcp', 'udp')
+PORT_STATES = ('open', 'closed', 'filtered', 'unfiltered', 'open|filtered', 'closed|filtered', 'unknown')
+HOST_STATES = ('up', 'down', 'unknown', 'skipped')
+
+# One packed port entry: port, protocol code, state code, service id
+PORT_STRUCT = struct.Struct('<HBBI')
+
+PROTOCOL_CODES = {name: code for code, name in enumerate(PROTOCOLS)}
+PORT_STATE_CODES = {name: code for code, name in enumerate(PORT_STATES)}
+HOST_STATE_CODES = {name: code for code, name in enumerate(HOST_STATES)}
+
+
+class ReadOnly:
+    """Base for __slots__ records whose fields can't change after construction"""
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+
+class ServiceTable:
+    """Interned (name, product, version, extrainfo, cpe) tuples shared by a whole scan
+
+    Most hosts on a network run the same handful of services, so ports
+    store a small integer id instead of their own copy of the strings.
+    """
+    __slots__ = ('services', 'ids')
+
+    def __init__(self):
+        self.services = [('', '', '', '', '')]
+        self.ids = {self.services[0]: 0}
+
+    def intern(self, name='', product='', version='', extrainfo='', cpe=''):
+        service = (name or '', product or '', version or '', extrainfo or '', cpe or '')
+        service_id = self.ids.get(service)
+        if service_id is None:
+            service_id = len(self.services)
+            self.services.append(tuple(sys.intern(value) for value in service))
+            self.ids[self.services[service_id]] = service_id
+        return service_id
+
+    def __getitem__(self, service_id):
+        return self.services[service_id]
+
+    def __len__(self):
+        return len(self.services)
+
+
+class PortRecord(ReadOnly):
+    """One scanned port, materialized on demand from a HostRecord"""
+    __slots__ = ('protocol', 'port', 'state', 'name', 'product', 'version', 'extrainfo', 'cpe')
+
+    def __init__(self, protocol, port, state, name='', product='', version='', extrainfo='', cpe=''):
+        for field, value in zip(self.__slots__, (protocol, port, state, name, product, version, extrainfo, cpe)):
+            object.__setattr__(self, field, value)
+
+    def __repr__(self):
+        return f"PortRecord({self.port}/{self.protocol} {self.state} {self.name})"
+
+
+class HostRecord(ReadOnly):
+    """Immutable scan result for one host
+
+    Ports are packed into a single bytes object of PORT_STRUCT entries,
+    sorted by protocol and port, instead of a dict of dicts per port.
+    """
+    __slots__ = ('address', 'state_code', 'hostnames', 'os_matches', 'packed_ports', 'service_table')
+
+    def __init__(self, address, state, hostnames, os_matches, packed_ports, service_table):
+        object.__setattr__(self, 'address', address)
+        object.__setattr__(self, 'state_code', HOST_STATE_CODES.get(state, HOST_STATE_CODES['unknown']))
+        object.__setattr__(self, 'hostnames', tuple(hostnames))
+        object.__setattr__(self, 'os_matches', tuple(os_matches))
+        object.__setattr__(self, 'packed_ports', packed_ports)
+        object.__setattr__(self, 'service_table', service_table)
+
+    @classmethod
+    def from_host_data(cls, host, host_data, service_table):
+        """Build a record from a python-nmap style host dict"""
+        entries = []
+        for protocol, code in PROTOCOL_CODES.items():
+            for port, info in (host_data.get(protocol) or {}).items():
+                service_id = service_table.intern(info.get('name', ''), info.get('product', ''),
+                                                  info.get('version', ''), info.get('extrainfo', ''),
+                                                  info.get('cpe', ''))
+                state = PORT_STATE_CODES.get(info.get('state'), PORT_STATE_CODES['unknown'])
+                entries.append((code, int(port), state, service_id))
+        entries.sort()
+        packed = b''.join(PORT_STRUCT.pack(port, code, state, service_id)
+                          for code, port, state, service_id in entries)
+
+        status = host_data.get('status') or {}
+        hostnames = [h.get('name') or '' for h in host_data.get('hostnames', [])]
+        os_matches = [(m.get('name', 'Unknown OS'), m.get('accuracy', 'Unknown'))
+                      for m in host_data.get('osmatch') or []]
+        return cls(host, status.get('state', 'unknown'), hostnames, os_matches, packed, service_table)
+
+    def with_hostnames(self, hostnames):
+        """Copy of this record with other hostnames; ports and services are shared"""
+        return HostRecord(self.address, self.state, hostnames, self.os_matches,
+                          self.packed_ports, self.service_table)
+
+    @property
+    def state(self):
+        return HOST_STATES[self.state_code]
+
+    @property
+    def port_count(self):
+        return len(self.packed_ports) // PORT_STRUCT.size
+
+    def protocols(self):
+        """Protocols with at least one port, in display order"""
+        seen = []
+        for _, code, _, _ in PORT_STRUCT.iter_unpack(self.packed_ports):
+            if not seen or seen[-1] != PROTOCOLS[code]:
+                seen.append(PROTOCOLS[code])
+        return seen
+
+    def ports(self, protocol=None):
+        """Yield PortRecords, optionally for a single protocol"""
+        services = self.service_table
+        for port, code, state, service_id in PORT_STRUCT.iter_unpack(self.packed_ports):
+            if protocol is not None and PROTOCOLS[code] != protocol:
+                continue
+            yield PortRecord(PROTOCOLS[code], port, PORT_STATES[state], *services[service_id])
+
+    def open_ports(self, protocol='tcp'):
+        """Port numbers in the open state, without building PortRecords"""
+        code = PROTOCOL_CODES[protocol]
+        open_code = PORT_STATE_CODES['open']
+        return [port for port, proto, state, _ in PORT_STRUCT.iter_unpack(self.packed_ports)
+                if proto == code and state == open_code]
+
+    def __repr__(self):
+        return f"HostRecord({self.address} {self.state}, {self.port_count} ports)"
+
+
+class ScanResult(ReadOnly):
+    """Immutable, compact result of one scan, built once from nmap's output"""
+    __slots__ = ('hosts', 'index', 'service_table', 'command_line', 'scanstats')
+
+    def __init__(self, hosts, service_table, command_line='', scanstats=None):
+        hosts = tuple(sorted(hosts, key=lambda record: record.address))
+        object.__setattr__(self, 'hosts', hosts)
+        object.__setattr__(self, 'index', {record.address: i for i, record in enumerate(hosts)})
+        object.__setattr__(self, 'service_table', service_table)
+        object.__setattr__(self, 'command_line', command_line)
+        object.__setattr__(self, 'scanstats', dict(scanstats or {}))
+
+    @classmethod
+    def from_nmap(cls, scan_result):
+        """Build from a python-nmap result dict ({'nmap': ..., 'scan': {...}})"""
+        nmap_info = scan_result.get('nmap', {})
+        command_line = nmap_info.get('command_line') or ''
+        if isinstance(command_line, list):
+            command_line = " ; ".join(command_line)
+        return cls.from_host_records(scan_result.get('scan', {}).items(),
+                                     command_line, nmap_info.get('scanstats'))
+
+    @classmethod
+    def from_host_records(cls, host_records, command_line='', scanstats=None):
+        """Build from an iterable of (host, host_data) pairs, e.g. a stream"""
+        service_table = ServiceTable()
+        hosts = [HostRecord.from_host_data(host, host_data, service_table)
+                 for host, host_data in host_records]
+        return cls(hosts, service_table, command_line, scanstats)
+
+    def to_dict(self):
+        """JSON-serializable form; packed ports are kept packed (base64)"""
+        service_table = ServiceTable()
+        hosts = []
+        for record in self.hosts:
+            # Records may come from different tables (e.g. merged streams),
+            # so service ids are re-interned into one table for the output
+            packed = b''.join(
+                PORT_STRUCT.pack(port, code, state, service_table.intern(*record.service_table[service_id]))
+                for port, code, state, service_id in PORT_STRUCT.iter_unpack(record.packed_ports))
+            hosts.append([record.address, record.state, list(record.hostnames),
+                          [list(match) for match in record.os_matches],
+                          base64.b64encode(packed).decode('ascii')])
+        return {
+            'command_line': self.command_line,
+            'scanstats': self.scanstats,
+            'services': [list(service) for service in service_table.services],
+            'hosts': hosts,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a ScanResult produced by to_dict"""
+        service_table = ServiceTable()
+        for service in data['services'][1:]:
+            service_table.intern(*service)
+        hosts = [HostRecord(address, state, hostnames, [tuple(match) for match in os_matches],
+                            base64.b64decode(packed), service_table)
+                 for address, state, hostnames, os_matches, packed in data['hosts']]
+        return cls(hosts, service_table, data.get('command_line', ''), data.get('scanstats'))
+
+    def all_hosts(self):
+        return [record.address for record in self.hosts]
+
+    def __getitem__(self, host):
+        return self.hosts[self.index[host]]
+
+    def __contains__(self, host):
+        return host in self.index
+
+    def __iter__(self):
+        return iter(self.hosts)
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def __repr__(self):
+        return f"ScanResult({len(self.hosts)} hosts)"
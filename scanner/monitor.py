@@ -0,0 +1,257 @@
+import json
+import os
+import random
+import threading
+import time
+from scanner.cache import make_cache_key
+from scanner.paths import get_data_dir
+
+DEFAULT_MIN_INTERVAL = 300
+DEFAULT_MAX_INTERVAL = 86400
+DEFAULT_BATCH_SIZE = 256
+# Interval growth per check that finds nothing new
+BACKOFF = 2.0
+# Spread checks so hosts found by one sweep don't stay in lockstep forever
+JITTER = 0.1
+# Hosts due within this share of their interval join the current run instead of needing their own
+COALESCE = 0.25
+OPEN_STATES = ('open', 'open|filtered')
+
+
+def port_snapshot(record):
+    """{"tcp/22": [state, service, product, version]} for every port nmap reported"""
+    return {f"{port.protocol}/{port.port}": [port.state, port.name, port.product, port.version]
+            for port in record.ports()}
+
+
+def diff_host(address, old, state, ports):
+    """Change events between a host's last known state and a new scan of it
+
+    old is the stored host entry (None for a new host); state and ports
+    are the new host state and port_snapshot (ports None if the host was
+    not seen at all). Events are dicts with 'event', 'address' and, for
+    port events, 'port' plus the old and new values.
+    """
+    events = []
+    old_state = old['state'] if old else None
+    if state != old_state:
+        if state == 'up':
+            events.append({'event': 'host_new' if old is None else 'host_up', 'address': address})
+        elif old_state == 'up':
+            events.append({'event': 'host_down', 'address': address})
+    if state != 'up':
+        return events
+
+    old_ports = old['ports'] if old else {}
+    for key in sorted(set(old_ports) | set(ports), key=port_sort_key):
+        before, after = old_ports.get(key), ports.get(key)
+        was_open = before is not None and before[0] in OPEN_STATES
+        is_open = after is not None and after[0] in OPEN_STATES
+        if is_open and not was_open:
+            events.append({'event': 'port_opened', 'address': address, 'port': key,
+                           'service': service_text(after)})
+        elif was_open and not is_open:
+            events.append({'event': 'port_closed', 'address': address, 'port': key,
+                           'state': after[0] if after else 'closed', 'service': service_text(before)})
+        elif is_open and before[1:] != after[1:]:
+            events.append({'event': 'service_changed', 'address': address, 'port': key,
+                           'old': service_text(before), 'new': service_text(after)})
+    return events
+
+
+def port_sort_key(key):
+    protocol, _, port = key.partition('/')
+    return protocol, int(port)
+
+
+def service_text(entry):
+    return " ".join(part for part in entry[1:] if part) or 'unknown'
+
+
+class MonitorState:
+    """Last known state and rescan schedule of every host a monitor has seen, kept as JSON
+
+    hosts maps an address to {'state', 'ports', 'interval', 'next_due',
+    'last_checked', 'last_change', 'checks'}; last_sweep is when the whole
+    target was last scanned for new hosts.
+    """
+
+    def __init__(self, target, arguments, path=None):
+        if path is None:
+            name = make_cache_key(target, arguments, '')[:32] + '.json'
+            os.makedirs(get_data_dir('monitor'), exist_ok=True)
+            path = get_data_dir('monitor', name)
+        self.path = path
+        self.header = {'target': target, 'arguments': arguments}
+        self.hosts = {}
+        self.last_sweep = 0.0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if all(data.get(key) == value for key, value in self.header.items()):
+                self.hosts = data.get('hosts', {})
+                self.last_sweep = float(data.get('last_sweep', 0))
+        except (OSError, ValueError, TypeError, AttributeError):
+            self.hosts = {}
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(self.header, last_sweep=self.last_sweep, hosts=self.hosts), f,
+                      separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+
+class ScanMonitor:
+    """Rescan a target's hosts on per-host adaptive schedules and report what changed
+
+    Every known host has its own check interval: a check that finds a
+    change resets it to min_interval, one that finds nothing multiplies
+    it by BACKOFF up to max_interval. Each cycle only the hosts that are
+    due are scanned, packed batch_size at a time into one nmap run, so a
+    mostly stable estate costs a fraction of the runs of blind periodic
+    rescans. The whole target is swept every sweep_interval to pick up
+    hosts that weren't there before. Failed runs are retried after
+    min_interval rather than on the next cycle.
+    """
+
+    def __init__(self, scanner, sweep_targets, state, scan_type="Quick Scan", port_range=None, engine="nmap",
+                 min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL, sweep_interval=None,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        self.scanner = scanner
+        self.sweep_targets = list(sweep_targets)
+        self.state = state
+        self.scan_type = scan_type
+        self.port_range = port_range
+        self.engine = engine
+        self.min_interval = float(min_interval)
+        self.max_interval = max(float(max_interval), self.min_interval)
+        self.sweep_interval = float(sweep_interval or self.max_interval)
+        self.batch_size = max(1, int(batch_size))
+        # Set while the last sweep failed; the retry waits min_interval
+        self.sweep_failed_at = None
+        self.stopped = threading.Event()
+        self.counters = {'cycles': 0, 'runs': 0, 'hosts_checked': 0, 'changes': 0}
+
+    def due_hosts(self, now):
+        """Hosts due now, plus those due soon enough to share the run"""
+        return sorted((address for address, host in self.state.hosts.items()
+                       if host['next_due'] <= now + COALESCE * host['interval']),
+                      key=lambda address: self.state.hosts[address]['next_due'])
+
+    def next_sweep(self):
+        """When the next sweep is due"""
+        due = self.state.last_sweep + self.sweep_interval
+        if self.sweep_failed_at is not None:
+            due = max(due, self.sweep_failed_at + self.min_interval)
+        return due
+
+    def next_wakeup(self):
+        """When the next host (or the next sweep) is due"""
+        due = [host['next_due'] for host in self.state.hosts.values()]
+        due.append(self.next_sweep())
+        return min(due)
+
+    def scan(self, target):
+        """HostRecords of one nmap run; RuntimeError if the run failed"""
+        self.counters['runs'] += 1
+        results = self.scanner.scan(target, self.scan_type, self.port_range, engine=self.engine)
+        if 'scan_result' not in results:
+            raise RuntimeError(results.get('error') or results.get('message', 'scan failed'))
+        return results['scan_result'].hosts
+
+    def check(self, address, record, now):
+        """Diff one host against its stored state, update it and reschedule it; returns the events"""
+        old = self.state.hosts.get(address)
+        if record is None:
+            state, ports = 'down', None
+        else:
+            state, ports = record.state, port_snapshot(record)
+        events = diff_host(address, old, state, ports)
+        if old is None and state != 'up':
+            # A sweep address with nobody home: nothing to track
+            return events
+        host = old or {'interval': self.min_interval, 'checks': 0, 'last_change': now, 'ports': {}}
+        host['state'] = state
+        if ports is not None:
+            host['ports'] = ports
+        if events:
+            host['interval'] = self.min_interval
+            host['last_change'] = now
+        elif old is not None:
+            host['interval'] = min(self.max_interval, host['interval'] * BACKOFF)
+        host['checks'] += 1
+        host['last_checked'] = now
+        host['next_due'] = now + host['interval'] * random.uniform(1 - JITTER, 1)
+        self.state.hosts[address] = host
+        self.counters['hosts_checked'] += 1
+        self.counters['changes'] += len(events)
+        return events
+
+    def cycle(self, now=None):
+        """Scan whatever is due; returns (events, errors)
+
+        A sweep covers every host, so due hosts are only scanned on
+        their own in cycles without one. Hosts a failed sweep did report
+        are still checked, but only a complete one marks the rest down.
+        """
+        now = now if now is not None else time.time()
+        self.counters['cycles'] += 1
+        events = []
+        errors = []
+        if now >= self.next_sweep():
+            seen = set()
+            for target in self.sweep_targets:
+                if self.stopped.is_set():
+                    break
+                try:
+                    records = self.scan(target)
+                except RuntimeError as e:
+                    errors.append((target, str(e)))
+                    continue
+                for record in records:
+                    seen.add(record.address)
+                    events.extend(self.check(record.address, record, now))
+            if errors:
+                self.sweep_failed_at = now
+            elif not self.stopped.is_set():
+                # Known hosts the sweep didn't report are down
+                for address in list(self.state.hosts):
+                    if address not in seen:
+                        events.extend(self.check(address, None, now))
+                self.state.last_sweep = now
+                self.sweep_failed_at = None
+        else:
+            due = self.due_hosts(now)
+            for i in range(0, len(due), self.batch_size):
+                if self.stopped.is_set():
+                    break
+                batch = due[i:i + self.batch_size]
+                try:
+                    records = {record.address: record for record in self.scan(" ".join(batch))}
+                except RuntimeError as e:
+                    errors.append((" ".join(batch), str(e)))
+                    for address in batch:
+                        self.state.hosts[address]['next_due'] = now + self.min_interval
+                    continue
+                for address in batch:
+                    events.extend(self.check(address, records.get(address), now))
+        self.state.save()
+        return events, errors
+
+    def run(self, on_events=None, once=False):
+        """Run cycles until stop() (or just one with once), sleeping until the next host is due"""
+        while not self.stopped.is_set():
+            events, errors = self.cycle()
+            if on_events is not None:
+                on_events(events, errors)
+            if once:
+                break
+            self.stopped.wait(max(1.0, self.next_wakeup() - time.time()))
+
+    def stop(self):
+        self.stopped.set()
+        self.scanner.stop()
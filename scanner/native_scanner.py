@@ -0,0 +1,243 @@
+import asyncio
+import errno
+import functools
+import ipaddress
+import socket
+import time
+from datetime import datetime
+from scanner.models import ScanResult
+from scanner.ports import PortSet, default_ports, parse_ports
+
+DEFAULT_CONCURRENCY = 4096
+DEFAULT_PER_HOST = 512
+DEFAULT_TIMEOUT = 1.0
+DEFAULT_RETRIES = 1
+# Hosts whose ports are interleaved at once; bounds the per-host bookkeeping
+HOST_GROUP = 256
+# Like nmap, a state with more ports than this on a host is not listed
+MAX_LISTED_PER_STATE = 25
+# Ports tried for host discovery ("Ping Scan"), as unprivileged nmap -sn does
+PING_PORTS = (80, 443, 22)
+
+# Errors that mean the probe should be retried rather than counted
+_RESOURCE_ERRORS = {errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.EAGAIN, errno.EADDRNOTAVAIL}
+
+
+def file_descriptor_limit():
+    """Soft limit on open files, or None where it can't be read"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    return None if soft == resource.RLIM_INFINITY else soft
+
+
+@functools.lru_cache(maxsize=None)
+def service_name(port):
+    try:
+        return socket.getservbyport(port, 'tcp')
+    except OSError:
+        return ''
+
+
+class TargetHost:
+    """Per-host probe state: a concurrency cap and the ports seen so far"""
+    __slots__ = ('address', 'hostname', 'semaphore', 'responded', 'ports', 'counts')
+
+    def __init__(self, address, hostname, per_host):
+        self.address = address
+        self.hostname = hostname
+        self.semaphore = asyncio.Semaphore(per_host)
+        self.responded = False
+        self.ports = {'open': [], 'closed': [], 'filtered': []}
+        self.counts = {'open': 0, 'closed': 0, 'filtered': 0}
+
+    def add(self, port, state):
+        self.counts[state] += 1
+        if state == 'open' or self.counts[state] <= MAX_LISTED_PER_STATE + 1:
+            self.ports[state].append(port)
+        if state != 'filtered':
+            self.responded = True
+
+    def host_data(self):
+        """python-nmap style host dict with the listed ports"""
+        tcp = {}
+        for state, reason in (('open', 'syn-ack'), ('closed', 'conn-refused'), ('filtered', 'no-response')):
+            if state != 'open' and self.counts[state] > MAX_LISTED_PER_STATE:
+                continue
+            for port in self.ports[state]:
+                tcp[port] = {'state': state, 'reason': reason, 'name': service_name(port),
+                             'product': '', 'version': '', 'extrainfo': '', 'conf': '3', 'cpe': ''}
+        data = {
+            'hostnames': [{'name': self.hostname, 'type': 'user'} if self.hostname
+                          else {'name': '', 'type': ''}],
+            'addresses': {'ipv6' if ':' in self.address else 'ipv4': self.address},
+            'vendor': {},
+            'status': {'state': 'up', 'reason': 'syn-ack' if self.counts['open'] else 'conn-refused'},
+        }
+        if tcp:
+            data['tcp'] = dict(sorted(tcp.items()))
+        return data
+
+
+class NativeScanner:
+    """TCP connect scanner built on asyncio, for hosts without nmap
+
+    Thousands of non-blocking connects run at once (bounded globally and
+    per host), so it needs no raw sockets or root and works on Termux and
+    locked-down machines. Results come back as the same result dict and
+    ScanResult that the nmap engine produces.
+
+    A connect that completes marks the port open, a refusal closed and a
+    timeout filtered; hosts that never answer are reported as down.
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, per_host=DEFAULT_PER_HOST,
+                 timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES):
+        limit = file_descriptor_limit()
+        if limit:
+            # Leave room for the interpreter's own files
+            concurrency = min(concurrency, max(16, limit - 64))
+        self.concurrency = max(1, int(concurrency))
+        self.per_host = max(1, int(per_host))
+        self.timeout = timeout
+        self.retries = max(0, int(retries))
+        self.probes = 0
+
+    def scan(self, target, scan_type="Quick Scan", port_range=None):
+        """Blocking scan; returns the standard result dict (or an error dict)"""
+        try:
+            if scan_type == "Ping Scan":
+                ports = list(PING_PORTS)
+            else:
+                ports = parse_ports(port_range) if port_range else default_ports(scan_type)
+            print(f"Scanning {target} with native TCP connect engine ({len(ports)} ports)")
+            scan_result = asyncio.run(self.scan_async(target, ports, scan_type == "Ping Scan"))
+        except Exception as e:
+            return {
+                'error': str(e),
+                'hosts': [],
+                'scan_type': scan_type,
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+        return {
+            'hosts': scan_result.all_hosts(),
+            'scan_result': scan_result,
+            'scan_type': scan_type,
+            'engine': 'native',
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    async def scan_async(self, target, ports, ping_only=False):
+        """Probe every port on every target host; returns a ScanResult"""
+        started = time.monotonic()
+        self.probes = 0
+        up_records = []
+        total_hosts = 0
+        async for group in self.host_groups(target):
+            total_hosts += len(group)
+            await self.probe_group(group, ports, ping_only)
+            for host in group:
+                if host.responded:
+                    data = host.host_data()
+                    if ping_only:
+                        data.pop('tcp', None)
+                    up_records.append((host.address, data))
+
+        elapsed = time.monotonic() - started
+        scanstats = {
+            'timestr': time.ctime(),
+            'elapsed': f"{elapsed:.2f}",
+            'uphosts': str(len(up_records)),
+            'downhosts': str(total_hosts - len(up_records)),
+            'totalhosts': str(total_hosts),
+        }
+        command_line = f"native-connect -p {PortSet.from_ports(ports)} {target}"
+        return ScanResult.from_host_records(up_records, command_line, scanstats)
+
+    async def host_groups(self, target):
+        """Yield lists of TargetHosts, HOST_GROUP at a time, expanding CIDRs lazily"""
+        loop = asyncio.get_running_loop()
+        group = []
+        seen = set()
+        for token in target.split():
+            try:
+                network = ipaddress.ip_network(token, strict=False)
+            except ValueError:
+                infos = await loop.getaddrinfo(token, None, type=socket.SOCK_STREAM)
+                if not infos:
+                    raise ValueError(f"Failed to resolve \"{token}\"")
+                addresses = [(infos[0][4][0], token)]
+            else:
+                if network.num_addresses == 1:
+                    addresses = [(str(network.network_address), '')]
+                else:
+                    addresses = ((str(address), '') for address in network.hosts())
+            for address, hostname in addresses:
+                if address in seen:
+                    continue
+                seen.add(address)
+                group.append(TargetHost(address, hostname, self.per_host))
+                if len(group) >= HOST_GROUP:
+                    yield group
+                    group = []
+        if group:
+            yield group
+
+    async def probe_group(self, hosts, ports, ping_only=False):
+        """Run a bounded pool of workers over every (port, host) pair
+
+        Ports are the outer loop so consecutive probes go to different
+        hosts, spreading the load instead of hammering one host at a time.
+        """
+        pending = set(hosts) if ping_only else None
+        pairs = ((host, port) for port in ports for host in hosts)
+
+        async def worker():
+            for host, port in pairs:
+                if pending is not None and host not in pending:
+                    continue
+                async with host.semaphore:
+                    state = await self.probe(host.address, port)
+                host.add(port, state)
+                if pending is not None and host.responded:
+                    pending.discard(host)
+
+        workers = min(self.concurrency, len(hosts) * len(ports))
+        tasks = [asyncio.ensure_future(worker()) for _ in range(workers)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def probe(self, address, port):
+        """Connect once (plus retries on timeout); returns open, closed or filtered
+
+        Uses a bare non-blocking socket rather than asyncio streams: no
+        data is exchanged, so the transport and stream objects are overhead.
+        """
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if ':' in address else socket.AF_INET
+        for attempt in range(self.retries + 1):
+            self.probes += 1
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            try:
+                await asyncio.wait_for(loop.sock_connect(sock, (address, port)), self.timeout)
+            except asyncio.TimeoutError:
+                continue
+            except ConnectionRefusedError:
+                return 'closed'
+            except OSError as e:
+                if e.errno in _RESOURCE_ERRORS:
+                    # Out of sockets: back off and try the same probe again
+                    await asyncio.sleep(0.05)
+                    continue
+                # Unreachable hosts/networks behave like filtered ports
+                return 'filtered'
+            finally:
+                sock.close()
+            return 'open'
+        return 'filtered'
@@ -0,0 +1,91 @@
+import json
+import os
+from scanner.paths import get_cache_dir
+
+# Checked in order after a PATH lookup, same as NmapScanner always did
+NMAP_CANDIDATES = [
+    'C:\\Program Files (x86)\\Nmap\\nmap.exe',  # Default Windows install
+    'C:\\Program Files\\Nmap\\nmap.exe',  # Alternative Windows install
+    '/usr/bin/nmap',  # Linux
+    '/usr/local/bin/nmap'  # macOS/Linux alternative
+]
+
+CACHE_FILE = 'nmap_binary.json'
+
+
+def probe_nmap(nmap_path, timeout=10):
+    """Run nmap --version and return its version string, or None if it fails"""
+    import subprocess
+    try:
+        result = subprocess.run([nmap_path, '--version'],
+                                capture_output=True, text=True, timeout=timeout)
+    except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
+        return None
+    if result.returncode != 0:
+        return None
+    # "Nmap version 7.94 ( https://nmap.org )"
+    for line in result.stdout.splitlines():
+        if line.startswith('Nmap version'):
+            return line.split()[2]
+    return 'unknown'
+
+
+def load_cached_binary(path_env):
+    """Return the cached {'nmap_path', 'version'} entry if it is still valid"""
+    try:
+        with open(get_cache_dir(CACHE_FILE), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        if entry.get('path_env') != path_env:
+            return None
+        if os.stat(entry['nmap_path']).st_mtime != entry['mtime']:
+            return None
+        return entry
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_cached_binary(path_env, nmap_path, version):
+    try:
+        entry = {
+            'path_env': path_env,
+            'nmap_path': nmap_path,
+            'mtime': os.stat(nmap_path).st_mtime,
+            'version': version,
+        }
+        cache_file = get_cache_dir(CACHE_FILE)
+        tmp_file = cache_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+
+
+def locate_nmap(use_cache=True):
+    """Find a working nmap binary and return (path, version), or (None, None)
+
+    The result is cached on disk keyed on PATH and the binary's mtime, so
+    repeated runs skip the nmap --version probe until either changes.
+    """
+    path_env = os.environ.get('PATH', '')
+    if use_cache:
+        entry = load_cached_binary(path_env)
+        if entry:
+            return entry['nmap_path'], entry['version']
+
+    import shutil
+    candidates = []
+    in_path = shutil.which('nmap')
+    if in_path:
+        candidates.append(os.path.abspath(in_path))
+    candidates.extend(path for path in NMAP_CANDIDATES if path not in candidates)
+
+    for nmap_path in candidates:
+        if not os.path.isfile(nmap_path):
+            continue
+        version = probe_nmap(nmap_path)
+        if version:
+            save_cached_binary(path_env, nmap_path, version)
+            return nmap_path, version
+
+    return None, None
@@ -1,21 +1,87 @@
-import subprocess
 import sys
 import os
+import shlex
+import tempfile
+import threading
+import time
 from datetime import datetime
+from scanner.nmap_binary import locate_nmap
+from scanner.models import HostRecord, ScanResult, ServiceTable
+from scanner.ports import TOP_100_TCP_PORTS, PortSet, normalize_port_spec
+from scanner.profiling import phase_context
+
+# How often nmap reports progress when a caller asks for it
+STATS_INTERVAL = "1s"
+
+def write_exclude_file(hosts):
+    """Write hosts to a temporary nmap --excludefile and return its path"""
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', prefix='nmap_exclude_', delete=False) as f:
+        f.write("\n".join(sorted(hosts)) + "\n")
+    return f.name
+
+# Hosts per -sV run of an incremental scan's second pass
+DETECTION_BATCH = 1024
+
 
 class NmapScanner:
-    def __init__(self):
+    def __init__(self, cache=None, timing=None, profiler=None, resolver=None, fingerprints=None, archive=None,
+                 port_model=None):
         self.nmap_path = None
+        self.nmap_version = None
+        # Optional ResultCache for repeated identical scans
+        self.cache = cache
+        # Optional TimingController that tunes rate limits per network
+        self.timing = timing
+        # Optional ScanProfiler timing each phase of a scan
+        self.profiler = profiler
+        # Optional BulkResolver: hostnames are resolved up front and nmap runs with -n
+        self.resolver = resolver
+        # Optional FingerprintCache: -sV/-A profiles only fingerprint ports it can't answer
+        self.fingerprints = fingerprints
+        # Optional XmlArchive: the raw XML of every nmap run is kept in it
+        self.archive = archive
+        # Optional PortModel: ports likely to be open (from past results) are scanned first
+        self.port_model = port_model
         # Add nmap to PATH if it's in standard locations
         self.add_nmap_to_path()
-        self.nmap_available = self.check_nmap_installation()
-        if self.nmap_available:
+        # Probing nmap and creating the PortScanner are deferred until needed
+        self._nmap_available = None
+        self._scanner = None
+        # NmapXmlStream of the current streamed scan, for stop()
+        self.stream = None
+        # Set by stop(), cleared when a scan starts; streams check it before starting nmap
+        self.stop_requested = threading.Event()
+        # (batch, error) for each target batch scan_batches() couldn't scan
+        self.batch_errors = []
+    
+    @property
+    def nmap_available(self):
+        if self._nmap_available is None:
+            with phase_context(self.profiler, 'nmap_detect'):
+                self._nmap_available = self.check_nmap_installation()
+        return self._nmap_available
+    
+    @nmap_available.setter
+    def nmap_available(self, value):
+        self._nmap_available = value
+    
+    @property
+    def scanner(self):
+        """python-nmap PortScanner, created on first use"""
+        if self._scanner is None and self.nmap_available:
             try:
                 import nmap
-                self.scanner = nmap.PortScanner()
+                # PortScanner runs nmap once to read its version
+                with phase_context(self.profiler, 'nmap_detect'):
+                    self._scanner = nmap.PortScanner(nmap_search_path=(self.nmap_path,))
+                if self.profiler is not None:
+                    # scan() runs nmap, then parses its XML with this method
+                    self._scanner.analyse_nmap_xml_scan = self.profiler.wrap(
+                        'xml_parse', self._scanner.analyse_nmap_xml_scan)
             except Exception as e:
                 self.nmap_available = False
                 print(f"Error initializing nmap: {e}")
+        return self._scanner
     
     def add_nmap_to_path(self):
         """Add nmap to PATH if it exists in standard locations"""
@@ -34,60 +100,435 @@ class NmapScanner:
                 break
     
     def check_nmap_installation(self):
-        """Check if nmap is installed and available in PATH"""
-        # Check common nmap locations
-        nmap_paths = [
-            'nmap',  # In PATH
-            'C:\\Program Files (x86)\\Nmap\\nmap.exe',  # Default Windows install
-            'C:\\Program Files\\Nmap\\nmap.exe',  # Alternative Windows install
-            '/usr/bin/nmap',  # Linux
-            '/usr/local/bin/nmap'  # macOS/Linux alternative
-        ]
-        
-        for nmap_path in nmap_paths:
-            try:
-                result = subprocess.run([nmap_path, '--version'], 
-                                      capture_output=True, text=True, timeout=10)
-                if result.returncode == 0:
-                    self.nmap_path = nmap_path
-                    print(f"Found nmap at: {nmap_path}")
-                    return True
-            except (subprocess.TimeoutExpired, FileNotFoundError, OSError):
-                continue
+        """Check if nmap is installed, using the cached location when still valid"""
+        nmap_path, version = locate_nmap()
+        if nmap_path is None:
+            return False
         
-        return False
+        self.nmap_path = nmap_path
+        self.nmap_version = version
+        print(f"Found nmap at: {nmap_path}")
+        return True
     
-    def get_scan_arguments(self, scan_type, port_range=None):
-        """Get nmap arguments based on scan type"""
+    def get_scan_arguments(self, scan_type, port_range=None, skip_discovery=False):
+        """Get nmap arguments based on scan type
+        
+        skip_discovery adds -Pn, for hosts already known to be up.
+        """
         args_map = {
             "Quick Scan": "-T4 -F",
             "Intense Scan": "-T4 -A -v",
             "Ping Scan": "-sn",
             "Port Scan": "-sS",
-            "Service Detection": "-sV"
+            "Service Detection": "-sV",
+            # First passes of the incremental profiles (see scanner.fingerprints)
+            "Service Detection/ports": "",
+            "Intense Scan/ports": "-T4 -O --traceroute -v",
         }
         
         args = args_map.get(scan_type, "-T4 -F")
         
         if port_range and scan_type != "Ping Scan":
-            args += f" -p {port_range}"
+            # nmap won't take -F with -p; an explicit range replaces the fast-scan list
+            args = " ".join(arg for arg in args.split() if arg != "-F")
+            # Validated, with overlapping ranges and duplicates merged
+            args += f" -p {normalize_port_spec(port_range)}"
+        
+        if skip_discovery and scan_type != "Ping Scan":
+            args += " -Pn"
+        
+        if self.resolver is not None:
+            args += " -n"
             
         return args
     
-    def scan(self, target, scan_type="Quick Scan", port_range=None):
-        """Perform nmap scan"""
-        if not self.nmap_available:
+    def get_timing_arguments(self, target):
+        """Learned rate/retry limits for the target's network, or "" without a controller"""
+        if self.timing is None:
+            return ""
+        return " " + self.timing.arguments(target)
+    
+    def scan(self, target, scan_type="Quick Scan", port_range=None, workers=1,
+             hosts_per_shard=256, engine="nmap", port_slices=1, checkpoint=None):
+        """Perform nmap scan
+        
+        engine is "nmap", "native" (asyncio TCP connect scan, no nmap
+        needed) or "auto" (nmap when installed, otherwise native). With a
+        ScanCheckpoint, finished hosts or shards are recorded as they
+        complete and those already in it are skipped.
+        """
+        self.stop_requested.clear()
+        if engine == "auto":
+            engine = "nmap" if self.nmap_available else "native"
+        if engine != "native" and (not self.nmap_available or self.scanner is None):
             return self.simulate_scan(target, scan_type)
         
         try:
-            import nmap
+            target, hostnames = self.resolve_target(target)
+        except RuntimeError as e:
+            return {
+                'error': str(e),
+                'hosts': [],
+                'scan_type': scan_type,
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+        
+        if engine == "native":
+            with phase_context(self.profiler, 'native_scan'):
+                results = self.scan_native(target, scan_type, port_range)
+        elif self.cache is None:
+            results = self.run_scan(target, scan_type, port_range, workers, hosts_per_shard, port_slices,
+                                    checkpoint)
+        else:
             args = self.get_scan_arguments(scan_type, port_range)
+            results = self.cache.get(target, args, self.nmap_version, scan_type)
+            if results is None:
+                results = self.run_scan(target, scan_type, port_range, workers, hosts_per_shard, port_slices,
+                                        checkpoint)
+                self.cache.put(target, args, self.nmap_version, results)
+        return self.count_results(self.name_results(results, hostnames))
+    
+    def resolve_target(self, target):
+        """Resolve the target's hostnames with the resolver, if there is one
+        
+        Returns (target, {address: hostname}). Names that don't resolve are
+        dropped with a warning; RuntimeError if nothing is left to scan.
+        """
+        if self.resolver is None:
+            return target, {}
+        resolved, hostnames, failed = self.resolver.prepare_target(target)
+        for name in failed:
+            print(f"Warning: failed to resolve \"{name}\"")
+        if not resolved:
+            raise RuntimeError(f"Failed to resolve {', '.join(failed)}")
+        return resolved, hostnames
+    
+    def name_results(self, results, hostnames):
+        """Put resolved (and, if enabled, reverse-looked-up) names on a result dict's hosts"""
+        if self.resolver is None or 'scan_result' not in results:
+            return results
+        scan_result = results['scan_result']
+        records = list(self.resolver.name_records(scan_result.hosts, hostnames))
+        return dict(results, scan_result=ScanResult(records, scan_result.service_table,
+                                                    scan_result.command_line, scan_result.scanstats))
+    
+    def count_results(self, results):
+        """Add a finished scan's hosts, ports and errors to the profiler's counters"""
+        if self.profiler is not None:
+            scan_result = results.get('scan_result')
+            if scan_result is not None:
+                self.profiler.count('hosts', len(scan_result.hosts))
+                self.profiler.count('ports', sum(record.port_count for record in scan_result.hosts))
+            self.profiler.count('errors', ('error' in results) + len(results.get('shard_errors', [])))
+        return results
+    
+    def run_scan(self, target, scan_type, port_range, workers, hosts_per_shard, port_slices=1,
+                 checkpoint=None, prioritize=True, skip_discovery=False):
+        """Run nmap for a scan, sharded across workers when asked to
+        
+        Targets are split into host shards when workers > 1; port_slices > 1
+        also splits an explicit TCP port range into that many slices, each
+        scanned by its own nmap process against the same hosts. Port
+        prioritization doesn't apply to checkpointed scans.
+        """
+        passes = None
+        if prioritize and checkpoint is None:
+            passes = self.plan_port_passes(target, scan_type, port_range)
+        if passes is not None:
+            return self.scan_prioritized(target, scan_type, passes, workers, hosts_per_shard, port_slices)
+        if self.fingerprints is not None:
+            from scanner.fingerprints import INCREMENTAL_PROFILES
+            if scan_type in INCREMENTAL_PROFILES:
+                return self.scan_incremental(target, scan_type, port_range, workers, hosts_per_shard,
+                                             port_slices, checkpoint, skip_discovery)
+        if not port_range or scan_type == "Ping Scan" or ':' in port_range:
+            port_slices = 1
+        if workers > 1 or port_slices > 1:
+            from scanner.sharding import split_target
+            try:
+                shards = split_target(target, hosts_per_shard) if workers > 1 else [target]
+            except ValueError as e:
+                return {
+                    'error': str(e),
+                    'hosts': [],
+                    'scan_type': scan_type,
+                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                }
+            if len(shards) > 1 or port_slices > 1:
+                return self.scan_sharded(shards, scan_type, port_range, max(workers, port_slices),
+                                         target, port_slices, checkpoint, skip_discovery)
+        
+        if checkpoint is not None:
+            return self.scan_checkpointed(target, scan_type, port_range, checkpoint, skip_discovery)
+        
+        args = self.get_scan_arguments(scan_type, port_range, skip_discovery) + self.get_timing_arguments(target)
+        return self.run_nmap(target, args, scan_type)
+    
+    def run_nmap(self, target, args, scan_type, record_timing=True):
+        """One python-nmap run with the given arguments, as a result dict"""
+        try:
             print(f"Scanning {target} with arguments: {args}")
             
-            self.scanner.scan(hosts=target, arguments=args)
+            with phase_context(self.profiler, 'nmap_run'):
+                nmap_result = self.scanner.scan(hosts=target, arguments=args)
+            if self.profiler is not None:
+                self.profiler.count('bytes_parsed', len(self.scanner.get_nmap_last_output() or b''))
+            if self.archive is not None:
+                with phase_context(self.profiler, 'archive'):
+                    self.archive_output(self.scanner.get_nmap_last_output(), target)
+            if self.timing is not None and record_timing:
+                from scanner.timing import observe_scan
+                self.timing.record(target, observe_scan(nmap_result, self.scanner.get_nmap_last_output()))
+            with phase_context(self.profiler, 'result_build'):
+                scan_result = ScanResult.from_nmap(nmap_result)
+            return {
+                'hosts': scan_result.all_hosts(),
+                'scan_result': scan_result,
+                'scan_type': scan_type,
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+        except Exception as e:
+            return {
+                'error': str(e),
+                'hosts': [],
+                'scan_type': scan_type,
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+    
+    def archive_output(self, output, target):
+        """Add a python-nmap run's XML to the archive; a full disk shouldn't fail the scan"""
+        if not output:
+            return
+        try:
+            self.archive.add(output, target)
+        except OSError as e:
+            print(f"⚠️  Could not archive nmap XML: {e}")
+    
+    def plan_port_passes(self, target, scan_type, port_range):
+        """(likely ports, the rest) as PortSets when the port model has something to say, else None
+        
+        Needs an explicit TCP range or a -F profile (whose ports are
+        TOP_100_TCP_PORTS): nmap's default top 1000 can't be listed here,
+        so other profiles would end up scanning different ports.
+        """
+        if self.port_model is None or scan_type == "Ping Scan" or (port_range and ':' in port_range):
+            return None
+        if port_range:
+            candidates = PortSet.parse(port_range)
+        elif "-F" in self.get_scan_arguments(scan_type).split():
+            candidates = PortSet.from_ports(TOP_100_TCP_PORTS)
+        else:
+            return None
+        likely = self.port_model.likely_ports(target, candidates)
+        if not likely:
+            return None
+        likely = PortSet.from_ports(likely)
+        return likely, PortSet.from_ports(port for port in candidates if port not in likely)
+    
+    def scan_prioritized(self, target, scan_type, passes, workers, hosts_per_shard, port_slices):
+        """Scan the likely ports of every host first, then the rest of the ports of the live ones
+        
+        The second pass only goes to hosts the first found up, with -Pn so
+        host discovery isn't paid twice; the passes are merged into one result.
+        """
+        from scanner.portmodel import REMAINDER_BATCH, merge_passes
+        likely, rest = passes
+        started = time.monotonic()
+        print(f"Likely ports first: {len(likely)} of {len(likely) + len(rest)} ports, from past results")
+        results = self.run_scan(target, scan_type, str(likely), workers, hosts_per_shard, port_slices,
+                                prioritize=False)
+        if 'scan_result' not in results or not rest:
+            return results
+        
+        first = results['scan_result']
+        live = [record.address for record in first.hosts if record.state == 'up']
+        found = sum(len(record.open_ports()) for record in first.hosts)
+        print(f"Likely ports done in {time.monotonic() - started:.1f}s ({found} open); "
+              f"scanning the other {len(rest)} ports of {len(live)} live hosts")
+        later = []
+        errors = list(results.get('shard_errors', []))
+        for i in range(0, len(live), REMAINDER_BATCH):
+            batch = " ".join(live[i:i + REMAINDER_BATCH])
+            remainder = self.run_scan(batch, scan_type, str(rest), workers, hosts_per_shard, port_slices,
+                                      prioritize=False, skip_discovery=True)
+            if 'scan_result' in remainder:
+                later.append(remainder['scan_result'])
+                if 'fingerprints' in remainder and 'fingerprints' in results:
+                    results['fingerprints'] = {key: value + remainder['fingerprints'][key]
+                                               for key, value in results['fingerprints'].items()}
+            else:
+                errors.append((batch, remainder.get('error', 'scan failed')))
+            errors.extend(remainder.get('shard_errors', []))
+        
+        merged = merge_passes(first, later)
+        results = dict(results, hosts=merged.all_hosts(), scan_result=merged,
+                       port_passes={'likely': len(likely), 'rest': len(rest),
+                                    'likely_seconds': round(time.monotonic() - started, 2)})
+        if errors:
+            results['shard_errors'] = errors
+        return results
+    
+    def stream_prioritized(self, target, scan_type, passes, on_progress):
+        """scan_stream() that scans the likely ports of every host first, then the rest of the live ones
+        
+        Open likely ports are printed the moment nmap reports them. Each
+        host is yielded once: down hosts straight away, live ones with the
+        ports of both passes merged once their remainder pass (-Pn, up to
+        REMAINDER_BATCH hosts per run) is done.
+        """
+        from scanner.portmodel import REMAINDER_BATCH, merge_host
+        likely, rest = passes
+        started = time.monotonic()
+        print(f"Likely ports first: {len(likely)} of {len(likely) + len(rest)} ports, from past results")
+        live = {}
+        found = 0
+        for record in self.scan_stream_resolved(target, scan_type, str(likely), on_progress, None,
+                                                prioritize=False):
+            if record.state != 'up' or not rest:
+                yield record
+                continue
+            live[record.address] = record
+            open_ports = record.open_ports()
+            if open_ports:
+                found += len(open_ports)
+                print(f"Likely ports open on {record.address}: {', '.join(map(str, open_ports))}")
+        if self.stop_requested.is_set():
+            yield from live.values()
+            return
+        if live:
+            print(f"Likely ports done in {time.monotonic() - started:.1f}s ({found} open); "
+                  f"scanning the other {len(rest)} ports of {len(live)} live hosts")
+        service_table = ServiceTable()
+        addresses = list(live)
+        for i in range(0, len(addresses), REMAINDER_BATCH):
+            batch = addresses[i:i + REMAINDER_BATCH]
+            for record in self.scan_stream_resolved(" ".join(batch), scan_type, str(rest), on_progress, None,
+                                                    prioritize=False, skip_discovery=True):
+                first = live.pop(record.address, None)
+                yield merge_host(first, record, service_table) if first is not None else record
+            # Hosts this run didn't report (or never got to, if stopped) keep their likely-pass ports
+            for address in batch:
+                if address in live:
+                    yield live.pop(address)
+            if self.stop_requested.is_set():
+                yield from live.values()
+                return
+    
+    def scan_incremental(self, target, scan_type, port_range, workers, hosts_per_shard, port_slices,
+                         checkpoint=None, skip_discovery=False):
+        """Port scan first, then version detection of only the ports the fingerprint cache can't answer
+        
+        The first pass is the profile without -sV (sharded, sliced and
+        checkpointed like any scan). Open TCP ports with a live cache entry
+        take the cached service; the rest are fingerprinted by -sV -Pn runs
+        limited to those hosts and ports, and cached. Other protocols keep
+        the first pass's services.
+        """
+        from scanner.fingerprints import INCREMENTAL_PROFILES, merge_fingerprints
+        # Port prioritization, if any, already split the scan before it got here
+        results = self.run_scan(target, INCREMENTAL_PROFILES[scan_type], port_range, workers, hosts_per_shard,
+                                port_slices, checkpoint, prioritize=False, skip_discovery=skip_discovery)
+        results['scan_type'] = scan_type
+        if 'scan_result' not in results:
+            return results
+        
+        errors = []
+        services, cached, runs = self.detect_services(results['scan_result'], scan_type, errors)
+        if errors:
+            results.setdefault('shard_errors', []).extend(errors)
+        results['scan_result'] = merge_fingerprints(results['scan_result'], services)
+        results['fingerprints'] = {'cached': cached, 'detected': len(services) - cached, 'runs': runs}
+        return results
+    
+    def detect_services(self, scan_result, scan_type, errors):
+        """Services of the open TCP ports of a port scan, from the fingerprint cache or -sV runs
+        
+        Returns (services, cached, runs): services maps (address, port) to
+        a service tuple for merge_fingerprints, cached of them came from
+        the cache. Failed runs are appended to errors as (target, error).
+        """
+        from scanner.fingerprints import plan_detection
+        known, plan = plan_detection(scan_result, self.fingerprints)
+        services = dict(known)
+        args = "-sV -Pn" + (" -T4" if "-T4" in self.get_scan_arguments(scan_type) else "")
+        if self.resolver is not None:
+            args += " -n"
+        runs = 0
+        for addresses, ports in plan:
+            port_spec = ",".join(str(port) for port in ports)
+            for i in range(0, len(addresses), DETECTION_BATCH):
+                batch = " ".join(addresses[i:i + DETECTION_BATCH])
+                runs += 1
+                detected = self.run_nmap(batch, f"{args} -p {port_spec}", scan_type, record_timing=False)
+                if 'scan_result' not in detected:
+                    errors.append((batch, detected['error']))
+                    continue
+                for record in detected['scan_result'].hosts:
+                    for port in record.ports('tcp'):
+                        if port.state in ('open', 'open|filtered'):
+                            service = (port.name, port.product, port.version, port.extrainfo, port.cpe)
+                            services[(record.address, port.port)] = service
+                            self.fingerprints.put(record.address, port.port, service)
+        self.fingerprints.save()
+        return services, len(known), runs
+    
+    def stream_incremental(self, target, scan_type, port_range, on_progress, checkpoint):
+        """scan_stream() of an incremental profile: the port scan streamed, version detection in batches
+        
+        Hosts without open TCP ports are yielded as nmap reports them; the
+        rest are held until DETECTION_BATCH of them (or the end of the
+        port scan) are fingerprinted like scan_incremental() does.
+        """
+        from scanner.fingerprints import INCREMENTAL_PROFILES, merge_fingerprints, open_tcp_ports
+        totals = {'cached': 0, 'detected': 0, 'runs': 0}
+        
+        def fingerprinted(records):
+            if self.stop_requested.is_set():
+                return records
+            scan_result = ScanResult(records, records[0].service_table)
+            errors = []
+            services, cached, runs = self.detect_services(scan_result, scan_type, errors)
+            for batch, error in errors:
+                print(f"⚠️  Version detection failed for {batch}: {error}")
+            totals['cached'] += cached
+            totals['detected'] += len(services) - cached
+            totals['runs'] += runs
+            return merge_fingerprints(scan_result, services).hosts
+        
+        pending = []
+        for record in self.scan_stream_resolved(target, INCREMENTAL_PROFILES[scan_type], port_range, on_progress,
+                                                checkpoint, prioritize=False):
+            if record.state != 'up' or not open_tcp_ports(record):
+                yield record
+                continue
+            pending.append(record)
+            if len(pending) >= DETECTION_BATCH:
+                yield from fingerprinted(pending)
+                pending = []
+        if pending:
+            yield from fingerprinted(pending)
+        if totals['runs'] or totals['cached']:
+            print(f"Fingerprints: {totals['cached']} cached, {totals['detected']} detected "
+                  f"in {totals['runs']} nmap runs")
+    
+    def scan_checkpointed(self, target, scan_type, port_range, checkpoint, skip_discovery=False):
+        """Single-run scan through the XML stream, checkpointing every host
+        
+        python-nmap only returns once nmap exits, so an interrupted scan
+        would lose everything; streamed hosts are in the checkpoint the
+        moment nmap reports them.
+        """
+        try:
+            # target is already resolved; scan() names the hosts afterwards
+            records = list(self.scan_stream_resolved(target, scan_type, port_range, None, checkpoint,
+                                                     skip_discovery=skip_discovery))
+            run_info = self.stream.run_info
+            service_table = records[0].service_table if records else ServiceTable()
+            scan_result = ScanResult(records, service_table, run_info.get('command_line', ''),
+                                     run_info.get('scanstats'))
             return {
-                'hosts': self.scanner.all_hosts(),
-                'scanner_info': self.scanner,
+                'hosts': scan_result.all_hosts(),
+                'scan_result': scan_result,
                 'scan_type': scan_type,
                 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
@@ -99,6 +540,173 @@ class NmapScanner:
                 'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             }
     
+    def scan_stream(self, target, scan_type="Quick Scan", port_range=None, on_progress=None,
+                    checkpoint=None):
+        """Yield a HostRecord for each host as soon as nmap finishes it
+        
+        Unlike scan(), the XML is parsed incrementally from nmap's stdout, so
+        results arrive while the scan runs and memory stays flat. With
+        on_progress, nmap reports its progress every second and each report
+        (task, percent, remaining seconds, etc) is passed to it. With a
+        checkpoint, hosts it already holds are yielded first and excluded
+        from the nmap run, and every new host is recorded in it. With a
+        resolver, hostnames are resolved first and put back on the records.
+        
+        A stop() from the moment this returns ends the scan, even one made
+        before the records are first iterated.
+        """
+        self.stop_requested.clear()
+        return self.stream_records(target, scan_type, port_range, on_progress, checkpoint)
+    
+    def stream_records(self, target, scan_type, port_range, on_progress=None, checkpoint=None):
+        """scan_stream() without clearing an earlier stop()"""
+        if self.resolver is not None:
+            target, hostnames = self.resolve_target(target)
+            yield from self.resolver.name_records(
+                self.scan_stream_resolved(target, scan_type, port_range, on_progress, checkpoint), hostnames)
+        else:
+            yield from self.scan_stream_resolved(target, scan_type, port_range, on_progress, checkpoint)
+    
+    def scan_stream_resolved(self, target, scan_type, port_range, on_progress, checkpoint, prioritize=True,
+                             skip_discovery=False):
+        """scan_stream() for a target with no hostnames left to resolve"""
+        passes = self.plan_port_passes(target, scan_type, port_range) if prioritize and checkpoint is None else None
+        if passes is not None:
+            yield from self.stream_prioritized(target, scan_type, passes, on_progress)
+            return
+        if self.fingerprints is not None:
+            from scanner.fingerprints import INCREMENTAL_PROFILES
+            if scan_type in INCREMENTAL_PROFILES:
+                yield from self.stream_incremental(target, scan_type, port_range, on_progress, checkpoint)
+                return
+        args = self.get_scan_arguments(scan_type, port_range, skip_discovery) + self.get_timing_arguments(target)
+        if on_progress is not None:
+            args += f" --stats-every {STATS_INTERVAL}"
+        exclude_path = None
+        if checkpoint is not None and len(checkpoint):
+            exclude_path = write_exclude_file(checkpoint.completed_hosts())
+            args += f" --excludefile {shlex.quote(exclude_path)}"
+        print(f"Streaming scan of {target} with arguments: {args}")
+        from scanner.streaming import NmapXmlStream
+        self.stream = NmapXmlStream(self.nmap_path or 'nmap', self.profiler, self.archive, self.stop_requested)
+        service_table = ServiceTable()
+        try:
+            if exclude_path:
+                print(f"Resuming: {len(checkpoint.completed_hosts())} hosts already finished")
+                for host, host_data in checkpoint.host_items():
+                    yield HostRecord.from_host_data(host, host_data, service_table)
+            for host, host_data in self.stream.scan(target, args, on_progress):
+                if checkpoint is not None:
+                    with phase_context(self.profiler, 'checkpoint'):
+                        checkpoint.mark_host(host, host_data)
+                yield HostRecord.from_host_data(host, host_data, service_table)
+        finally:
+            if exclude_path:
+                os.remove(exclude_path)
+        
+        if self.timing is not None and not self.stop_requested.is_set():
+            from scanner.timing import observe_stream
+            self.timing.record(target, observe_stream(self.stream.run_info, self.stream.stderr_lines))
+    
+    def scan_sharded(self, shards, scan_type="Quick Scan", port_range=None, workers=4, target=None,
+                     port_slices=1, checkpoint=None, skip_discovery=False):
+        """Scan target shards on several nmap processes and merge the results
+        
+        With port_slices > 1 the port range is split too, and every slice
+        is scanned on every shard. With a timing controller, every run's
+        limits come from the profile of target (the whole scan's target,
+        or each shard's own).
+        """
+        if port_slices > 1:
+            slices = PortSet.parse(port_range).split(port_slices)
+            args = [self.get_scan_arguments(scan_type, str(port_slice), skip_discovery) for port_slice in slices]
+            runs = len(shards) * len(slices)
+            print(f"Scanning {len(shards)} shards x {len(slices)} port slices with "
+                  f"{min(workers, runs)} workers and arguments: {args[0]} ...")
+        else:
+            args = self.get_scan_arguments(scan_type, port_range, skip_discovery)
+            runs = len(shards)
+            print(f"Scanning {len(shards)} shards with {min(workers, len(shards))} workers "
+                  f"and arguments: {args}")
+        
+        from scanner.sharding import run_sharded_scan
+        try:
+            # Worker processes run and parse; their time shows up as nmap_run
+            with phase_context(self.profiler, 'nmap_run'):
+                merged, errors = run_sharded_scan(shards, args, workers, self.nmap_path,
+                                                  self.timing, target, checkpoint, self.archive)
+        except Exception as e:
+            errors = [(" ".join(shards), str(e))]
+            merged = None
+        
+        if merged is None or len(errors) == runs:
+            return {
+                'error': errors[0][1],
+                'hosts': [],
+                'scan_type': scan_type,
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+        
+        results = {
+            'hosts': merged.all_hosts(),
+            'scan_result': merged,
+            'scan_type': scan_type,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        if errors:
+            results['shard_errors'] = errors
+        return results
+    
+    def scan_batches(self, batches, scan_type="Quick Scan", port_range=None, workers=1,
+                     hosts_per_shard=256, engine="nmap", port_slices=1):
+        """Yield a HostRecord for every host of a sequence of target batches
+        
+        For target lists too long for one nmap command line (see
+        TargetSet.batches): batches are scanned one after another, streamed
+        when a single nmap would do and through scan() otherwise, so only
+        the current batch's target string is ever held. Batches that fail
+        are listed in batch_errors and the rest carry on.
+        """
+        self.stop_requested.clear()
+        return self.stream_batches(batches, scan_type, port_range, workers, hosts_per_shard, engine, port_slices)
+    
+    def stream_batches(self, batches, scan_type, port_range, workers, hosts_per_shard, engine, port_slices):
+        """scan_batches() without clearing an earlier stop()"""
+        self.batch_errors = []
+        if engine == "auto":
+            engine = "nmap" if self.nmap_available else "native"
+        streamed = engine == "nmap" and self.nmap_available and workers == 1 and port_slices == 1
+        for batch in batches:
+            if self.stop_requested.is_set():
+                return
+            if streamed:
+                try:
+                    yield from self.stream_records(batch, scan_type, port_range)
+                except RuntimeError as e:
+                    self.batch_errors.append((batch, str(e)))
+                continue
+            results = self.scan(batch, scan_type, port_range, workers=workers,
+                                hosts_per_shard=hosts_per_shard, engine=engine, port_slices=port_slices)
+            if 'scan_result' not in results:
+                self.batch_errors.append((batch, results.get('error') or results.get('message', 'scan failed')))
+                continue
+            self.batch_errors.extend(results.get('shard_errors', []))
+            yield from results['scan_result'].hosts
+    
+    def scan_native(self, target, scan_type="Quick Scan", port_range=None):
+        """TCP connect scan without nmap; same result dict as scan()"""
+        from scanner.native_scanner import NativeScanner
+        return NativeScanner().scan(target, scan_type, port_range)
+    
+    def stop(self):
+        """Kill the nmap process group of the running streamed scan, from any thread
+        
+        A streamed scan that hasn't started nmap yet won't start it.
+        """
+        self.stop_requested.set()
+        if self.stream is not None:
+            self.stream.stop()
+    
     def simulate_scan(self, target, scan_type):
         """Simulate scan results when nmap is not available"""
         return {
@@ -1,3 +1,4 @@
+import time
 from datetime import datetime
 
 class NmapParser:
@@ -64,6 +65,31 @@ class NmapParser:
     
     def format_real_results(self, results, target):
         """Format real nmap results"""
+        return "".join(self.iter_real_results(results, target))
+    
+    def iter_results(self, results, target, scan_type):
+        """Yield format_results' text in chunks, one per host block
+        
+        Joining the chunks gives exactly format_results(); writing them as
+        they are produced avoids holding the whole report in memory.
+        """
+        if 'simulated' in results:
+            yield self.format_simulation_results(results)
+        elif 'error' in results:
+            yield self.format_error_results(results)
+        else:
+            yield from self.iter_real_results(results, target)
+    
+    def write_results(self, results, target, scan_type, *streams, flush=False):
+        """Write format_results' text to one or more open text files as it is produced"""
+        for chunk in self.iter_results(results, target, scan_type):
+            for stream in streams:
+                stream.write(chunk)
+                if flush:
+                    stream.flush()
+    
+    def iter_real_results(self, results, target):
+        """Yield real nmap results in chunks: header, each host block, footer"""
         output = []
         output.append("="*60)
         output.append("🔍 NMAP SCAN RESULTS")
@@ -71,66 +97,173 @@ class NmapParser:
         output.append(f"\n📅 Scan Time: {results['timestamp']}")
         output.append(f"🎯 Target: {target}")
         output.append(f"📊 Scan Type: {results['scan_type']}")
+        if results.get('cached'):
+            output.append("♻️  Served from result cache")
         
-        scanner = results.get('scanner_info')
+        scan_result = results.get('scan_result')
         hosts = results.get('hosts', [])
         
         if not hosts:
             output.append("\n❌ No hosts found or all hosts are down")
-            return "\n".join(output)
+            yield "\n".join(output)
+            return
         
         output.append(f"\n🖥️  Hosts Found: {len(hosts)}")
         output.append("\n" + "="*60)
+        yield "\n".join(output)
         
+        # Every later chunk starts with the newline that joins it to the
+        # previous one, so the chunks concatenate to the "\n".join() form
         for host in hosts:
-            output.append(f"\n🌐 Host: {host}")
+            if scan_result and host in scan_result:
+                yield "\n" + "\n".join(self.format_host(scan_result[host]))
+            else:
+                yield f"\n\n🌐 Host: {host}\n\n" + "-"*60
+        
+        output = []
+        shard_errors = results.get('shard_errors', [])
+        if shard_errors:
+            output.append(f"\n⚠️  {len(shard_errors)} shard(s) failed:")
+            for shard, error in shard_errors:
+                output.append(f"   {shard}: {error}")
+        
+        if results.get('partial'):
+            output.append("\n⏹️  Scan interrupted - these results are partial")
+        else:
+            output.append("\n✅ Scan completed successfully!")
+        output.append("="*60)
+        
+        yield "\n" + "\n".join(output)
+    
+    def format_host(self, record):
+        """Format one host's block from a HostRecord"""
+        output = []
+        output.append(f"\n🌐 Host: {record.address}")
+        
+        # Host status
+        output.append(f"   Status: {record.state.upper()}")
+        
+        # Hostname
+        if record.hostnames:
+            output.append(f"   Hostname: {', '.join(record.hostnames)}")
+        
+        # Protocols
+        for protocol in record.protocols():
+            output.append(f"\n   📡 Protocol: {protocol.upper()}")
+            output.append("   🔍 Open Ports:")
+            output.append("   " + "-"*40)
             
-            if scanner and host in scanner.all_hosts():
-                # Host status
-                state = scanner[host].state()
-                output.append(f"   Status: {state.upper()}")
-                
-                # Hostname
-                hostnames = scanner[host].hostnames()
-                if hostnames:
-                    output.append(f"   Hostname: {', '.join([h['name'] for h in hostnames])}")
+            for port in record.ports(protocol):
+                service_info = f"{port.name}"
+                if port.product:
+                    service_info += f" ({port.product}"
+                    if port.version:
+                        service_info += f" {port.version}"
+                    service_info += ")"
                 
-                # Protocols
-                for protocol in scanner[host].all_protocols():
-                    output.append(f"\n   📡 Protocol: {protocol.upper()}")
-                    
-                    ports = scanner[host][protocol].keys()
-                    if ports:
-                        output.append("   🔍 Open Ports:")
-                        output.append("   " + "-"*40)
-                        
-                        for port in sorted(ports):
-                            port_info = scanner[host][protocol][port]
-                            state = port_info['state']
-                            name = port_info.get('name', 'unknown')
-                            product = port_info.get('product', '')
-                            version = port_info.get('version', '')
-                            
-                            service_info = f"{name}"
-                            if product:
-                                service_info += f" ({product}"
-                                if version:
-                                    service_info += f" {version}"
-                                service_info += ")"
-                            
-                            output.append(f"      {port}/tcp - {state.upper()} - {service_info}")
-                
-                # OS detection if available
-                if 'osmatch' in scanner[host] and scanner[host]['osmatch']:
-                    output.append("\n   💻 OS Detection:")
-                    for osmatch in scanner[host]['osmatch']:
-                        accuracy = osmatch.get('accuracy', 'Unknown')
-                        name = osmatch.get('name', 'Unknown OS')
-                        output.append(f"      {name} (Accuracy: {accuracy}%)")
-            
-            output.append("\n" + "-"*60)
+                output.append(f"      {port.port}/tcp - {port.state.upper()} - {service_info}")
         
-        output.append("\n✅ Scan completed successfully!")
+        # OS detection if available
+        if record.os_matches:
+            output.append("\n   💻 OS Detection:")
+            for name, accuracy in record.os_matches:
+                output.append(f"      {name} (Accuracy: {accuracy}%)")
+        
+        output.append("\n" + "-"*60)
+        return output
+    
+    def format_stream(self, host_records, target, scan_type):
+        """Yield formatted text blocks for streamed HostRecords
+        
+        The header is yielded before the first host arrives and each host
+        block as soon as it is received, so nothing is buffered in between.
+        """
+        output = []
+        output.append("="*60)
+        output.append("🔍 NMAP SCAN RESULTS (streaming)")
         output.append("="*60)
+        output.append(f"\n📅 Scan Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        output.append(f"🎯 Target: {target}")
+        output.append(f"📊 Scan Type: {scan_type}")
+        output.append("\n" + "="*60)
+        yield "\n".join(output)
+        
+        host_count = 0
+        for record in host_records:
+            host_count += 1
+            yield "\n".join(self.format_host(record))
         
+        output = []
+        if host_count:
+            output.append(f"\n🖥️  Hosts Found: {host_count}")
+            output.append("\n✅ Scan completed successfully!")
+        else:
+            output.append("\n❌ No hosts found or all hosts are down")
+        output.append("="*60)
+        yield "\n".join(output)
+    
+    def format_pipeline_stats(self, stages):
+        """Format per-stage throughput for a discovery pipeline run"""
+        output = []
+        output.append("\n📈 Pipeline Stages:")
+        output.append("-" * 60)
+        for stage in stages:
+            output.append(f"   {stage.name.title():<12} {stage.hosts_in:>7} in  {stage.hosts_out:>7} out  "
+                          f"{stage.runs:>4} runs  {stage.elapsed:8.2f}s  {stage.hosts_per_second:8.1f} hosts/s")
+            for error in stage.errors:
+                output.append(f"      ⚠️  {error}")
+        output.append("=" * 60)
+        return "\n".join(output)
+    
+    def format_profile(self, profiler):
+        """Format a ScanProfiler's per-phase timings and counters"""
+        elapsed = profiler.elapsed
+        output = []
+        output.append("\n⏱️  Profile:")
+        output.append("-" * 60)
+        output.append(f"   {'Phase':<14} {'Calls':>7} {'Seconds':>10} {'Share':>7}")
+        for name, stats in profiler.ordered_phases():
+            share = stats.own / elapsed if elapsed > 0 else 0.0
+            output.append(f"   {name:<14} {stats.calls:>7} {stats.own:>10.3f} {share:>7.1%}")
+        unaccounted = max(0.0, elapsed - sum(stats.own for _, stats in profiler.ordered_phases()))
+        output.append(f"   {'(other)':<14} {'':>7} {unaccounted:>10.3f} "
+                      f"{unaccounted / elapsed if elapsed > 0 else 0.0:>7.1%}")
+        output.append(f"   {'total':<14} {'':>7} {elapsed:>10.3f}")
+        counters = profiler.counters
+        output.append(f"\n   Hosts: {counters['hosts']}  Ports: {counters['ports']}  "
+                      f"Errors: {counters['errors']}  ({profiler.hosts_per_second:.1f} hosts/s)")
+        output.append(f"   XML parsed: {counters['bytes_parsed'] / 1024:.1f} KiB  "
+                      f"Output written: {counters['bytes_written'] / 1024:.1f} KiB")
+        output.append("=" * 60)
+        return "\n".join(output)
+    
+    def format_monitor_event(self, event):
+        """One line for a monitor change event"""
+        address = event['address']
+        if 'port' in event:
+            protocol, _, port = event['port'].partition('/')
+            address = f"{address} {port}/{protocol}"
+        kind = event['event']
+        if kind == 'host_new':
+            return f"🆕 New host: {address}"
+        if kind == 'host_up':
+            return f"⬆️  Host back up: {address}"
+        if kind == 'host_down':
+            return f"⬇️  Host down: {address}"
+        if kind == 'port_opened':
+            return f"🔓 Port opened: {address} - {event['service']}"
+        if kind == 'port_closed':
+            return f"🔒 Port {event['state']}: {address} (was {event['service']})"
+        if kind == 'service_changed':
+            return f"🔄 Service changed: {address} - {event['old']} → {event['new']}"
+        return f"❔ {kind}: {address}"
+    
+    def format_monitor_cycle(self, monitor, checked, events, errors):
+        """Summary line of one monitor cycle and when the next check is due"""
+        wait = max(0, int(monitor.next_wakeup() - time.time()))
+        output = [f"🔁 Cycle {monitor.counters['cycles']}: {checked} hosts checked, {len(events)} changes, "
+                  f"{len(monitor.state.hosts)} hosts tracked, {monitor.counters['runs']} nmap runs so far; "
+                  f"next check in {wait // 3600}h{wait % 3600 // 60:02d}m{wait % 60:02d}s"]
+        for target, error in errors:
+            output.append(f"   ⚠️  {target[:60]}: {error}")
         return "\n".join(output)
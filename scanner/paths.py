@@ -0,0 +1,34 @@
+import os
+
+
+def get_cache_dir(*parts):
+    """Return (and create) the per-user cache directory, or a path inside it
+
+    NMAP_SCANNER_CACHE_DIR overrides the location; otherwise the XDG cache
+    directory (~/.cache on Linux/Termux/macOS, %LOCALAPPDATA% on Windows).
+    """
+    base = os.environ.get('NMAP_SCANNER_CACHE_DIR')
+    if not base:
+        if os.name == 'nt':
+            base = os.path.join(os.environ.get('LOCALAPPDATA', os.path.expanduser('~')), 'nmap_scanner')
+        else:
+            base = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'nmap_scanner')
+    os.makedirs(base, exist_ok=True)
+    return os.path.join(base, *parts)
+
+
+def get_data_dir(*parts):
+    """Return (and create) the per-user data directory, or a path inside it
+
+    Used for state worth keeping, such as scan history. NMAP_SCANNER_DATA_DIR
+    overrides the location; otherwise ~/.local/share (XDG_DATA_HOME) or
+    %APPDATA% on Windows.
+    """
+    base = os.environ.get('NMAP_SCANNER_DATA_DIR')
+    if not base:
+        if os.name == 'nt':
+            base = os.path.join(os.environ.get('APPDATA', os.path.expanduser('~')), 'nmap_scanner')
+        else:
+            base = os.path.join(os.environ.get('XDG_DATA_HOME', os.path.expanduser('~/.local/share')), 'nmap_scanner')
+    os.makedirs(base, exist_ok=True)
+    return os.path.join(base, *parts)
@@ -0,0 +1,177 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from scanner.models import HostRecord, ServiceTable
+from scanner.streaming import NmapXmlStream
+
+# Sentinel put on the result queue once every stage has finished
+_DONE = object()
+
+
+class StageStats:
+    """Counters and timing for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.hosts_in = 0
+        self.hosts_out = 0
+        self.runs = 0
+        self.errors = []
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.started is None:
+                self.started = time.monotonic()
+
+    def stop(self):
+        with self.lock:
+            self.finished = time.monotonic()
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def hosts_per_second(self):
+        return self.hosts_in / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class DiscoveryPipeline:
+    """Ping-sweep a target and port-scan live hosts while discovery continues
+
+    Stage 1 runs the "Ping Scan" profile (-sn) as a stream. Every live host
+    goes into a batch; batches are port-scanned with -Pn by up to
+    port_workers nmap processes at once when full, or batch_delay seconds
+    after their first host, so the first live hosts are being port-scanned
+    long before the sweep of the whole range is done.
+    """
+
+    def __init__(self, scanner, port_workers=4, batch_size=8, batch_delay=2.0):
+        self.scanner = scanner
+        self.port_workers = max(1, int(port_workers))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_delay = batch_delay
+        self.discovery_stats = StageStats('discovery')
+        self.port_stats = StageStats('port scan')
+        self.streams = []
+        self.streams_lock = threading.Lock()
+        self.stopped = False
+
+    def open_stream(self, nmap_path):
+        stream = NmapXmlStream(nmap_path, self.scanner.profiler, self.scanner.archive)
+        with self.streams_lock:
+            self.streams.append(stream)
+        return stream
+
+    def stop(self):
+        """Kill every running nmap; run() then ends after the hosts already found"""
+        with self.streams_lock:
+            self.stopped = True
+            streams = list(self.streams)
+        for stream in streams:
+            stream.stop()
+
+    def run(self, target, scan_type="Quick Scan", port_range=None):
+        """HostRecords from the port stage, yielded as each batch completes"""
+        if self.scanner.resolver is None:
+            return self.run_stages(target, scan_type, port_range)
+        target, hostnames = self.scanner.resolve_target(target)
+        return self.scanner.resolver.name_records(self.run_stages(target, scan_type, port_range), hostnames)
+
+    def run_stages(self, target, scan_type, port_range):
+        nmap_path = self.scanner.nmap_path or 'nmap'
+        discovery_args = self.scanner.get_scan_arguments("Ping Scan")
+        port_args = (self.scanner.get_scan_arguments(scan_type, port_range)
+                     + self.scanner.get_timing_arguments(target) + " -Pn")
+        results = queue.Queue()
+        pool = ThreadPoolExecutor(max_workers=self.port_workers)
+
+        def port_scan(batch):
+            if self.stopped:
+                return
+            self.port_stats.start()
+            try:
+                for host, host_data in self.open_stream(nmap_path).scan(" ".join(batch), port_args):
+                    results.put((host, host_data))
+                    with self.port_stats.lock:
+                        self.port_stats.hosts_out += 1
+            except Exception as e:
+                self.port_stats.errors.append(f"{' '.join(batch)}: {e}")
+            with self.port_stats.lock:
+                self.port_stats.hosts_in += len(batch)
+                self.port_stats.runs += 1
+
+        live = queue.Queue()
+
+        def discover():
+            self.discovery_stats.start()
+            try:
+                for host, host_data in self.open_stream(nmap_path).scan(target, discovery_args):
+                    self.discovery_stats.hosts_in += 1
+                    if host_data.get('status', {}).get('state') == 'up':
+                        self.discovery_stats.hosts_out += 1
+                        live.put(host)
+            except Exception as e:
+                self.discovery_stats.errors.append(str(e))
+            finally:
+                self.discovery_stats.runs += 1
+                self.discovery_stats.stop()
+                live.put(_DONE)
+
+        def batch_hosts():
+            # A partial batch goes out batch_delay after its first host even if
+            # discovery finds nothing else meanwhile
+            batch = []
+            deadline = None
+            futures = []
+            try:
+                while True:
+                    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                    try:
+                        host = live.get(timeout=timeout)
+                    except queue.Empty:
+                        host = None
+                    if host is _DONE:
+                        break
+                    if host is not None:
+                        batch.append(host)
+                        if deadline is None:
+                            deadline = time.monotonic() + self.batch_delay
+                    if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                        futures.append(pool.submit(port_scan, batch))
+                        batch, deadline = [], None
+            finally:
+                if batch:
+                    futures.append(pool.submit(port_scan, batch))
+                for future in futures:
+                    future.result()
+                self.port_stats.stop()
+                pool.shutdown()
+                results.put(_DONE)
+
+        threads = [threading.Thread(target=discover), threading.Thread(target=batch_hosts)]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # Records are built here, on the consuming thread, so the shared
+        # ServiceTable never sees concurrent writers
+        service_table = ServiceTable()
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            host, host_data = item
+            yield HostRecord.from_host_data(host, host_data, service_table)
+
+        for thread in threads:
+            thread.join()
+
+    def stats(self):
+        return [self.discovery_stats, self.port_stats]
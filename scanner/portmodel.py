@@ -0,0 +1,130 @@
+import ipaddress
+from collections import Counter
+from scanner.models import HostRecord, PORT_STRUCT, ScanResult, ServiceTable
+from scanner.timing import network_key
+
+DEFAULT_WINDOW = 90 * 86400
+# The likely pass stops at this many ports, or once they cover this share of past open ports
+MAX_LIKELY_PORTS = 100
+COVERAGE = 0.95
+# Live hosts per nmap run of the remainder pass
+REMAINDER_BATCH = 4096
+
+
+class PortModel:
+    """How often each TCP port was found open, per network, from the scan history
+
+    counts maps a network (timing.network_key: the /24 or /48 of an
+    address) to a Counter of port -> hosts it was open on. A target's
+    likely ports come from the networks it covers; targets with no
+    history of their own fall back to every network's counts.
+    """
+
+    def __init__(self, counts=None, max_ports=MAX_LIKELY_PORTS, coverage=COVERAGE):
+        self.counts = counts or {}
+        self.max_ports = max_ports
+        self.coverage = coverage
+        self.totals = Counter()
+        for ports in self.counts.values():
+            self.totals.update(ports)
+        self._networks = None
+
+    @classmethod
+    def from_history(cls, history, since=None, **kwargs):
+        """Build from the open TCP ports a ScanHistory recorded since the given time"""
+        counts = {}
+        for address, port in history.open_port_pairs(since):
+            counts.setdefault(network_key(address), Counter())[port] += 1
+        return cls(counts, **kwargs)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def networks(self, target):
+        """Model networks covered by the target's addresses and CIDR ranges"""
+        keys = set()
+        for token in target.split():
+            try:
+                network = ipaddress.ip_network(token, strict=False)
+            except ValueError:
+                # Hostnames and nmap-style ranges can't be placed; they use every network's counts
+                continue
+            if network.prefixlen >= (24 if network.version == 4 else 48):
+                key = network_key(token)
+                if key in self.counts:
+                    keys.add(key)
+                continue
+            if self._networks is None:
+                self._networks = []
+                for key in self.counts:
+                    try:
+                        self._networks.append((ipaddress.ip_network(key), key))
+                    except ValueError:
+                        pass
+            keys.update(key for known, key in self._networks
+                        if known.version == network.version and known.subnet_of(network))
+        return keys
+
+    def likely_ports(self, target, candidates=None):
+        """Ports most likely to be open on target, most likely first
+
+        Ports are ranked by how many hosts of the target's networks had
+        them open, then by every network's counts; the list ends once it
+        covers COVERAGE of those past open ports or has max_ports.
+        Only ports in candidates (a PortSet) are considered, if given.
+        """
+        local = Counter()
+        for key in self.networks(target):
+            local.update(self.counts[key])
+        basis = local or self.totals
+        ranked = sorted((port for port in basis if candidates is None or port in candidates),
+                        key=lambda port: (-local[port], -self.totals[port], port))
+        total = sum(basis[port] for port in ranked)
+        likely = []
+        covered = 0
+        for port in ranked:
+            if len(likely) >= self.max_ports or covered >= self.coverage * total:
+                break
+            likely.append(port)
+            covered += basis[port]
+        return likely
+
+
+def merge_host(record, extra, service_table):
+    """A host's record from the likely pass with the ports of its remainder-pass record (or None) added"""
+    ports = {}
+    for source in (record, extra):
+        if source is not None:
+            services = source.service_table
+            for port, code, state, service_id in PORT_STRUCT.iter_unpack(source.packed_ports):
+                # The passes don't overlap; if nmap reports a port twice anyway, the first pass wins
+                ports.setdefault((code, port), (state, service_table.intern(*services[service_id])))
+    packed = b''.join(PORT_STRUCT.pack(port, code, state, service_id)
+                      for (code, port), (state, service_id) in sorted(ports.items()))
+    hostnames = record.hostnames or (extra.hostnames if extra is not None else ())
+    os_matches = record.os_matches or (extra.os_matches if extra is not None else ())
+    return HostRecord(record.address, record.state, hostnames, os_matches, packed, service_table)
+
+
+def merge_passes(first, later_results):
+    """One ScanResult from the likely-ports pass and the remainder passes over its live hosts"""
+    later_results = list(later_results)
+    service_table = ServiceTable()
+    later = {}
+    command_lines = [first.command_line]
+    for result in later_results:
+        command_lines.append(result.command_line)
+        for record in result.hosts:
+            later[record.address] = record
+
+    hosts = [merge_host(record, later.pop(record.address, None), service_table) for record in first.hosts]
+    # Hosts the likely pass missed but a remainder pass found
+    hosts.extend(merge_host(record, None, service_table) for record in later.values())
+
+    scanstats = dict(first.scanstats)
+    try:
+        elapsed = sum(float(result.scanstats.get('elapsed') or 0) for result in [first] + later_results)
+        scanstats['elapsed'] = f"{elapsed:.2f}"
+    except ValueError:
+        pass
+    return ScanResult(hosts, service_table, " ; ".join(line for line in command_lines if line), scanstats)
@@ -0,0 +1,171 @@
+import bisect
+from scanner.models import ReadOnly
+
+MAX_PORT = 65535
+
+# nmap's 100 most common TCP ports, the list behind -F
+TOP_100_TCP_PORTS = (
+    7, 9, 13, 21, 22, 23, 25, 26, 37, 53, 79, 80, 81, 88, 106, 110, 111, 113, 119, 135,
+    139, 143, 144, 179, 199, 389, 427, 443, 444, 445, 465, 513, 514, 515, 543, 544, 548,
+    554, 587, 631, 646, 873, 990, 993, 995, 1025, 1026, 1027, 1028, 1029, 1110, 1433,
+    1720, 1723, 1755, 1900, 2000, 2001, 2049, 2121, 2717, 3000, 3128, 3306, 3389, 3986,
+    4899, 5000, 5009, 5051, 5060, 5101, 5190, 5357, 5432, 5631, 5666, 5800, 5900, 6000,
+    6001, 6646, 7070, 8000, 8008, 8009, 8080, 8081, 8443, 8888, 9100, 9999, 10000, 32768,
+    49152, 49153, 49154, 49155, 49156, 49157,
+)
+
+# nmap's protocol qualifiers in -p specs (T:80,U:53); '' is the unqualified part
+PROTOCOL_PREFIXES = {'tcp': 'T', 'udp': 'U', 'sctp': 'S', 'ip': 'P'}
+
+
+def parse_port_number(value, spec):
+    try:
+        port = int(value)
+    except ValueError:
+        raise ValueError(f"Invalid port '{value}' in '{spec}'")
+    if not 0 <= port <= MAX_PORT:
+        raise ValueError(f"Port {port} out of range 0-{MAX_PORT} in '{spec}'")
+    return port
+
+
+def parse_port_sections(spec):
+    """Split an nmap -p spec into {qualifier: [(start, end), ...]}
+
+    Qualifiers are '', 'T', 'U', 'S' and 'P'; everything before the first
+    qualifier is unqualified and applies to every protocol scanned.
+    Raises ValueError on anything that isn't a port, range or qualifier.
+    """
+    sections = {}
+    current = ''
+    for part in spec.replace(' ', '').split(','):
+        if len(part) > 1 and part[1] == ':':
+            if part[0].upper() not in 'TUSP':
+                raise ValueError(f"Invalid protocol qualifier '{part[:2]}' in '{spec}'")
+            current = part[0].upper()
+            part = part[2:]
+        if not part:
+            continue
+        if part == '-':
+            start, end = 1, MAX_PORT
+        elif '-' in part:
+            low, high = part.split('-', 1)
+            start = parse_port_number(low, spec) if low else 1
+            end = parse_port_number(high, spec) if high else MAX_PORT
+            if start > end:
+                raise ValueError(f"Invalid port range '{part}' in '{spec}'")
+        else:
+            start = end = parse_port_number(part, spec)
+        sections.setdefault(current, []).append((start, end))
+    if not sections:
+        raise ValueError(f"No ports in '{spec}'")
+    return sections
+
+
+class PortSet(ReadOnly):
+    """Immutable set of ports stored as sorted, merged (start, end) intervals
+
+    "1-1000,80,500-2000" is one interval, so even the full 1-65535 range
+    costs a single tuple. Membership is a binary search over interval starts.
+    """
+    __slots__ = ('intervals', 'starts', 'size')
+
+    def __init__(self, intervals=()):
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1] + 1:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        object.__setattr__(self, 'intervals', tuple(merged))
+        object.__setattr__(self, 'starts', [start for start, _ in merged])
+        object.__setattr__(self, 'size', sum(end - start + 1 for start, end in merged))
+
+    @classmethod
+    def parse(cls, spec, protocol='tcp'):
+        """Ports an nmap -p spec selects for one protocol (unqualified parts included)"""
+        sections = parse_port_sections(spec)
+        port_set = cls(sections.get('', []) + sections.get(PROTOCOL_PREFIXES.get(protocol, 'T'), []))
+        if not port_set:
+            raise ValueError(f"No {protocol.upper()} ports in '{spec}'")
+        return port_set
+
+    @classmethod
+    def from_ports(cls, ports):
+        return cls((port, port) for port in ports)
+
+    def split(self, count):
+        """Split into at most count PortSets of near-equal size, in port order"""
+        count = max(1, min(int(count), self.size))
+        slices = []
+        intervals = list(self.intervals)
+        remaining = self.size
+        for i in range(count):
+            want = -(-remaining // (count - i))
+            remaining -= want
+            taken = []
+            while want:
+                start, end = intervals[0]
+                if end - start + 1 <= want:
+                    taken.append(intervals.pop(0))
+                    want -= end - start + 1
+                else:
+                    taken.append((start, start + want - 1))
+                    intervals[0] = (start + want, end)
+                    want = 0
+            slices.append(PortSet(taken))
+        return slices
+
+    def __contains__(self, port):
+        i = bisect.bisect_right(self.starts, port) - 1
+        return i >= 0 and port <= self.intervals[i][1]
+
+    def __iter__(self):
+        for start, end in self.intervals:
+            yield from range(start, end + 1)
+
+    def __len__(self):
+        return self.size
+
+    def __or__(self, other):
+        return PortSet(self.intervals + other.intervals)
+
+    def __eq__(self, other):
+        return isinstance(other, PortSet) and self.intervals == other.intervals
+
+    def __hash__(self):
+        return hash(self.intervals)
+
+    def __str__(self):
+        """nmap -p form, e.g. "1-1024,8080\""""
+        return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in self.intervals)
+
+    def __repr__(self):
+        return f"PortSet('{self}')"
+
+
+def normalize_port_spec(spec):
+    """Validate an nmap -p spec and return it with overlaps merged and duplicates dropped
+
+    Protocol qualifiers are kept ("U:53,T:1-100,80" -> "T:1-100,U:53").
+    Raises ValueError for invalid specs.
+    """
+    sections = parse_port_sections(spec)
+    parts = []
+    for qualifier in ('', 'T', 'U', 'S', 'P'):
+        if qualifier in sections:
+            text = str(PortSet(sections[qualifier]))
+            parts.append(f"{qualifier}:{text}" if qualifier else text)
+    return ",".join(parts)
+
+
+def parse_ports(spec, protocol='tcp'):
+    """Sorted list of the ports an nmap -p spec selects for one protocol"""
+    return list(PortSet.parse(spec, protocol))
+
+
+def default_ports(scan_type):
+    """Ports scanned when no range is given: top 100 for Quick Scan, else 1-1024 plus the top 100"""
+    if scan_type == "Quick Scan":
+        return list(TOP_100_TCP_PORTS)
+    return sorted(set(range(1, 1025)) | set(TOP_100_TCP_PORTS))
@@ -0,0 +1,171 @@
+import contextlib
+import os
+import threading
+import time
+
+# Display order of the phases a scan goes through; others are listed after these
+PHASES = ('nmap_detect', 'nmap_run', 'native_scan', 'xml_parse', 'result_build', 'checkpoint', 'archive',
+          'format', 'write')
+COUNTERS = ('hosts', 'ports', 'bytes_parsed', 'bytes_written', 'errors')
+METRIC_PREFIX = 'nmap_scanner'
+
+_END = object()
+
+
+def phase_context(profiler, name):
+    """profiler.phase(name), or a no-op when profiling is off"""
+    return profiler.phase(name) if profiler is not None else contextlib.nullcontext()
+
+
+class PhaseStats:
+    __slots__ = ('calls', 'total', 'own')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        # total minus the time spent in phases nested inside this one
+        self.own = 0.0
+
+
+class ScanProfiler:
+    """Wall time per scan phase plus host, port and byte counters
+
+    Phases nest: time spent in an inner phase (the pipe read inside XML
+    parsing, the file write inside formatting) is charged to the inner one
+    only, so the phases' own times add up to the time measured. Safe to use
+    from several threads; each thread keeps its own phase stack.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        stack = self.local.__dict__.setdefault('stack', [])
+        # [start, time spent in nested phases]
+        frame = [time.perf_counter(), 0.0]
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - frame[0]
+            stack.pop()
+            if stack:
+                stack[-1][1] += elapsed
+            with self.lock:
+                stats = self.phases.setdefault(name, PhaseStats())
+                stats.calls += 1
+                stats.total += elapsed
+                stats.own += elapsed - frame[1]
+
+    def wrap(self, name, func):
+        """func, timed as phase name on every call"""
+        def timed(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return timed
+
+    def timed_iter(self, name, iterable):
+        """Yield from iterable, timing only the work of producing each item as phase name"""
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                item = next(iterator, _END)
+            if item is _END:
+                return
+            yield item
+
+    def count(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def count_hosts(self, records):
+        """Pass HostRecords through, counting hosts and ports"""
+        for record in records:
+            self.count('hosts')
+            self.count('ports', record.port_count)
+            yield record
+
+    def finish(self):
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def hosts_per_second(self):
+        return self.counters['hosts'] / self.elapsed if self.elapsed > 0 else 0.0
+
+    def ordered_phases(self):
+        names = [name for name in PHASES if name in self.phases]
+        names += sorted(name for name in self.phases if name not in PHASES)
+        return [(name, self.phases[name]) for name in names]
+
+    def prometheus(self, labels=None):
+        """Metrics in the Prometheus text exposition format"""
+        label_text = ",".join(f'{key}="{escape_label(value)}"' for key, value in (labels or {}).items())
+
+        def sample(name, value, extra=None):
+            text = ",".join(filter(None, [label_text, extra]))
+            return f"{METRIC_PREFIX}_{name}{{{text}}} {value}" if text else f"{METRIC_PREFIX}_{name} {value}"
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+            lines.extend(samples)
+
+        metric('scan_duration_seconds', 'gauge', 'Wall time of the last scan',
+               [sample('scan_duration_seconds', f"{self.elapsed:.6f}")])
+        metric('phase_seconds', 'gauge', 'Time spent in each phase of the last scan, nested phases excluded',
+               [sample('phase_seconds', f"{stats.own:.6f}", f'phase="{name}"')
+                for name, stats in self.ordered_phases()])
+        metric('phase_calls', 'gauge', 'Times each phase ran in the last scan',
+               [sample('phase_calls', stats.calls, f'phase="{name}"') for name, stats in self.ordered_phases()])
+        for counter in COUNTERS:
+            metric(counter, 'gauge', f"{counter.replace('_', ' ').capitalize()} in the last scan",
+                   [sample(counter, self.counters[counter])])
+        metric('hosts_per_second', 'gauge', 'Hosts reported per second of wall time in the last scan',
+               [sample('hosts_per_second', f"{self.hosts_per_second:.3f}")])
+        metric('last_run_timestamp_seconds', 'gauge', 'Unix time the last scan finished',
+               [sample('last_run_timestamp_seconds', int(time.time()))])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, labels=None):
+        """Write the metrics file atomically, so a collector never reads half of it"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus(labels))
+        os.replace(temp_path, path)
+
+
+class ProfiledWriter:
+    """File wrapper that times write() calls and counts the bytes written"""
+
+    def __init__(self, stream, profiler, phase='write'):
+        self.stream = stream
+        self.profiler = profiler
+        self.phase_name = phase
+
+    def write(self, data):
+        with self.profiler.phase(self.phase_name):
+            result = self.stream.write(data)
+        self.profiler.count('bytes_written', len(data.encode()) if isinstance(data, str) else len(data))
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,236 @@
+import ipaddress
+import json
+import os
+import re
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from scanner.paths import get_cache_dir
+
+CACHE_FILE = 'dns_cache.json'
+DEFAULT_WORKERS = 32
+DEFAULT_TIMEOUT = 5.0
+# Used when the lookup can't report a TTL (plain getaddrinfo/gethostbyaddr)
+DEFAULT_TTL = 300
+NEGATIVE_TTL = 60
+MAX_TTL = 86400
+MAX_CACHE_ENTRIES = 100000
+# Records waiting on their reverse lookup before the stream blocks
+MAX_PENDING = 256
+
+# nmap octet ranges and wildcards (10.0.0-5.1-254, 192.168.*.1): nothing to resolve
+_RANGE_PATTERN = re.compile(r'^[0-9*,.\-]+(/\d+)?$')
+
+
+def is_hostname(token):
+    """True for target tokens nmap would resolve through DNS"""
+    if ':' in token or _RANGE_PATTERN.match(token):
+        return False
+    try:
+        ipaddress.ip_network(token, strict=False)
+        return False
+    except ValueError:
+        return True
+
+
+def import_dnspython():
+    """dns.resolver if dnspython is installed (real TTLs), else None"""
+    try:
+        import dns.resolver
+        import dns.reversename
+    except ImportError:
+        return None
+    return dns
+
+
+class DnsCache:
+    """Forward (A) and reverse (PTR) answers with expiry times, kept on disk
+
+    Answers live for their record's TTL, capped at MAX_TTL; failed lookups
+    are remembered for NEGATIVE_TTL so a dead name isn't retried on every
+    run. Expired entries are dropped on load and save.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_cache_dir(CACHE_FILE)
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            now = time.time()
+            self.entries = {key: entry for key, entry in entries.items() if entry[1] > now}
+        except (OSError, ValueError, TypeError, IndexError):
+            self.entries = {}
+
+    def get(self, kind, key):
+        """Cached answer list (empty for a cached failure), or None if unknown or expired"""
+        with self.lock:
+            entry = self.entries.get(f"{kind}:{key}")
+            if entry is None or entry[1] <= time.time():
+                self.counters['misses'] += 1
+                return None
+            self.counters['hits'] += 1
+            return entry[0]
+
+    def put(self, kind, key, answers, ttl):
+        ttl = min(int(ttl), MAX_TTL) if answers else NEGATIVE_TTL
+        with self.lock:
+            self.entries[f"{kind}:{key}"] = [list(answers), time.time() + ttl]
+
+    def save(self):
+        now = time.time()
+        with self.lock:
+            live = sorted(((key, entry) for key, entry in self.entries.items() if entry[1] > now),
+                          key=lambda item: item[1][1])
+            entries = dict(live[-MAX_CACHE_ENTRIES:])
+        try:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+class BulkResolver:
+    """Resolve target hostnames ahead of nmap, concurrently and through a TTL cache
+
+    nmap then gets plain IPv4 addresses and runs with -n, so it spends no
+    time on DNS at all; the names are put back on the results afterwards.
+    With reverse=True, up hosts without a name also get a PTR lookup, run
+    in parallel and cached like the forward ones.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, reverse=False, cache=None, timeout=DEFAULT_TIMEOUT):
+        self.workers = max(1, int(workers))
+        self.reverse_enabled = reverse
+        self.cache = cache if cache is not None else DnsCache()
+        self.timeout = timeout
+        self.dns = import_dnspython()
+        self.pool = None
+        self.lookups = 0
+
+    def executor(self):
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dns')
+        return self.pool
+
+    def lookup_forward(self, name):
+        """(IPv4 addresses, ttl) for a name; nmap only scans IPv4 unless given -6"""
+        if self.dns is not None:
+            try:
+                answer = self.dns.resolver.resolve(name, 'A', lifetime=self.timeout)
+                return [record.address for record in answer], answer.rrset.ttl
+            except Exception:
+                return [], NEGATIVE_TTL
+        try:
+            infos = socket.getaddrinfo(name, None, socket.AF_INET, socket.SOCK_STREAM)
+        except (OSError, UnicodeError):
+            return [], NEGATIVE_TTL
+        return list(dict.fromkeys(info[4][0] for info in infos)), DEFAULT_TTL
+
+    def lookup_reverse(self, address):
+        """(PTR names, ttl) for an address"""
+        if self.dns is not None:
+            try:
+                answer = self.dns.resolver.resolve_address(address, lifetime=self.timeout)
+                return [record.target.to_text(omit_final_dot=True) for record in answer], answer.rrset.ttl
+            except Exception:
+                return [], NEGATIVE_TTL
+        try:
+            name, aliases, _ = socket.gethostbyaddr(address)
+        except (OSError, UnicodeError):
+            return [], NEGATIVE_TTL
+        return [name] + aliases, DEFAULT_TTL
+
+    def cached_lookup(self, kind, key):
+        answers = self.cache.get(kind, key)
+        if answers is None:
+            self.lookups += 1
+            lookup = self.lookup_forward if kind == 'A' else self.lookup_reverse
+            answers, ttl = lookup(key)
+            self.cache.put(kind, key, answers, ttl)
+        return answers
+
+    def resolve_names(self, names):
+        """{name: [addresses]} for every name, looked up in parallel"""
+        names = list(dict.fromkeys(names))
+        results = self.executor().map(lambda name: self.cached_lookup('A', name), names)
+        return dict(zip(names, results))
+
+    def prepare_target(self, target):
+        """Replace the hostnames in an nmap target string with their first IPv4 address
+
+        Returns (target, hostnames, failed): hostnames maps each address
+        back to the name it came from, failed lists names that didn't
+        resolve (they are left out, as nmap would skip them). Netmasks on
+        names carry over (example.com/24 -> 93.184.216.0/24).
+        """
+        tokens = target.split()
+        names = [token.split('/')[0] for token in tokens if is_hostname(token)]
+        if not names:
+            return target, {}, []
+        addresses = self.resolve_names(names)
+        resolved = []
+        hostnames = {}
+        failed = []
+        for token in tokens:
+            if not is_hostname(token):
+                resolved.append(token)
+                continue
+            name, _, mask = token.partition('/')
+            if not addresses[name]:
+                failed.append(name)
+                continue
+            address = addresses[name][0]
+            hostnames.setdefault(address, name.lower().rstrip('.'))
+            resolved.append(f"{address}/{mask}" if mask else address)
+        self.cache.save()
+        return " ".join(resolved), hostnames, failed
+
+    def name_records(self, records, hostnames=None):
+        """Yield HostRecords with the names nmap didn't look up (it ran with -n)
+
+        Target names come from hostnames ({address: name}); with reverse
+        lookups on, other up hosts get their PTR names. Lookups run in the
+        background while later records arrive, and records come out in
+        their original order as soon as their own lookup is done, so a
+        stream is never held up by more than the lookups still in flight.
+        """
+        hostnames = hostnames or {}
+        pending = deque()
+        for record in records:
+            name = hostnames.get(record.address)
+            if name and name not in record.hostnames:
+                record = record.with_hostnames((name,) + tuple(h for h in record.hostnames if h))
+            future = None
+            if self.reverse_enabled and record.state == 'up' and not any(record.hostnames):
+                future = self.executor().submit(self.cached_lookup, 'PTR', record.address)
+            pending.append((record, future))
+            while pending and (pending[0][1] is None or pending[0][1].done() or len(pending) > MAX_PENDING):
+                yield self.finish_record(*pending.popleft())
+        while pending:
+            yield self.finish_record(*pending.popleft())
+        if self.reverse_enabled:
+            self.cache.save()
+
+    def finish_record(self, record, future):
+        if future is None:
+            return record
+        names = future.result()
+        return record.with_hostnames(names) if names else record
+
+    def stats(self):
+        return dict(self.cache.counters, lookups=self.lookups)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
@@ -0,0 +1,369 @@
+import itertools
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from scanner.distributed import JsonRequestHandler
+from scanner.exporters import host_to_dict
+
+DEFAULT_PORT = 8788
+DEFAULT_WORKERS = 2
+DEFAULT_PRIORITY = 10
+# Finished jobs kept for clients to fetch; the oldest are dropped first
+MAX_FINISHED_JOBS = 1000
+MAX_QUEUED_JOBS = 10000
+SCAN_TYPES = ('Quick Scan', 'Intense Scan', 'Ping Scan', 'Port Scan', 'Service Detection')
+ENGINES = ('auto', 'nmap', 'native')
+
+
+def validate_job(body):
+    """Checked job parameters from a POST /jobs body; raises ValueError"""
+    from scanner.ports import normalize_port_spec
+    from scanner.targets import parse_target
+    target = str(body.get('target') or '').strip()
+    if not target:
+        raise ValueError("target is required")
+    for token in target.split():
+        # Targets end up on nmap's command line; never let one pass as an option
+        if token.startswith('-'):
+            raise ValueError(f"Invalid target '{token}'")
+        parse_target(token)
+    scan_type = body.get('scan_type') or 'Quick Scan'
+    if scan_type not in SCAN_TYPES:
+        raise ValueError(f"scan_type must be one of: {', '.join(SCAN_TYPES)}")
+    engine = body.get('engine') or 'auto'
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of: {', '.join(ENGINES)}")
+    ports = body.get('ports') or None
+    if ports is not None:
+        normalize_port_spec(str(ports))
+    return {
+        'target': target,
+        'scan_type': scan_type,
+        'ports': ports,
+        'engine': engine,
+        'priority': int(body.get('priority', DEFAULT_PRIORITY)),
+        'stream': bool(body.get('stream', False)),
+    }
+
+
+class ScanJob:
+    """One queued scan and the hosts it has produced so far"""
+
+    def __init__(self, target, scan_type, ports=None, engine='auto', priority=DEFAULT_PRIORITY, stream=False):
+        self.job_id = uuid.uuid4().hex[:16]
+        self.target = target
+        self.scan_type = scan_type
+        self.ports = ports
+        self.engine = engine
+        self.priority = priority
+        self.stream = stream
+        self.state = 'queued'
+        self.error = None
+        self.cached = False
+        self.records = []
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.scanner = None
+        self.changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.state in ('done', 'failed', 'cancelled')
+
+    def add_record(self, record):
+        with self.changed:
+            self.records.append(host_to_dict(record))
+            self.changed.notify_all()
+
+    def finish(self, state, error=None):
+        with self.changed:
+            self.state = state
+            self.error = error
+            self.finished_at = time.time()
+            self.scanner = None
+            self.changed.notify_all()
+
+    def wait_records(self, offset, timeout=None):
+        """(host dicts from offset on, whether the job is over), waiting up to timeout for more"""
+        with self.changed:
+            if offset >= len(self.records) and not self.finished:
+                self.changed.wait(timeout)
+            return self.records[offset:], self.finished
+
+    def summary(self):
+        with self.changed:
+            return {
+                'job_id': self.job_id,
+                'state': self.state,
+                'target': self.target,
+                'scan_type': self.scan_type,
+                'ports': self.ports,
+                'engine': self.engine,
+                'priority': self.priority,
+                'hosts': len(self.records),
+                'cached': self.cached,
+                'error': self.error,
+                'submitted_at': self.submitted_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+
+
+class ScanService:
+    """Queue of scan jobs run by a bounded pool of long-lived NmapScanners
+
+    Each worker thread builds its NmapScanner (nmap probe, PortScanner)
+    once and keeps it for every job it runs, so a small scan costs the
+    nmap run and nothing else. Jobs wait in a priority queue - lower
+    numbers first, then in order of submission - and their hosts are
+    kept for clients to poll or stream by job ID.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, scanner_factory=None, token=None):
+        self.workers = max(1, int(workers))
+        if scanner_factory is None:
+            from scanner.nmap_wrapper import NmapScanner
+            scanner_factory = NmapScanner
+        self.scanner_factory = scanner_factory
+        self.token = token
+        self.queue = queue.PriorityQueue()
+        self.sequence = itertools.count()
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.threads = []
+        self.ready = threading.Barrier(self.workers + 1)
+        self.server = None
+
+    def start(self):
+        """Start the worker pool; returns once every worker's scanner is initialized"""
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.worker, name=f'scan-worker-{i}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        self.ready.wait()
+
+    def serve(self, host='127.0.0.1', port=DEFAULT_PORT):
+        """Start the HTTP API on a background thread; returns the bound (host, port)"""
+        handler = type('Handler', (JobHandler,), {'service': self, 'token': self.token})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='scan-service', daemon=True).start()
+        return self.server.server_address[:2]
+
+    def submit(self, target, scan_type='Quick Scan', ports=None, engine='auto', priority=DEFAULT_PRIORITY,
+               stream=False):
+        with self.lock:
+            queued = sum(1 for job in self.jobs.values() if job.state == 'queued')
+            if queued >= MAX_QUEUED_JOBS:
+                raise OverflowError(f"queue is full ({queued} jobs)")
+            job = ScanJob(target, scan_type, ports, engine, priority, stream)
+            self.jobs[job.job_id] = job
+        self.queue.put((priority, next(self.sequence), job.job_id))
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self.lock:
+            jobs = list(self.jobs.values())
+        return [job.summary() for job in jobs]
+
+    def cancel(self, job_id):
+        """Cancel a job; False if it's unknown or already finished
+
+        A queued job never runs. A running streamed job has its nmap
+        killed; other running jobs can't be interrupted and are marked
+        cancelled when their scan returns.
+        """
+        job = self.get(job_id)
+        if job is None:
+            return False
+        with job.changed:
+            if job.finished:
+                return False
+            if job.state == 'queued':
+                job.state = 'cancelled'
+                job.finished_at = time.time()
+                job.changed.notify_all()
+                return True
+            scanner = job.scanner
+            job.state = 'cancelling'
+        if scanner is not None:
+            scanner.stop()
+        return True
+
+    def worker(self):
+        try:
+            scanner = self.scanner_factory()
+            # Pay for the nmap probe and the PortScanner now, not on the first job
+            if scanner.nmap_available:
+                scanner.scanner
+        except Exception:
+            # start() raises BrokenBarrierError instead of waiting forever
+            self.ready.abort()
+            raise
+        self.ready.wait()
+        while True:
+            _, _, job_id = self.queue.get()
+            if job_id is None:
+                return
+            job = self.get(job_id)
+            if job is None:
+                continue
+            with job.changed:
+                if job.state != 'queued':
+                    continue
+                job.state = 'running'
+                job.started_at = time.time()
+                job.scanner = scanner
+            self.run_job(scanner, job)
+            self.prune()
+
+    def run_job(self, scanner, job):
+        engine = job.engine
+        if engine == 'auto':
+            engine = 'nmap' if scanner.nmap_available else 'native'
+        try:
+            if job.stream and engine == 'nmap' and scanner.nmap_available:
+                records = scanner.scan_stream(job.target, job.scan_type, job.ports)
+                if job.state == 'cancelling':
+                    # Cancelled before scan_stream() started the scan and cleared the scanner's stop
+                    scanner.stop()
+                for record in records:
+                    job.add_record(record)
+                stopped = scanner.stop_requested.is_set()
+                job.finish('cancelled' if stopped or job.state == 'cancelling' else 'done')
+                return
+            results = scanner.scan(job.target, job.scan_type, job.ports, engine=engine)
+        except Exception as e:
+            job.finish('failed', str(e))
+            return
+        if 'scan_result' not in results:
+            job.finish('failed', results.get('error') or results.get('message', 'scan failed'))
+            return
+        job.cached = bool(results.get('cached'))
+        for record in results['scan_result'].hosts:
+            job.add_record(record)
+        job.finish('cancelled' if job.state == 'cancelling' else 'done')
+
+    def prune(self):
+        """Forget the oldest finished jobs beyond MAX_FINISHED_JOBS"""
+        with self.lock:
+            finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+            for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+                del self.jobs[job_id]
+
+    def stats(self):
+        with self.lock:
+            states = [job.state for job in self.jobs.values()]
+        return {
+            'workers': self.workers,
+            'jobs': {state: states.count(state) for state in set(states)},
+        }
+
+    def close(self):
+        """Stop the API and the workers; running scans are stopped"""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        with self.lock:
+            running = [job for job in self.jobs.values() if not job.finished]
+        for job in running:
+            self.cancel(job.job_id)
+        for _ in self.threads:
+            self.queue.put((float('inf'), next(self.sequence), None))
+
+
+class JobHandler(JsonRequestHandler):
+    """HTTP API of a ScanService
+
+      POST   /jobs              submit {"target", "scan_type", "ports", "engine", "priority", "stream"}
+      GET    /jobs              list jobs
+      GET    /jobs/ID           job status and hosts (?offset=N for hosts after the first N)
+      GET    /jobs/ID/stream    JSON Lines of hosts as they arrive, until the job is over
+      DELETE /jobs/ID           cancel
+      GET    /health            worker count and job states
+    """
+    service = None
+    server_version = 'NmapScannerService/1.0'
+
+    def route(self):
+        """(job, action) for /jobs/ID[/action]; job is None for a bad or unknown id"""
+        parts = urlparse(self.path).path.strip('/').split('/')
+        job = self.service.get(parts[1]) if len(parts) >= 2 and parts[0] == 'jobs' else None
+        return job, parts[2] if len(parts) == 3 else None
+
+    def do_POST(self):
+        if not self.authorized():
+            return self.send_json(401, {'error': 'unauthorized'})
+        if urlparse(self.path).path.rstrip('/') != '/jobs':
+            return self.send_json(404, {'error': 'not found'})
+        try:
+            job = self.service.submit(**validate_job(self.read_json()))
+        except (ValueError, TypeError) as e:
+            return self.send_json(400, {'error': str(e)})
+        except OverflowError as e:
+            return self.send_json(503, {'error': str(e)})
+        self.send_json(202, job.summary())
+
+    def do_DELETE(self):
+        if not self.authorized():
+            return self.send_json(401, {'error': 'unauthorized'})
+        job, _ = self.route()
+        if job is None:
+            return self.send_json(404, {'error': 'no such job'})
+        cancelled = self.service.cancel(job.job_id)
+        self.send_json(200 if cancelled else 409, job.summary())
+
+    def do_GET(self):
+        if not self.authorized():
+            return self.send_json(401, {'error': 'unauthorized'})
+        url = urlparse(self.path)
+        path = url.path.rstrip('/')
+        if path == '/health':
+            return self.send_json(200, self.service.stats())
+        if path == '/jobs':
+            return self.send_json(200, {'jobs': self.service.list_jobs()})
+        job, action = self.route()
+        if job is None:
+            return self.send_json(404, {'error': 'no such job'})
+        if action == 'stream':
+            return self.stream_job(job)
+        if action is not None:
+            return self.send_json(404, {'error': 'not found'})
+        try:
+            offset = max(0, int(parse_qs(url.query).get('offset', ['0'])[0]))
+        except ValueError:
+            return self.send_json(400, {'error': 'offset must be an integer'})
+        summary = job.summary()
+        with job.changed:
+            summary['results'] = job.records[offset:]
+        self.send_json(200, summary)
+
+    def stream_job(self, job):
+        """Write each host as a JSON line as soon as the job has it; the response ends with the job"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        offset = 0
+        try:
+            while True:
+                records, over = job.wait_records(offset, timeout=1.0)
+                for record in records:
+                    self.wfile.write(json.dumps(record, separators=(',', ':')).encode() + b"\n")
+                offset += len(records)
+                self.wfile.flush()
+                if over:
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
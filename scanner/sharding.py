@@ -0,0 +1,224 @@
+import ipaddress
+import itertools
+from scanner.models import PROTOCOLS, ScanResult
+
+DEFAULT_HOSTS_PER_SHARD = 256
+# Most addresses split_target will enumerate (a /8); an IPv6 /64 would never finish
+MAX_SHARDED_HOSTS = 1 << 24
+
+# One PortScanner per worker process, created by init_shard_worker
+_worker_scanner = None
+
+
+def split_target(target, hosts_per_shard=DEFAULT_HOSTS_PER_SHARD):
+    """Split a target string into shard targets of at most hosts_per_shard hosts
+
+    IP addresses and CIDR networks are packed into address blocks (a /16 with
+    256 hosts per shard becomes 256 /24 shards, and single addresses share a
+    shard). Hostnames and nmap-style ranges such as 10.0.0-5.1-254 can't be
+    sized locally, so they are grouped hosts_per_shard tokens at a time.
+    Raises ValueError if the networks add up to more than MAX_SHARDED_HOSTS
+    addresses.
+    """
+    hosts_per_shard = max(1, int(hosts_per_shard))
+    shards = []
+    current = []
+    current_size = 0
+    other_tokens = []
+    total = 0
+
+    for token in target.split():
+        try:
+            network = ipaddress.ip_network(token, strict=False)
+        except ValueError:
+            other_tokens.append(token)
+            continue
+        total += network.num_addresses
+        if total > MAX_SHARDED_HOSTS:
+            raise ValueError(f"Too many addresses to split into shards ({token} has {network.num_addresses}; "
+                             f"at most {MAX_SHARDED_HOSTS} in total)")
+
+        address_class = type(network.network_address)
+        start = int(network.network_address)
+        last = int(network.broadcast_address)
+        while start <= last:
+            end = min(start + hosts_per_shard - current_size - 1, last)
+            for block in ipaddress.summarize_address_range(address_class(start), address_class(end)):
+                current.append(str(block.network_address) if block.num_addresses == 1 else str(block))
+            current_size += end - start + 1
+            start = end + 1
+            if current_size == hosts_per_shard:
+                shards.append(" ".join(current))
+                current = []
+                current_size = 0
+
+    if current:
+        shards.append(" ".join(current))
+
+    for i in range(0, len(other_tokens), hosts_per_shard):
+        shards.append(" ".join(other_tokens[i:i + hosts_per_shard]))
+
+    return shards
+
+
+def init_shard_worker(nmap_path):
+    """Create the PortScanner reused by every shard scanned in this process"""
+    global _worker_scanner
+    import nmap
+    search_path = (nmap_path,) if nmap_path else ('nmap',)
+    _worker_scanner = nmap.PortScanner(nmap_search_path=search_path)
+
+
+def scan_shard(shard_target, arguments, keep_xml=False):
+    """Scan one shard in a worker process
+
+    Returns python-nmap's result dict, a TimingObservation of the run and,
+    with keep_xml, nmap's raw XML output (None otherwise).
+    """
+    from scanner.timing import observe_scan
+    if _worker_scanner is None:
+        init_shard_worker(None)
+    result = _worker_scanner.scan(hosts=shard_target, arguments=arguments)
+    output = _worker_scanner.get_nmap_last_output()
+    return result, observe_scan(result, output), output if keep_xml else None
+
+
+def merge_host_data(merged, host_data):
+    """Merge one host's data from another run into merged, combining port maps"""
+    for key, value in host_data.items():
+        if key in PROTOCOLS:
+            merged.setdefault(key, {}).update(value)
+        elif key == 'status':
+            if value.get('state') == 'up' or 'status' not in merged:
+                merged['status'] = value
+        elif not merged.get(key):
+            merged[key] = value
+
+
+def merge_scan_results(shard_results, same_hosts=False):
+    """Merge python-nmap result dicts into a single result dict
+
+    Hosts seen by several runs get their port maps combined. With
+    same_hosts (port slices of one target) host counts are taken from the
+    largest run instead of being added up.
+    """
+    merged = {
+        'nmap': {
+            'command_line': [],
+            'scaninfo': {},
+            'scanstats': {'uphosts': 0, 'downhosts': 0, 'totalhosts': 0, 'elapsed': 0.0},
+        },
+        'scan': {},
+    }
+    stats = merged['nmap']['scanstats']
+
+    for result in shard_results:
+        nmap_info = result.get('nmap', {})
+        command_line = nmap_info.get('command_line')
+        if isinstance(command_line, list):
+            merged['nmap']['command_line'].extend(command_line)
+        elif command_line:
+            merged['nmap']['command_line'].append(command_line)
+        for key, value in nmap_info.get('scaninfo', {}).items():
+            if key in ('error', 'warning'):
+                merged['nmap']['scaninfo'].setdefault(key, []).extend(value)
+            else:
+                merged['nmap']['scaninfo'].setdefault(key, value)
+        shard_stats = nmap_info.get('scanstats', {})
+        for key in ('uphosts', 'downhosts', 'totalhosts'):
+            count = int(shard_stats.get(key) or 0)
+            stats[key] = max(stats[key], count) if same_hosts else stats[key] + count
+        # Shards run concurrently, so the slowest one bounds the wall time
+        stats['elapsed'] = max(stats['elapsed'], float(shard_stats.get('elapsed') or 0))
+        for host, host_data in result.get('scan', {}).items():
+            if host in merged['scan']:
+                merge_host_data(merged['scan'][host], host_data)
+            else:
+                merged['scan'][host] = host_data
+
+    if same_hosts:
+        stats['uphosts'] = max(stats['uphosts'], sum(
+            1 for host_data in merged['scan'].values()
+            if host_data.get('status', {}).get('state') == 'up'))
+    return merged
+
+
+def run_sharded_scan(shards, arguments, workers, nmap_path=None, timing=None, timing_target=None,
+                     checkpoint=None, archive=None):
+    """Scan shards on a pool of worker processes
+
+    arguments is one nmap argument string, or a list of them (one per port
+    slice) that are each run against every shard; a host's port maps from
+    the different slices are merged. Returns (merged_result, errors) where
+    errors lists (shard, message) pairs for runs that failed; the others
+    are still merged.
+
+    Runs are handed out as workers free up rather than all at once, so
+    with a TimingController each run starts with the limits learned from
+    the runs that finished before it (profiled under timing_target).
+
+    With a ScanCheckpoint, each finished run is recorded in it and runs it
+    already holds are taken from it instead of being scanned again.
+    With an XmlArchive, each run's raw XML is archived as it comes back.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+    slices = [arguments] if isinstance(arguments, str) else list(arguments)
+    shard_results = {shard: [] for shard in shards}
+    pending = []
+    for shard in shards:
+        for slice_arguments in slices:
+            unit = f"{shard} {slice_arguments}"
+            if checkpoint is not None and checkpoint.is_done(unit):
+                shard_results[shard].append(checkpoint.units[unit])
+            else:
+                pending.append((shard, slice_arguments))
+    jobs = iter(pending)
+    workers = max(1, min(int(workers), len(pending) or 1))
+    errors = []
+    futures = {}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_shard_worker,
+                             initargs=(nmap_path,)) as pool:
+        def submit(job):
+            shard, job_arguments = job
+            generation = None
+            if timing is not None:
+                timing_arguments, generation = timing.snapshot(timing_target or shard)
+                job_arguments += " " + timing_arguments
+            futures[pool.submit(scan_shard, shard, job_arguments, archive is not None)] = (job, generation)
+
+        try:
+            for job in itertools.islice(jobs, workers):
+                submit(job)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    (shard, job_arguments), generation = futures.pop(future)
+                    try:
+                        result, observation, output = future.result()
+                        shard_results[shard].append(result)
+                        if output:
+                            try:
+                                archive.add(output, shard)
+                            except OSError as e:
+                                print(f"⚠️  Could not archive nmap XML: {e}")
+                        if checkpoint is not None:
+                            checkpoint.mark_done(f"{shard} {job_arguments}", result)
+                        if timing is not None:
+                            timing.record(timing_target or shard, observation, generation)
+                    except Exception as e:
+                        label = shard if len(slices) == 1 else f"{shard} ({job_arguments})"
+                        errors.append((label, str(e)))
+                    next_job = next(jobs, None)
+                    if next_job is not None:
+                        submit(next_job)
+        except KeyboardInterrupt:
+            # Workers share our process group, so Ctrl-C already reached
+            # them and their nmaps; just don't start anything new
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    merged = merge_scan_results(
+        merge_scan_results(results, same_hosts=True) if len(results) > 1 else results[0]
+        for results in shard_results.values() if results)
+    return ScanResult.from_nmap(merged), errors
@@ -0,0 +1,296 @@
+import os
+import shlex
+import signal
+import subprocess
+import threading
+import xml.etree.ElementTree as ET
+
+
+def parse_host_element(dhost):
+    """Convert a <host> element into (address, host_data)
+
+    host_data has the same layout as a python-nmap PortScannerHostDict, so
+    NmapParser formats streamed and buffered hosts the same way.
+    """
+    host = None
+    addresses = {}
+    vendor = {}
+    for address in dhost.findall('address'):
+        addrtype = address.get('addrtype')
+        addresses[addrtype] = address.get('addr')
+        if addrtype == 'ipv4':
+            host = addresses[addrtype]
+        elif addrtype == 'mac' and address.get('vendor') is not None:
+            vendor[addresses[addrtype]] = address.get('vendor')
+    if host is None:
+        host = dhost.find('address').get('addr')
+
+    hostnames = [{'name': h.get('name'), 'type': h.get('type')}
+                 for h in dhost.findall('hostnames/hostname')]
+    if not hostnames:
+        hostnames.append({'name': '', 'type': ''})
+
+    host_data = {'hostnames': hostnames, 'addresses': addresses, 'vendor': vendor}
+
+    status = dhost.find('status')
+    if status is not None:
+        host_data['status'] = {'state': status.get('state'), 'reason': status.get('reason')}
+    uptime = dhost.find('uptime')
+    if uptime is not None:
+        host_data['uptime'] = {'seconds': uptime.get('seconds'), 'lastboot': uptime.get('lastboot')}
+
+    for dport in dhost.findall('ports/port'):
+        state = dport.find('state')
+        port_info = {
+            'state': state.get('state'),
+            'reason': state.get('reason'),
+            'name': '', 'product': '', 'version': '',
+            'extrainfo': '', 'conf': '', 'cpe': '',
+        }
+        service = dport.find('service')
+        if service is not None:
+            port_info['name'] = service.get('name')
+            for key in ('product', 'version', 'extrainfo', 'conf'):
+                if service.get(key):
+                    port_info[key] = service.get(key)
+            for cpe in service.findall('cpe'):
+                port_info['cpe'] = cpe.text
+        for script in dport.findall('script'):
+            port_info.setdefault('script', {})[script.get('id')] = script.get('output')
+        host_data.setdefault(dport.get('protocol'), {})[int(dport.get('portid'))] = port_info
+
+    for script in dhost.findall('hostscript/script'):
+        host_data.setdefault('hostscript', []).append({'id': script.get('id'), 'output': script.get('output')})
+
+    for dos in dhost.findall('os'):
+        host_data['portused'] = [
+            {'state': p.get('state'), 'proto': p.get('proto'), 'portid': p.get('portid')}
+            for p in dos.findall('portused')
+        ]
+        host_data['osmatch'] = [
+            {
+                'name': m.get('name'),
+                'accuracy': m.get('accuracy'),
+                'line': m.get('line'),
+                'osclass': [
+                    {
+                        'type': c.get('type'),
+                        'vendor': c.get('vendor'),
+                        'osfamily': c.get('osfamily'),
+                        'osgen': c.get('osgen'),
+                        'accuracy': c.get('accuracy'),
+                        'cpe': [cpe.text for cpe in c.findall('cpe')],
+                    }
+                    for c in m.findall('osclass')
+                ],
+            }
+            for m in dos.findall('osmatch')
+        ]
+
+    return host, host_data
+
+
+def parse_progress_element(elem):
+    """Convert a <taskprogress> element (written with --stats-every) into a dict"""
+    return {
+        'task': elem.get('task', ''),
+        'percent': float(elem.get('percent') or 0),
+        'remaining': int(elem.get('remaining') or 0),
+        'etc': int(elem.get('etc') or 0),
+    }
+
+
+def iter_nmap_xml(source, run_info=None, on_progress=None):
+    """Incrementally parse nmap XML from a file object, yielding (host, host_data)
+
+    Each <host> element is cleared once converted, so memory use depends on
+    the largest single host rather than the size of the scan. Run-level data
+    (command line, scaninfo, runstats, and host_timing: totals of the
+    hosts' round-trip times and timeouts) is collected into run_info if
+    given, and on_progress is called with each progress report nmap writes.
+    """
+    if run_info is None:
+        run_info = {}
+    run_info.setdefault('command_line', '')
+    run_info.setdefault('scaninfo', {})
+    run_info.setdefault('scanstats', {})
+    host_timing = run_info.setdefault('host_timing', {'srtt_total': 0, 'srtt_count': 0, 'timedout': 0})
+
+    root = None
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+                run_info['command_line'] = elem.get('args', '')
+            continue
+
+        if elem.tag == 'host':
+            if elem.get('timedout') == 'true':
+                host_timing['timedout'] += 1
+            times = elem.find('times')
+            if times is not None and (times.get('srtt') or '').isdigit():
+                host_timing['srtt_total'] += int(times.get('srtt'))
+                host_timing['srtt_count'] += 1
+            yield parse_host_element(elem)
+            elem.clear()
+            root.clear()
+        elif elem.tag == 'taskprogress':
+            if on_progress is not None:
+                on_progress(parse_progress_element(elem))
+            root.clear()
+        elif elem.tag == 'scaninfo':
+            run_info['scaninfo'][elem.get('protocol')] = {
+                'method': elem.get('type'),
+                'services': elem.get('services'),
+            }
+        elif elem.tag == 'finished':
+            run_info['scanstats'].update({
+                'timestr': elem.get('timestr'),
+                'elapsed': elem.get('elapsed'),
+            })
+        elif elem.tag == 'hosts':
+            run_info['scanstats'].update({
+                'uphosts': elem.get('up'),
+                'downhosts': elem.get('down'),
+                'totalhosts': elem.get('total'),
+            })
+
+
+class PipeReader:
+    """Make read() return whatever the pipe holds instead of waiting to fill
+    the parser's 16 KiB buffer, so each host is parsed as soon as nmap writes it"""
+
+    def __init__(self, pipe, profiler=None, sink=None):
+        self.pipe = pipe
+        self.profiler = profiler
+        # Optional ArchiveWriter that gets a copy of the raw XML
+        self.sink = sink
+
+    def read(self, size=-1):
+        if self.profiler is None:
+            data = self.pipe.read1(size)
+        else:
+            # Waiting on the pipe is nmap's time, not the parser's
+            with self.profiler.phase('nmap_run'):
+                data = self.pipe.read1(size)
+            self.profiler.count('bytes_parsed', len(data))
+        if self.sink is not None and data:
+            self.sink.feed(data)
+        return data
+
+
+class NmapXmlStream:
+    """Run nmap with XML written to a pipe and stream per-host records"""
+
+    def __init__(self, nmap_path='nmap', profiler=None, archive=None, stop_event=None):
+        self.nmap_path = nmap_path
+        # Optional ScanProfiler: pipe waits count as nmap_run, the rest as xml_parse
+        self.profiler = profiler
+        # Optional XmlArchive that keeps the raw XML of every run
+        self.archive = archive
+        # Set by stop(); a caller can share its own to stop the scan before it starts
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.process = None
+        self.run_info = {}
+        self.stderr_lines = []
+
+    @property
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def build_command(self, target, arguments):
+        return [self.nmap_path, '-oX', '-'] + shlex.split(arguments) + shlex.split(target)
+
+    def drain_stderr(self, stream):
+        for line in iter(stream.readline, b''):
+            self.stderr_lines.append(line.decode(errors='replace').rstrip())
+        stream.close()
+
+    def kill(self):
+        """Kill nmap's whole process group, so nothing it started outlives it"""
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        try:
+            if os.name == 'nt':
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    def stop(self):
+        """Stop the scan now; safe from any thread
+
+        The scan() generator then ends quietly after the hosts already read,
+        so callers keep their partial results.
+        """
+        self.stop_event.set()
+        self.kill()
+
+    def scan(self, target, arguments, on_progress=None):
+        """Yield (host, host_data) for each host as soon as nmap reports it
+
+        on_progress, if given, is called from this generator with each
+        <taskprogress> report (add --stats-every to the arguments to get them).
+        Nothing is started if the stream was already stopped.
+        """
+        self.run_info = {}
+        self.stderr_lines = []
+        if self.stopped:
+            return
+        # nmap gets its own process group: Ctrl-C reaches only us, and
+        # stop()/cleanup can kill nmap and anything it spawned in one go
+        if os.name == 'nt':
+            group = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            group = {'start_new_session': True}
+        self.process = subprocess.Popen(
+            self.build_command(target, arguments),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            **group
+        )
+        if self.stopped:
+            # stop() came while nmap was starting, before kill() could see it
+            self.kill()
+        # nmap can fill the stderr pipe while we are still reading stdout
+        stderr_thread = threading.Thread(target=self.drain_stderr, args=(self.process.stderr,))
+        stderr_thread.daemon = True
+        stderr_thread.start()
+
+        completed = False
+        parse_error = None
+        writer = self.archive.writer(target) if self.archive is not None else None
+        try:
+            hosts = iter_nmap_xml(PipeReader(self.process.stdout, self.profiler, writer), self.run_info,
+                                  on_progress)
+            if self.profiler is not None:
+                hosts = self.profiler.timed_iter('xml_parse', hosts)
+            yield from hosts
+            completed = True
+        except ET.ParseError as e:
+            parse_error = e
+        finally:
+            # Stopped early or failed: don't leave nmap running behind us
+            if not completed:
+                self.kill()
+            self.process.stdout.close()
+            self.process.wait()
+            stderr_thread.join(timeout=1)
+            if writer is not None:
+                try:
+                    writer.close(complete=completed and self.process.returncode == 0)
+                except OSError:
+                    pass
+
+        if self.stopped:
+            return
+        if parse_error is not None or self.process.returncode != 0:
+            errors = [line for line in self.stderr_lines if line]
+            if errors:
+                raise RuntimeError(errors[0])
+            if parse_error is not None:
+                raise RuntimeError(f"Invalid nmap XML output: {parse_error}")
+            raise RuntimeError(f"nmap exited with status {self.process.returncode}")
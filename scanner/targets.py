@@ -0,0 +1,308 @@
+import bisect
+import heapq
+import ipaddress
+import itertools
+import re
+import socket
+import sys
+
+# Targets collected before being sorted and merged into the set
+FLUSH_EVERY = 1 << 20
+# Address tokens per batch, so a batch always fits on an nmap command line
+MAX_BATCH_TOKENS = 1024
+DEFAULT_BATCH_SIZE = 4096
+
+# One octet of an nmap range: 5, 1-254, -10, 20-, *, or a comma list of those
+_OCTET_PATTERN = re.compile(r'^(\*|\d*-\d*|\d+)(,(\*|\d*-\d*|\d+))*$')
+
+
+def parse_octet(spec):
+    """[(low, high), ...] for one octet of an nmap range such as "1-5,10" or "*\""""
+    ranges = []
+    for part in spec.split(','):
+        if part == '*':
+            low, high = 0, 255
+        elif '-' in part:
+            low_text, high_text = part.split('-', 1)
+            low = int(low_text) if low_text else 0
+            high = int(high_text) if high_text else 255
+        else:
+            low = high = int(part)
+        if not 0 <= low <= high <= 255:
+            raise ValueError(f"Invalid octet range '{part}'")
+        ranges.append((low, high))
+    return ranges
+
+
+def octet_range_intervals(token):
+    """Address intervals of an nmap octet range (10.0.0-5.1-254), or None if token isn't one"""
+    octets = token.split('.')
+    if len(octets) != 4 or not all(_OCTET_PATTERN.match(octet) for octet in octets):
+        return None
+    octet_ranges = [parse_octet(octet) for octet in octets]
+    prefixes = [[value for low, high in ranges for value in range(low, high + 1)] for ranges in octet_ranges[:3]]
+    last = octet_ranges[3]
+    return ((base + low, base + high)
+            for a, b, c in itertools.product(*prefixes)
+            for base in ((a << 24) | (b << 16) | (c << 8),)
+            for low, high in last)
+
+
+def parse_target(token):
+    """(version, intervals) for an address target, or (None, None) for a hostname
+
+    Accepts IPv4/IPv6 addresses, CIDR networks, nmap octet ranges and
+    first-last address ranges (10.0.0.1-10.0.0.50). Raises ValueError for
+    a malformed address such as 10.0.0.300.
+    """
+    # Plain IPv4 addresses are most of any big list; inet_pton is far quicker than ipaddress
+    try:
+        address = int.from_bytes(socket.inet_pton(socket.AF_INET, token), 'big')
+        return 4, ((address, address),)
+    except OSError:
+        pass
+    try:
+        network = ipaddress.ip_network(token, strict=False)
+        return network.version, [(int(network.network_address), int(network.broadcast_address))]
+    except ValueError:
+        pass
+    if (token.count('-') == 1 and token.count('.') == 6) or (':' in token and '-' in token):
+        first, last = token.split('-')
+        start, end = ipaddress.ip_address(first), ipaddress.ip_address(last)
+        if start.version != end.version or start > end:
+            raise ValueError(f"Invalid address range '{token}'")
+        return start.version, [(int(start), int(end))]
+    try:
+        intervals = octet_range_intervals(token)
+    except ValueError:
+        raise ValueError(f"Invalid address '{token}'") from None
+    if intervals is not None:
+        return 4, intervals
+    if ':' in token or re.match(r'^[\d./]+$', token):
+        raise ValueError(f"Invalid address '{token}'")
+    return None, None
+
+
+def merge_intervals(intervals):
+    """Sorted, merged (start, end) pairs from sorted (start, end) pairs"""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1] + 1:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(intervals, excluded):
+    """intervals minus excluded, both sorted and merged; one linear sweep"""
+    result = []
+    excluded = iter(excluded)
+    current = next(excluded, None)
+    for start, end in intervals:
+        while current is not None and current[1] < start:
+            current = next(excluded, None)
+        while current is not None and current[0] <= end:
+            if current[0] > start:
+                result.append((start, current[0] - 1))
+            start = current[1] + 1
+            # An exclusion running past this interval may cut the next one too
+            if current[1] > end:
+                break
+            current = next(excluded, None)
+        if start <= end:
+            result.append((start, end))
+    return result
+
+
+class AddressRanges:
+    """Sorted, merged address intervals of one IP version, with bisect lookup"""
+
+    def __init__(self, intervals=()):
+        self.intervals = merge_intervals(sorted(intervals))
+        self.starts = [start for start, _ in self.intervals]
+
+    def union(self, sorted_intervals):
+        return AddressRanges.from_merged(merge_intervals(heapq.merge(self.intervals, sorted_intervals)))
+
+    def difference(self, other):
+        return AddressRanges.from_merged(subtract_intervals(self.intervals, other.intervals))
+
+    @classmethod
+    def from_merged(cls, intervals):
+        ranges = cls.__new__(cls)
+        ranges.intervals = intervals
+        ranges.starts = [start for start, _ in intervals]
+        return ranges
+
+    def __contains__(self, address):
+        i = bisect.bisect_right(self.starts, address) - 1
+        return i >= 0 and address <= self.intervals[i][1]
+
+    def address_count(self):
+        return sum(end - start + 1 for start, end in self.intervals)
+
+    def __len__(self):
+        return len(self.intervals)
+
+
+class TargetSet:
+    """Deduplicated scan targets: address intervals per IP version plus hostnames
+
+    Addresses are never expanded; every IP, CIDR or range is one interval,
+    and overlapping or adjacent ones are merged, so millions of input lines
+    cost memory in proportion to the number of distinct ranges. Targets are
+    buffered and merged in chunks of FLUSH_EVERY as they are added.
+    """
+
+    def __init__(self):
+        self.ranges = {4: AddressRanges(), 6: AddressRanges()}
+        self.pending = {4: [], 6: []}
+        self.hostnames = {}
+        self.added = 0
+        self.invalid = []
+
+    def add(self, token):
+        """Add one target token; malformed addresses are recorded in invalid and skipped"""
+        self.added += 1
+        try:
+            version, intervals = parse_target(token)
+        except ValueError as e:
+            self.invalid.append(str(e))
+            return
+        if version is None:
+            self.hostnames[token.lower().rstrip('.')] = None
+            return
+        pending = self.pending[version]
+        pending.extend(intervals)
+        if len(pending) >= FLUSH_EVERY:
+            self.flush(version)
+
+    def add_tokens(self, tokens):
+        for token in tokens:
+            self.add(token)
+        return self
+
+    def flush(self, version=None):
+        for v in ([version] if version else [4, 6]):
+            if self.pending[v]:
+                self.ranges[v] = self.ranges[v].union(sorted(self.pending[v]))
+                self.pending[v] = []
+
+    def exclude(self, other):
+        """Remove every address and hostname in other"""
+        self.flush()
+        other.flush()
+        for version in (4, 6):
+            self.ranges[version] = self.ranges[version].difference(other.ranges[version])
+        for name in other.hostnames:
+            self.hostnames.pop(name, None)
+        return self
+
+    def __contains__(self, target):
+        """Whether an address or hostname is in the set"""
+        self.flush()
+        try:
+            address = ipaddress.ip_address(target)
+        except ValueError:
+            return target.lower().rstrip('.') in self.hostnames
+        return int(address) in self.ranges[address.version]
+
+    def address_count(self):
+        self.flush()
+        return sum(ranges.address_count() for ranges in self.ranges.values())
+
+    def networks(self):
+        """Yield the minimal list of CIDR networks covering every address"""
+        self.flush()
+        for version, address_class in ((4, ipaddress.IPv4Address), (6, ipaddress.IPv6Address)):
+            for start, end in self.ranges[version].intervals:
+                yield from ipaddress.summarize_address_range(address_class(start), address_class(end))
+
+    def batches(self, hosts_per_batch=DEFAULT_BATCH_SIZE):
+        """Yield nmap target strings of at most hosts_per_batch addresses each
+
+        Produced lazily from the intervals, so the full address list never
+        exists; hostnames follow in batches of hosts_per_batch names.
+        """
+        self.flush()
+        hosts_per_batch = max(1, int(hosts_per_batch))
+        max_tokens = min(hosts_per_batch, MAX_BATCH_TOKENS)
+        tokens = []
+        size = 0
+        for version, address_class in ((4, ipaddress.IPv4Address), (6, ipaddress.IPv6Address)):
+            # nmap can't mix IPv4 and IPv6 targets in one run
+            if tokens:
+                yield " ".join(tokens)
+                tokens = []
+                size = 0
+            for start, end in self.ranges[version].intervals:
+                while start <= end:
+                    chunk_end = min(end, start + hosts_per_batch - size - 1)
+                    for block in ipaddress.summarize_address_range(address_class(start), address_class(chunk_end)):
+                        tokens.append(str(block.network_address) if block.num_addresses == 1 else str(block))
+                    size += chunk_end - start + 1
+                    start = chunk_end + 1
+                    if size >= hosts_per_batch or len(tokens) >= max_tokens:
+                        yield " ".join(tokens)
+                        tokens = []
+                        size = 0
+        if tokens:
+            yield " ".join(tokens)
+
+        names = iter(self.hostnames)
+        while True:
+            batch = list(itertools.islice(names, max_tokens))
+            if not batch:
+                break
+            yield " ".join(batch)
+
+    def describe(self):
+        self.flush()
+        networks = sum(1 for _ in self.networks())
+        text = f"{self.address_count():,} addresses in {networks:,} networks"
+        if self.hostnames:
+            text += f", {len(self.hostnames):,} hostnames"
+        return text
+
+    def __bool__(self):
+        self.flush()
+        return bool(self.hostnames) or any(self.ranges[version].intervals for version in (4, 6))
+
+
+def iter_target_tokens(lines):
+    """Target tokens from -iL style input: whitespace separated, # starts a comment
+
+    Commas belong to octet lists (10.0.0.1,5,10), as in nmap's -iL.
+    """
+    for line in lines:
+        yield from line.split('#', 1)[0].split()
+
+
+def split_target_list(text):
+    """Targets of a comma/whitespace separated list such as --exclude takes
+
+    A comma only separates targets when what follows starts a new one
+    (an IPv4 address or range, an IPv6 address or a hostname); otherwise
+    it is part of an octet list, so "10.0.0.1,5,10.0.1.0/24" is two targets.
+    """
+    targets = []
+    for token in text.split():
+        first, *rest = token.split(',')
+        targets.append(first)
+        for part in rest:
+            if part.count('.') >= 3 or ':' in part or any(c.isalpha() for c in part):
+                targets.append(part)
+            else:
+                targets[-1] += ',' + part
+    return [target.strip(',') for target in targets if target.strip(',')]
+
+
+def read_targets(path, targets=None):
+    """Add every target in a file ("-" for stdin) to a TargetSet, reading it line by line"""
+    targets = targets if targets is not None else TargetSet()
+    if path == '-':
+        return targets.add_tokens(iter_target_tokens(sys.stdin))
+    with open(path, 'r', encoding='utf-8') as f:
+        return targets.add_tokens(iter_target_tokens(f))
@@ -0,0 +1,247 @@
+import ipaddress
+import json
+import os
+import re
+import threading
+import time
+from scanner.paths import get_data_dir
+
+PROFILES_FILE = 'timing_profiles.json'
+
+RATE_FLOOR = 10
+RATE_CEILING = 50000
+RETRIES_CEILING = 10
+HOSTGROUP_FLOOR = 4
+HOSTGROUP_CEILING = 1024
+# Share of responsive hosts that may time out or hit the retransmission
+# cap before the network counts as congested
+CONGESTION_THRESHOLD = 0.01
+# Weight of the newest run in the smoothed RTT, loss and per-host time figures
+SMOOTHING = 0.3
+# A run this many times slower per host than usual isn't clean, even without loss
+SLOWDOWN = 2.0
+
+_SRTT_PATTERN = re.compile(rb'<times srtt="(\d+)"')
+_TIMEDOUT_PATTERN = re.compile(rb'<host [^>]*timedout="true"')
+
+
+def network_key(target):
+    """Profile key for a target: the /24 (IPv4) or /48 (IPv6) of its first address
+
+    Scans of the same site share a profile whatever their exact range;
+    hostname targets are keyed by the lower-cased name.
+    """
+    tokens = target.split()
+    if not tokens:
+        return ''
+    try:
+        network = ipaddress.ip_network(tokens[0], strict=False)
+    except ValueError:
+        return tokens[0].lower().rstrip('.')
+    prefix = 24 if network.version == 4 else 48
+    return str(ipaddress.ip_network(f"{network.network_address}/{prefix}", strict=False))
+
+
+class TimingObservation:
+    """What one nmap run tells us about the network's capacity"""
+    __slots__ = ('hosts', 'up_hosts', 'elapsed', 'timeouts', 'giveups', 'srtt_ms')
+
+    def __init__(self, hosts=0, up_hosts=0, elapsed=0.0, timeouts=0, giveups=0, srtt_ms=None):
+        self.hosts = hosts
+        self.up_hosts = up_hosts
+        self.elapsed = elapsed
+        self.timeouts = timeouts
+        self.giveups = giveups
+        self.srtt_ms = srtt_ms
+
+    @property
+    def loss(self):
+        """Timed-out hosts and abandoned probes per responsive host"""
+        return (self.timeouts + self.giveups) / max(1, self.up_hosts)
+
+    def __repr__(self):
+        return (f"TimingObservation({self.up_hosts}/{self.hosts} up, {self.elapsed:.1f}s, "
+                f"{self.timeouts} timeouts, {self.giveups} give-ups, srtt {self.srtt_ms} ms)")
+
+
+def observe_scan(scan_result, xml_output=b''):
+    """Build a TimingObservation from a python-nmap result dict and nmap's raw XML
+
+    python-nmap drops per-host timing, so host timeouts and round-trip
+    times are read from the XML; probes nmap gave up on after hitting the
+    retransmission cap are counted from the warnings it printed on stderr.
+    """
+    nmap_info = scan_result.get('nmap', {})
+    stats = nmap_info.get('scanstats', {})
+    warnings = nmap_info.get('scaninfo', {}).get('warning', [])
+    if isinstance(xml_output, str):
+        xml_output = xml_output.encode('utf-8', errors='replace')
+    srtts = [int(value) for value in _SRTT_PATTERN.findall(xml_output or b'')]
+    return TimingObservation(
+        hosts=int(stats.get('totalhosts') or 0),
+        up_hosts=int(stats.get('uphosts') or 0),
+        elapsed=float(stats.get('elapsed') or 0),
+        timeouts=len(_TIMEDOUT_PATTERN.findall(xml_output or b'')),
+        giveups=sum(1 for line in warnings if 'retransmission cap hit' in line),
+        srtt_ms=sum(srtts) / len(srtts) / 1000 if srtts else None,
+    )
+
+
+def observe_stream(run_info, stderr_lines=()):
+    """Build a TimingObservation from a streamed run's run_info (see streaming.iter_nmap_xml)
+
+    Host elements are gone by the time the run ends, so their timeouts
+    and round-trip times come from the totals collected while parsing.
+    """
+    stats = run_info.get('scanstats', {})
+    host_timing = run_info.get('host_timing', {})
+    srtt_count = host_timing.get('srtt_count', 0)
+    return TimingObservation(
+        hosts=int(stats.get('totalhosts') or 0),
+        up_hosts=int(stats.get('uphosts') or 0),
+        elapsed=float(stats.get('elapsed') or 0),
+        timeouts=host_timing.get('timedout', 0),
+        giveups=sum(1 for line in stderr_lines if 'retransmission cap hit' in line),
+        srtt_ms=host_timing.get('srtt_total', 0) / srtt_count / 1000 if srtt_count else None,
+    )
+
+
+class TimingProfile:
+    """nmap rate and parallelism limits learned for one network
+
+    Works like TCP congestion control: a congested run (too many host
+    timeouts or abandoned probes) halves the rate and host group and
+    allows one more retry; a clean run (no loss, and not SLOWDOWN times
+    slower per host than the smoothed host_seconds) raises the rate by a
+    quarter, doubles the host group and drops a retry. Runs in between
+    hold steady.
+
+    generation counts limit changes. A run started under an older
+    generation only updates the smoothed figures, so shards that ran in
+    parallel through the same congestion cut the rate once, not per shard.
+    """
+    FIELDS = ('min_rate', 'max_rate', 'max_retries', 'min_hostgroup', 'runs', 'generation',
+              'srtt_ms', 'loss', 'host_seconds', 'updated_at')
+
+    def __init__(self, min_rate=100, max_rate=2000, max_retries=6, min_hostgroup=32,
+                 runs=0, generation=0, srtt_ms=None, loss=0.0, host_seconds=None, updated_at=0):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_retries = max_retries
+        self.min_hostgroup = min_hostgroup
+        self.runs = runs
+        self.generation = generation
+        self.srtt_ms = srtt_ms
+        self.loss = loss
+        self.host_seconds = host_seconds
+        self.updated_at = updated_at
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{key: data[key] for key in cls.FIELDS if key in data})
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    def retries_floor(self):
+        # Distant networks lose more packets to plain bad luck
+        if self.srtt_ms is None or self.srtt_ms >= 100:
+            return 3
+        return 1 if self.srtt_ms < 10 else 2
+
+    def update(self, observation, generation=None):
+        """Fold one run's observation into the limits
+
+        generation is the profile generation the run started with; None
+        means the run used the current limits.
+        """
+        self.runs += 1
+        self.updated_at = int(time.time())
+        if observation.srtt_ms is not None:
+            self.srtt_ms = (observation.srtt_ms if self.srtt_ms is None
+                            else (1 - SMOOTHING) * self.srtt_ms + SMOOTHING * observation.srtt_ms)
+        self.loss = (1 - SMOOTHING) * self.loss + SMOOTHING * observation.loss
+        slow = False
+        if observation.hosts and observation.elapsed > 0:
+            host_seconds = observation.elapsed / observation.hosts
+            slow = self.host_seconds is not None and host_seconds > SLOWDOWN * self.host_seconds
+            self.host_seconds = (host_seconds if self.host_seconds is None
+                                 else (1 - SMOOTHING) * self.host_seconds + SMOOTHING * host_seconds)
+        if generation is not None and generation != self.generation:
+            return
+
+        limits = (self.max_rate, self.max_retries, self.min_hostgroup)
+        if observation.loss > CONGESTION_THRESHOLD:
+            self.max_rate = max(RATE_FLOOR, self.max_rate // 2)
+            self.max_retries = min(RETRIES_CEILING, self.max_retries + 1)
+            self.min_hostgroup = max(HOSTGROUP_FLOOR, self.min_hostgroup // 2)
+        elif observation.loss == 0 and not slow:
+            self.max_rate = min(RATE_CEILING, self.max_rate + max(self.max_rate // 4, 50))
+            self.max_retries = max(self.retries_floor(), self.max_retries - 1)
+            if observation.hosts >= self.min_hostgroup:
+                self.min_hostgroup = min(HOSTGROUP_CEILING, self.min_hostgroup * 2)
+        self.min_rate = max(RATE_FLOOR // 2, self.max_rate // 10)
+        if (self.max_rate, self.max_retries, self.min_hostgroup) != limits:
+            self.generation += 1
+
+    def arguments(self):
+        """nmap options for these limits, meant to follow the -T template"""
+        return (f"--min-rate {self.min_rate} --max-rate {self.max_rate} "
+                f"--max-retries {self.max_retries} --min-hostgroup {self.min_hostgroup}")
+
+    def __repr__(self):
+        return f"TimingProfile({self.arguments()})"
+
+
+class TimingController:
+    """Per-network TimingProfiles, persisted as JSON between runs
+
+    Call arguments() before starting nmap on a target and record() with
+    the TimingObservation once it finishes; sharded scans do this per
+    shard, so later shards of the same scan already use the new limits.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_data_dir(PROFILES_FILE)
+        self.lock = threading.Lock()
+        self.profiles = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.profiles = {key: TimingProfile.from_dict(value) for key, value in data.items()}
+        except (OSError, ValueError, TypeError):
+            pass
+
+    def profile(self, target):
+        key = network_key(target)
+        with self.lock:
+            if key not in self.profiles:
+                self.profiles[key] = TimingProfile()
+            return self.profiles[key]
+
+    def arguments(self, target):
+        return self.snapshot(target)[0]
+
+    def snapshot(self, target):
+        """(nmap options, profile generation) to start a run with"""
+        profile = self.profile(target)
+        with self.lock:
+            return profile.arguments(), profile.generation
+
+    def record(self, target, observation, generation=None):
+        """Update the target network's profile from a finished run and save it"""
+        profile = self.profile(target)
+        with self.lock:
+            profile.update(observation, generation)
+        self.save()
+        return profile
+
+    def save(self):
+        with self.lock:
+            data = {key: profile.to_dict() for key, profile in self.profiles.items()}
+        try:
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(self.path + '.tmp', self.path)
+        except OSError:
+            pass